@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Stale-while-revalidate cache for BB-Poster-Automation.
+
+Used by the dashboard for external API panels (Instagram Graph API, Twitter)
+so page renders never wait on a network call:
+
+  - get() always returns immediately with the cached value (or a default)
+  - stale or missing entries are refreshed in a background thread
+  - values are kept in memory and mirrored to a JSON file to survive restarts
+  - a failed refresh keeps serving the last good value
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class SWRCache:
+    """
+    Usage:
+        cache = SWRCache("~/BB-Poster-Automation/.dashboard_cache.json")
+        profile = cache.get("ig_profile", fetch_instagram_profile, ttl=300)
+    """
+
+    def __init__(self, cache_file: str, retry_after: float = 60):
+        self.cache_file = cache_file
+        self.retry_after = retry_after  # Min seconds between refresh attempts per key
+        self._entries: Dict[str, Dict[str, Any]] = {}  # key: {"value", "fetched_at"}
+        self._attempts: Dict[str, float] = {}          # key: last refresh start
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._load()
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    def _load(self) -> None:
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, "r") as f:
+                    self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save(self) -> None:
+        # Refresh threads save concurrently: one writer at a time, and a temp
+        # name unique per thread so no two writers ever share a file
+        with self._save_lock:
+            with self._lock:
+                snapshot = json.dumps(self._entries)
+            tmp = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(snapshot)
+                os.replace(tmp, self.cache_file)
+            except OSError:
+                pass
+
+    # -------------------------------------------------------------------------
+    # Cache API
+    # -------------------------------------------------------------------------
+
+    def seed(self, key: str, value: Any, fetched_at: float) -> None:
+        """Pre-populate an entry (e.g. when migrating an older cache file)."""
+        with self._lock:
+            if key not in self._entries and value is not None:
+                self._entries[key] = {"value": value, "fetched_at": fetched_at}
+
+    def get(self, key: str, loader: Callable[[], Any], ttl: float, default: Any = None) -> Any:
+        """
+        Return the cached value for key without blocking.
+        Starts a background refresh with `loader` if the entry is stale or missing.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            fresh = entry is not None and now - entry["fetched_at"] < ttl
+            should_refresh = (
+                not fresh
+                and key not in self._refreshing
+                and now - self._attempts.get(key, 0) >= self.retry_after
+            )
+            if should_refresh:
+                self._refreshing.add(key)
+                self._attempts[key] = now
+
+        if should_refresh:
+            threading.Thread(
+                target=self._refresh, args=(key, loader),
+                name=f"cache-refresh-{key}", daemon=True
+            ).start()
+
+        return entry["value"] if entry is not None else default
+
+    def refresh(self, key: str, loader: Callable[[], Any]) -> Optional[Any]:
+        """Refresh an entry synchronously. Returns the new value, or None on failure."""
+        with self._lock:
+            self._refreshing.add(key)
+            self._attempts[key] = time.time()
+        return self._refresh(key, loader)
+
+    def _refresh(self, key: str, loader: Callable[[], Any]) -> Optional[Any]:
+        try:
+            value = loader()
+        except Exception as e:
+            print(f"Cache refresh failed for {key}: {e}")
+            value = None
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+        # None means "no data" - keep serving the last good value
+        if value is None:
+            return None
+
+        with self._lock:
+            self._entries[key] = {"value": value, "fetched_at": time.time()}
+        self._save()
+        return value
@@ -26,6 +26,11 @@ PROJECT_ROOT = os.path.expanduser("~/BB-Poster-Automation")
 sys.path.insert(0, PROJECT_ROOT)
 
 from config import setup_logger, FB_GRAPH_API, DB_FILE
+import registry
+from metrics import Metrics
+from profiling import LoopProfiler
+from rate_limiter import RateLimiter, make_key
+from scheduler import DueScheduler
 
 # -----------------------------------------------------------------------------
 # Configuration
@@ -46,9 +51,16 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 POLL_INTERVAL = 180  # 3 minutes
 MIN_REPLY_DELAY = 900   # 15 minutes
 MAX_REPLY_DELAY = 2700  # 45 minutes
-MAX_REPLIES_PER_HOUR = 8
+MAX_REPLIES_PER_HOUR = 8  # Hard cap per rolling hour (counted from sent replies)
+REPLY_SPACING = 2  # Seconds between replies in a burst (the hourly cap is the window count)
+MAX_REPLY_BUDGET_WAIT = 60  # Wait inline for reply budget up to this long, else defer
 MAX_REPLIES_PER_USER_PER_POST = 3  # Max conversation depth per user
 
+metrics = Metrics("responder")
+
+# Armed with --profile N or SIGUSR1 (see profiling.py)
+profiler = None
+
 # Instagram username (to skip our own replies when scanning)
 INSTAGRAM_USERNAME = "nyssa_bloom_modeling"
 
@@ -130,6 +142,7 @@ def init_comment_db():
     """)
     con.execute("CREATE INDEX IF NOT EXISTS idx_comment_id ON comment_replies(comment_id)")
     con.execute("CREATE INDEX IF NOT EXISTS idx_status ON comment_replies(status)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_status_scheduled ON comment_replies(status, scheduled_at)")
     con.execute("CREATE INDEX IF NOT EXISTS idx_media_username ON comment_replies(media_id, username)")
     
     # Add new columns if they don't exist (migration)
@@ -186,6 +199,35 @@ def get_pending_replies():
     con.close()
     return rows
 
+def get_upcoming_reply_times(limit=100):
+    """Get scheduled_at times of pending replies that are not due yet."""
+    now = int(time.time())
+    con = sqlite3.connect(DB_FILE)
+    rows = con.execute("""
+        SELECT scheduled_at FROM comment_replies 
+        WHERE status = 'pending' AND scheduled_at > ?
+        ORDER BY scheduled_at ASC LIMIT ?
+    """, (now, limit)).fetchall()
+    con.close()
+    return [row[0] for row in rows]
+
+def get_pending_reply_count():
+    con = sqlite3.connect(DB_FILE)
+    count = con.execute("SELECT COUNT(*) FROM comment_replies WHERE status = 'pending'").fetchone()[0]
+    con.close()
+    return count
+
+def get_reply_window():
+    """Replies sent in the last hour, and when the oldest of them leaves that hour."""
+    one_hour_ago = int(time.time()) - 3600
+    con = sqlite3.connect(DB_FILE)
+    count, oldest = con.execute("""
+        SELECT COUNT(*), MIN(replied_at) FROM comment_replies 
+        WHERE status = 'sent' AND replied_at >= ?
+    """, (one_hour_ago,)).fetchone()
+    con.close()
+    return count, (oldest + 3600 if oldest else time.time())
+
 def mark_reply_sent(reply_id, nyssa_comment_id=None):
     """Mark a reply as sent and store Nyssa's comment ID."""
     con = sqlite3.connect(DB_FILE)
@@ -208,17 +250,6 @@ def mark_reply_failed(reply_id, error_msg):
     con.commit()
     con.close()
 
-def get_replies_last_hour():
-    """Count replies sent in the last hour."""
-    one_hour_ago = int(time.time()) - 3600
-    con = sqlite3.connect(DB_FILE)
-    count = con.execute("""
-        SELECT COUNT(*) FROM comment_replies 
-        WHERE status = 'sent' AND replied_at >= ?
-    """, (one_hour_ago,)).fetchone()[0]
-    con.close()
-    return count
-
 # -----------------------------------------------------------------------------
 # Instagram API Functions
 # -----------------------------------------------------------------------------
@@ -336,8 +367,10 @@ def generate_reply(comment_text, post_caption="", is_reply_to_reply=False, previ
         "temperature": 0.8
     }
     
+    start = time.time()
     response = requests.post(url, headers=headers, json=data)
     result = response.json()
+    metrics.observe("openai_request_seconds", time.time() - start, status=response.status_code)
     
     if "choices" in result:
         return result["choices"][0]["message"]["content"].strip()
@@ -484,28 +517,41 @@ def process_new_comments(comments, log):
         except Exception as e:
             log.error(f"Failed to process comment {comment['comment_id']}: {e}")
 
-def send_pending_replies(log):
-    """Send replies that are due."""
-    replies_last_hour = get_replies_last_hour()
-    if replies_last_hour >= MAX_REPLIES_PER_HOUR:
-        log.debug(f"Rate limit reached ({replies_last_hour}/{MAX_REPLIES_PER_HOUR})")
-        return
+def send_pending_replies(log, limiter=None):
+    """
+    Send replies that are due, as fast as the hourly reply budget allows.
+    Returns the time to retry at if replies were deferred for budget, else None.
     
-    remaining_quota = MAX_REPLIES_PER_HOUR - replies_last_hour
+    MAX_REPLIES_PER_HOUR is enforced by counting sent replies (a token bucket
+    alone would allow a full burst plus a refill in the same hour); the bucket
+    only keeps replies in a burst REPLY_SPACING apart.
+    """
     pending = get_pending_replies()
     
     if not pending:
-        return
+        return None
     
     try:
         ig_user_id, access_token = get_credentials()
     except Exception as e:
         log.error(f"Failed to get credentials: {e}")
-        return
+        return None
     
-    for reply in pending[:remaining_quota]:
+    limiter = limiter or RateLimiter()
+    budget_key = make_key(ig_user_id, "Instagram", "reply")
+    
+    for reply in pending:
         reply_id, comment_id, media_id, reply_text = reply
         
+        sent_last_hour, window_frees_at = get_reply_window()
+        if sent_last_hour >= MAX_REPLIES_PER_HOUR:
+            log.debug(f"Reply budget exhausted ({sent_last_hour}/{MAX_REPLIES_PER_HOUR} this hour), deferring remaining replies")
+            return window_frees_at
+        
+        if not limiter.acquire(budget_key, 1, REPLY_SPACING, max_wait=MAX_REPLY_BUDGET_WAIT):
+            log.debug(f"Pacing replies (1 per {REPLY_SPACING}s), deferring remaining replies")
+            return time.time() + limiter.wait_time(budget_key, 1, REPLY_SPACING)
+        
         try:
             result = post_reply(comment_id, reply_text, access_token)
             
@@ -513,42 +559,68 @@ def send_pending_replies(log):
                 nyssa_comment_id = result["id"]
                 mark_reply_sent(reply_id, nyssa_comment_id)
                 log.info(f"Sent reply to comment {comment_id}: {reply_text[:50]}...")
+                metrics.inc("replies_total", result="sent")
             else:
                 error_msg = result.get("error", {}).get("message", str(result))
                 mark_reply_failed(reply_id, error_msg)
                 log.error(f"Failed to send reply: {error_msg}")
+                metrics.inc("replies_total", result="failed")
                 
         except Exception as e:
             mark_reply_failed(reply_id, str(e))
             log.error(f"Exception sending reply: {e}")
-        
-        time.sleep(2)
+            metrics.inc("replies_total", result="error")
+    
+    return None
 
 def run_daemon(log):
-    """Main daemon loop."""
+    """
+    Main daemon loop.
+    
+    Polls Instagram every POLL_INTERVAL, and in between sleeps exactly until
+    the next reply's scheduled_at so replies go out on time.
+    """
     log.info("Comment Responder daemon started")
     log.info(f"Poll interval: {POLL_INTERVAL}s, Reply delay: {MIN_REPLY_DELAY}-{MAX_REPLY_DELAY}s")
     log.info(f"Max replies per user per post: {MAX_REPLIES_PER_USER_PER_POST}")
     
+    limiter = RateLimiter()
+    scheduler = DueScheduler("responder")
+    registry.register("responder")
+    profiler.install_signal_handler()
+    next_poll = 0
+    
     while True:
+        loop_start = time.time()
+        retry_at = None
         try:
-            log.info("Polling for comments...")
-            new_comments = scan_for_new_comments(log)
-            log.info(f"Found {len(new_comments)} new comment(s)")
-            if new_comments:
-                process_new_comments(new_comments, log)
+            if time.time() >= next_poll:
+                next_poll = time.time() + POLL_INTERVAL
+                log.info("Polling for comments...")
+                with metrics.timer("comment_scan_seconds"), profiler.iteration():
+                    new_comments = scan_for_new_comments(log)
+                metrics.inc("comments_found_total", len(new_comments))
+                log.info(f"Found {len(new_comments)} new comment(s)")
+                if new_comments:
+                    process_new_comments(new_comments, log)
             
-            send_pending_replies(log)
+            retry_at = send_pending_replies(log, limiter)
+            scheduler.reload(get_upcoming_reply_times())
+            metrics.set("reply_queue_depth", get_pending_reply_count())
             
         except Exception as e:
             log.error(f"Error in main loop: {e}")
         
-        time.sleep(POLL_INTERVAL)
+        metrics.flush()
+        registry.heartbeat("responder", time.time() - loop_start)
+        deadline = min(t for t in (next_poll, scheduler.next_due(), retry_at) if t)
+        scheduler.wait(deadline)
 
 def run_once(log):
     """Run a single scan and process cycle."""
     log.info("Running single scan...")
-    new_comments = scan_for_new_comments(log)
+    with profiler.iteration():
+        new_comments = scan_for_new_comments(log)
     log.info(f"Found {len(new_comments)} new comment(s)")
     
     if new_comments:
@@ -602,6 +674,7 @@ if __name__ == "__main__":
     parser.add_argument("--once", action="store_true", help="Run once and exit")
     parser.add_argument("--stats", action="store_true", help="Show statistics")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="cProfile the first N comment scans into logs/")
     args = parser.parse_args()
     
     init_comment_db()
@@ -610,7 +683,11 @@ if __name__ == "__main__":
         show_stats()
     elif args.once:
         log = setup_logger("responder", verbose=args.verbose)
+        profiler = LoopProfiler("responder", log)
+        profiler.arm(args.profile)
         run_once(log)
     else:
         log = setup_logger("responder", verbose=args.verbose)
+        profiler = LoopProfiler("responder", log)
+        profiler.arm(args.profile)
         run_daemon(log)
\ No newline at end of file
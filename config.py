@@ -5,8 +5,20 @@ All modules import from here for consistent settings and logging.
 """
 
 import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import signal
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+try:
+    import fcntl
+except ImportError:  # Windows - no cross-process locking for all.log
+    fcntl = None
 
 # -----------------------------------------------------------------------------
 # Paths
@@ -17,6 +29,7 @@ LOG_DIR = os.path.join(PROJECT_ROOT, "logs")
 DB_FILE = os.path.join(PROJECT_ROOT, "poster.sqlite3")
 MEDIA_ROOT = os.path.join(PROJECT_ROOT, "media_root")
 MEDIA_SERVER_SCRIPT = os.path.join(PROJECT_ROOT, "media_server.py")
+RUN_DIR = os.path.join(PROJECT_ROOT, "run")  # Runtime sockets and state files
 
 # -----------------------------------------------------------------------------
 # Posting Schedule (24-hour format) - 2025 OPTIMAL TIME WINDOWS
@@ -97,21 +110,140 @@ RATE_LIMITS = {
 POST_DELAY_SECONDS = 30
 CONTAINER_STATUS_TIMEOUT = 300  # 5 minutes
 CONTAINER_STATUS_INTERVAL = 10  # Check every 10 seconds
+MAX_IDLE_SLEEP = 900  # Longest a daemon sleeps with nothing due (safety net for missed wakeups)
 
 # -----------------------------------------------------------------------------
 # Logging Setup
 # -----------------------------------------------------------------------------
 
-def setup_logger(name: str, verbose: bool = False) -> logging.Logger:
+# Queued logging: log calls only enqueue the record; a background listener
+# thread formats it and does the file I/O and rotation off the hot path.
+LOG_QUEUED = os.environ.get("BB_LOG_QUEUED", "1") != "0"
+
+# "text" (default) or "json" (one JSON object per line)
+LOG_FORMAT = os.environ.get("BB_LOG_FORMAT", "text")
+
+_listeners = []  # Running QueueListeners, stopped (and flushed) at exit
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, pid, msg (+ exc)."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler for a log file written by several processes (all.log).
+    
+    Each write holds an flock on <file>.lock, reopens the file if another
+    process has rotated it, and decides on rollover from the size on disk,
+    so only one process rotates and nobody keeps writing to a renamed file.
+    """
+    
+    def __init__(self, filename: str, **kwargs):
+        kwargs["delay"] = True
+        super().__init__(filename, **kwargs)
+        self._lock_file = None
+    
+    def _reopen_if_rotated(self) -> None:
+        if self.stream is None:
+            return
+        try:
+            rotated = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self.stream.close()
+            self.stream = None  # Reopened by FileHandler.emit()
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        if fcntl is None:
+            return super().emit(record)
+        try:
+            if self._lock_file is None:
+                self._lock_file = open(f"{self.baseFilename}.lock", "a")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                super().emit(record)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+    
+    def close(self) -> None:
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class ExcQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps exc_info on the queued record.
+    
+    The stock prepare() folds the traceback into msg and drops exc_info,
+    which suits queues to other processes but means JsonFormatter never sees
+    the exception. Our queue is in-process, so the record can keep it and
+    each handler's formatter renders the traceback its own way.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def _stop_listeners() -> None:
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
+
+
+def _exit_on_sigterm(signum, frame) -> None:
+    # Exit through SystemExit so finally blocks and atexit (_stop_listeners) run
+    # and queued records are flushed; the default action would drop them
+    sys.exit(128 + signum)
+
+
+def _install_sigterm_handler() -> None:
+    """Flush queued logs on SIGTERM, unless the process handles SIGTERM itself."""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
+
+
+def setup_logger(
+    name: str,
+    verbose: bool = False,
+    queued: bool = LOG_QUEUED,
+    log_format: str = LOG_FORMAT,
+) -> logging.Logger:
     """
     Set up a logger that writes to both console and file.
     
     Log files:
         ~/BB-Poster-Automation/logs/scanner.log
         ~/BB-Poster-Automation/logs/poster.log
-        ~/BB-Poster-Automation/logs/all.log (combined)
+        ~/BB-Poster-Automation/logs/all.log (combined, shared by all processes)
     
-    Each log file rotates at 5MB, keeps 5 backups.
+    Each log file rotates at 5MB, keeps 5 backups (all.log: 10MB).
+    With queued=True, handlers run on a background listener thread, which is
+    flushed at exit - including on SIGTERM, if the process has no handler of its own.
     """
     # Create logs directory
     os.makedirs(LOG_DIR, exist_ok=True)
@@ -124,16 +256,18 @@ def setup_logger(name: str, verbose: bool = False) -> logging.Logger:
         return logger
     
     # Format
-    formatter = logging.Formatter(
-        "%(asctime)s [%(levelname)s] [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s [%(levelname)s] [%(name)s] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
     
     # Console handler
     console = logging.StreamHandler()
     console.setLevel(logging.DEBUG if verbose else logging.INFO)
     console.setFormatter(formatter)
-    logger.addHandler(console)
     
     # Module-specific log file
     module_log = os.path.join(LOG_DIR, f"{name}.log")
@@ -145,11 +279,10 @@ def setup_logger(name: str, verbose: bool = False) -> logging.Logger:
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
     
-    # Combined log file (all modules)
+    # Combined log file (all modules, all processes)
     combined_log = os.path.join(LOG_DIR, "all.log")
-    combined_handler = RotatingFileHandler(
+    combined_handler = SharedRotatingFileHandler(
         combined_log,
         maxBytes=10 * 1024 * 1024,  # 10MB
         backupCount=5,
@@ -157,7 +290,21 @@ def setup_logger(name: str, verbose: bool = False) -> logging.Logger:
     )
     combined_handler.setLevel(logging.DEBUG)
     combined_handler.setFormatter(formatter)
-    logger.addHandler(combined_handler)
+    
+    handlers = [console, file_handler, combined_handler]
+    
+    if queued:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        if not _listeners:
+            atexit.register(_stop_listeners)
+            _install_sigterm_handler()
+        _listeners.append(listener)
+        logger.addHandler(ExcQueueHandler(log_queue))
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
     
     return logger
 
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Pre-publish media conformance for BB-Poster-Automation.
+
+Sits between the scanner and the poster: every pending job is checked
+against its platform's media spec and, where possible, fixed up front
+instead of failing at the Graph API container stage:
+
+  - Instagram Photos/Feeds   aspect 4:5 .. 1.91:1, JPEG, <= 1440px wide
+                             (padded to 1080x1350 over a blurred copy otherwise)
+  - Instagram Stories/Reels  9:16 1080x1920, H.264/AAC MP4, <= 60 fps,
+                             stories <= 60s, reels 3s .. 15min
+  - Twitter images           <= 5 MB, JPEG/PNG/WEBP/GIF
+
+Fixed-up copies ("derivatives") are cached in .cache/conformed/, keyed by the
+source file's path, size and mtime plus CONFORM_VERSION, so a job is only
+transcoded once. The result is stored on the job:
+
+    conform_status   'ok'         original already conforms
+                     'conformed'  conformed_path holds the derivative
+                     'failed'     media can't be made publishable (job is failed):
+                                  too short / too long, no video stream, or
+                                  an image that doesn't decode
+                     'unchecked'  ffprobe / PIL unavailable, or probing or
+                                  fixing errored - original is posted
+    conformed_path   derivative path relative to PROJECT_ROOT
+    conform_stamp    source "size:mtime_ns" the result was computed for
+
+The scanner conforms pending jobs each loop (soonest scheduled first); the
+poster calls publish_path(), which conforms inline anything not yet checked,
+still 'unchecked', or whose source changed since (conform_stamp differs).
+Over-length videos are failed rather than cut, so nothing is silently dropped.
+
+Usage:
+    python3 conformance.py                 # Conform all pending jobs
+    python3 conformance.py --check FILE --platform Instagram --content-type Reels
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+import db
+from config import PROJECT_ROOT, setup_logger
+from story_processor import probe_media
+
+try:
+    from PIL import Image, ImageOps
+    from fix_ig_photo_aspect import pad_blur
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Bump when the conforming pipeline changes its output (invalidates cached derivatives)
+CONFORM_VERSION = 1
+
+CONFORM_CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "conformed")
+CONFORM_BATCH = 10  # Jobs conformed per scanner loop
+
+STATUS_OK = "ok"
+STATUS_CONFORMED = "conformed"
+STATUS_FAILED = "failed"
+STATUS_UNCHECKED = "unchecked"
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
+
+IG_FEED_IMAGE = {
+    "aspect": (0.8, 1.91), "canvas": (1080, 1350), "max_width": 1440, "formats": {"JPEG"},
+}
+IG_FEED_VIDEO = {
+    "aspect": (0.8, 1.91), "canvas": (1080, 1350), "max_width": 1920, "max_fps": 60,
+    "min_duration": 3, "max_duration": 3600,
+}
+IG_VERTICAL_IMAGE = {
+    "aspect": (0.5625 - 0.01, 0.5625 + 0.01), "canvas": (1080, 1920), "max_width": 1440, "formats": {"JPEG"},
+}
+IG_STORY_VIDEO = {
+    "aspect": (0.5625 - 0.01, 0.5625 + 0.01), "canvas": (1080, 1920), "max_width": 1920, "max_fps": 60,
+    "min_duration": 1, "max_duration": 60,
+}
+IG_REEL_VIDEO = dict(IG_STORY_VIDEO, min_duration=3, max_duration=900)
+TWITTER_IMAGE = {
+    "max_bytes": 5 * 1024 * 1024, "max_width": 4096, "formats": {"JPEG", "PNG", "WEBP", "GIF"},
+}
+
+# (platform, content_type, is_video): spec - combinations not listed are posted as-is
+SPECS: Dict[Tuple[str, str, bool], Dict[str, Any]] = {
+    ("Instagram", "Photos", False): IG_FEED_IMAGE,
+    ("Instagram", "Feeds", False): IG_FEED_IMAGE,
+    ("Instagram", "Photos", True): IG_FEED_VIDEO,
+    ("Instagram", "Feeds", True): IG_FEED_VIDEO,
+    ("Instagram", "Videos", True): IG_FEED_VIDEO,
+    ("Instagram", "Stories", False): IG_VERTICAL_IMAGE,
+    ("Instagram", "Stories", True): IG_STORY_VIDEO,
+    ("Instagram", "Reels", True): IG_REEL_VIDEO,
+    ("Twitter", "Photos", False): TWITTER_IMAGE,
+    ("Twitter", "Feeds", False): TWITTER_IMAGE,
+}
+
+
+def is_video(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def get_spec(platform: str, content_type: str, path: str) -> Optional[Dict[str, Any]]:
+    return SPECS.get((platform, content_type, is_video(path)))
+
+
+def source_stamp(src_path: str) -> Optional[str]:
+    """Size and mtime of a source file ("size:mtime_ns"), None if it's missing."""
+    try:
+        st = os.stat(src_path)
+    except OSError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def derivative_path(src_path: str, platform: str, content_type: str, ext: str) -> str:
+    """Cache path for the conformed copy of a source file (absolute)."""
+    st = os.stat(src_path)
+    key = hashlib.sha256(
+        f"{src_path}|{st.st_size}|{st.st_mtime_ns}|{platform}|{content_type}|{CONFORM_VERSION}".encode()
+    ).hexdigest()[:24]
+    return os.path.join(CONFORM_CACHE_DIR, f"{key}{ext}")
+
+
+# -----------------------------------------------------------------------------
+# Checks
+# -----------------------------------------------------------------------------
+
+def check_image(path: str, spec: Dict[str, Any]) -> List[str]:
+    """Spec violations of an image (empty list = publishable as-is)."""
+    problems = []
+    if "max_bytes" in spec and os.path.getsize(path) > spec["max_bytes"]:
+        problems.append(f"file size {os.path.getsize(path) / 1e6:.1f} MB > {spec['max_bytes'] / 1e6:.0f} MB")
+
+    with Image.open(path) as im:
+        fmt = im.format
+        w, h = im.size
+        if im.getexif().get(0x0112) in (5, 6, 7, 8):  # EXIF orientation: displayed rotated 90 degrees
+            w, h = h, w
+
+    if fmt not in spec["formats"]:
+        problems.append(f"format {fmt}")
+    if "aspect" in spec:
+        low, high = spec["aspect"]
+        if not low <= w / h <= high:
+            problems.append(f"aspect {w}x{h} ({w / h:.2f}) outside {low:.2f}..{high:.2f}")
+    if w > spec["max_width"]:
+        problems.append(f"width {w} > {spec['max_width']}")
+    return problems
+
+
+def check_video(info: Dict[str, Any], path: str, spec: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """
+    Spec violations of a video, split into (fixable, fatal).
+    Fatal problems can't be fixed by transcoding - over-length videos are
+    fatal too, since cutting them would drop content without anyone noticing.
+    """
+    fixable, fatal = [], []
+    w, h = info["width"], info["height"]
+    if not w or not h:
+        fatal.append("no video stream")
+        return fixable, fatal
+
+    if os.path.splitext(path)[1].lower() != ".mp4":
+        fixable.append(f"container {os.path.splitext(path)[1]}")
+    if info["video_codec"] != "h264" or info["pix_fmt"] not in ("yuv420p", "yuvj420p"):
+        fixable.append(f"video {info['video_codec']}/{info['pix_fmt']}")
+    if info["audio_codec"] and info["audio_codec"] != "aac":
+        fixable.append(f"audio {info['audio_codec']}")
+    low, high = spec["aspect"]
+    if not low <= w / h <= high:
+        fixable.append(f"aspect {w}x{h} ({w / h:.2f}) outside {low:.2f}..{high:.2f}")
+    if w > spec["max_width"]:
+        fixable.append(f"width {w} > {spec['max_width']}")
+    if info["fps"] > spec["max_fps"]:
+        fixable.append(f"{info['fps']:.0f} fps > {spec['max_fps']}")
+    if info["duration"] > spec["max_duration"]:
+        fatal.append(f"duration {info['duration']:.1f}s > {spec['max_duration']}s limit - trim the source")
+    if info["duration"] < spec["min_duration"]:
+        fatal.append(f"duration {info['duration']:.1f}s < {spec['min_duration']}s")
+    return fixable, fatal
+
+
+# -----------------------------------------------------------------------------
+# Fixers
+# -----------------------------------------------------------------------------
+
+def conform_image(src_path: str, dst_path: str, spec: Dict[str, Any]) -> None:
+    """Write a publishable JPEG of src_path to dst_path."""
+    canvas = spec.get("canvas")
+    with Image.open(src_path) as im:
+        im.draft("RGB", canvas or (spec["max_width"], spec["max_width"]))
+        im = ImageOps.exif_transpose(im).convert("RGB")
+
+        if "aspect" in spec:
+            low, high = spec["aspect"]
+            if not low <= im.width / im.height <= high:
+                im = pad_blur(im, *canvas)
+        if im.width > spec["max_width"]:
+            im.thumbnail((spec["max_width"], spec["max_width"] * 4), Image.LANCZOS)
+
+        quality = 92
+        im.save(dst_path, "JPEG", quality=quality, optimize=True)
+        # Size-limited platforms: step quality down, then dimensions
+        while "max_bytes" in spec and os.path.getsize(dst_path) > spec["max_bytes"]:
+            if quality > 70:
+                quality -= 8
+            else:
+                im.thumbnail((int(im.width * 0.8), int(im.height * 0.8)), Image.LANCZOS)
+            im.save(dst_path, "JPEG", quality=quality, optimize=True)
+
+
+def conform_video(src_path: str, dst_path: str, spec: Dict[str, Any], info: Dict[str, Any]) -> None:
+    """Write a publishable MP4 of src_path to dst_path (remux only when the streams already conform)."""
+    low, high = spec["aspect"]
+    w, h = info["width"], info["height"]
+    needs_video = (
+        info["video_codec"] != "h264" or info["pix_fmt"] not in ("yuv420p", "yuvj420p")
+        or not low <= w / h <= high or w > spec["max_width"] or info["fps"] > spec["max_fps"]
+    )
+
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", src_path, "-map", "0:v:0", "-map", "0:a:0?"]
+    if needs_video:
+        filters = []
+        if not low <= w / h <= high:
+            cw, ch = spec["canvas"]
+            filters.append(f"scale={cw}:{ch}:force_original_aspect_ratio=decrease,"
+                           f"pad={cw}:{ch}:(ow-iw)/2:(oh-ih)/2:black,setsar=1")
+        elif w > spec["max_width"]:
+            filters.append(f"scale={spec['max_width']}:-2")
+        if info["fps"] > spec["max_fps"]:
+            filters.append("fps=30")
+        if filters:
+            cmd += ["-vf", ",".join(filters)]
+        cmd += ["-c:v", "libx264", "-preset", "fast", "-crf", "20", "-pix_fmt", "yuv420p"]
+    else:
+        cmd += ["-c:v", "copy"]
+
+    cmd += ["-c:a", "copy"] if info["audio_codec"] in ("aac", None) else ["-c:a", "aac", "-b:a", "192k"]
+    cmd += ["-movflags", "+faststart", "-f", "mp4", dst_path]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-300:]}")
+
+
+# -----------------------------------------------------------------------------
+# Conforming
+# -----------------------------------------------------------------------------
+
+def conform(file_path: str, platform: str, content_type: str) -> Tuple[str, Optional[str], str]:
+    """
+    Make one media file publishable for a platform/content type.
+
+    Args:
+        file_path: Path relative to PROJECT_ROOT (as stored in media_files)
+
+    Returns:
+        (conform_status, conformed_path relative to PROJECT_ROOT or None, message)
+    """
+    src_path = os.path.join(PROJECT_ROOT, file_path)
+    spec = get_spec(platform, content_type, file_path)
+    if spec is None:
+        return STATUS_OK, None, "no spec"
+    if not os.path.isfile(src_path):
+        return STATUS_UNCHECKED, None, "file not found"
+
+    video = is_video(file_path)
+    if video and not shutil.which("ffprobe"):
+        return STATUS_UNCHECKED, None, "ffprobe not installed"
+    if not video and not PIL_AVAILABLE:
+        return STATUS_UNCHECKED, None, "PIL not installed"
+
+    ext = ".mp4" if video else ".jpg"
+    dst_path = derivative_path(src_path, platform, content_type, ext)
+    rel_dst = os.path.relpath(dst_path, PROJECT_ROOT)
+    if os.path.exists(dst_path):
+        return STATUS_CONFORMED, rel_dst, "cached"
+
+    # Only spec violations and undecodable images fail the job; a probe or
+    # tool error leaves it unchecked (original is posted, re-checked at publish)
+    if video:
+        try:
+            info = probe_media(src_path)
+        except Exception as e:
+            return STATUS_UNCHECKED, None, f"probe failed: {e}"
+        problems, fatal = check_video(info, file_path, spec)
+        if fatal:
+            return STATUS_FAILED, None, "; ".join(fatal)
+    else:
+        try:
+            problems = check_image(src_path, spec)
+        except Exception as e:
+            return STATUS_FAILED, None, f"cannot decode image: {e}"
+    if not problems:
+        return STATUS_OK, None, "conforms"
+
+    tmp = f"{dst_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CONFORM_CACHE_DIR, exist_ok=True)
+        if video:
+            conform_video(src_path, tmp, spec, info)
+        else:
+            conform_image(src_path, tmp, spec)
+        os.replace(tmp, dst_path)
+    except Exception as e:
+        return STATUS_UNCHECKED, None, f"{'; '.join(problems)}; conforming failed: {e}"
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    return STATUS_CONFORMED, rel_dst, "; ".join(problems)
+
+
+def conform_job(job: Dict[str, Any], mark_failed: bool = True) -> Tuple[str, Optional[str], str]:
+    """
+    Conform a job and store the result. With mark_failed, unpublishable jobs
+    are marked failed right away; the poster passes False and records the
+    failure itself (once) as the outcome of its attempt.
+    """
+    # Stamp taken first: an edit during conforming then shows up as a mismatch
+    stamp = source_stamp(os.path.join(PROJECT_ROOT, job["file_path"]))
+    status, conformed_path, message = conform(job["file_path"], job["platform"], job["content_type"])
+    db.set_conform_result(job["id"], status, conformed_path, stamp)
+    if status == STATUS_FAILED and mark_failed:
+        db.update_job_status(job["id"], db.STATUS_FAILED, error_message=f"Media not publishable: {message}")
+    return status, conformed_path, message
+
+
+def conform_pending(limit: int = CONFORM_BATCH, logger=None) -> int:
+    """Conform up to `limit` unchecked pending jobs, soonest scheduled first. Returns jobs checked."""
+    jobs = db.get_unconformed_jobs(limit)
+    for job in jobs:
+        status, conformed_path, message = conform_job(job)
+        if logger:
+            log = logger.warning if status in (STATUS_FAILED, STATUS_UNCHECKED) else logger.info
+            log(f"Conform [{job['id']}] {job['platform']}/{job['content_type']} {job['file_path']}: "
+                f"{status}{' -> ' + conformed_path if conformed_path else ''} ({message})")
+    return len(jobs)
+
+
+def publish_path(job: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    """
+    Path (relative to PROJECT_ROOT) the poster should upload for a job.
+
+    Conforms inline if the scanner hasn't reached the job yet, if it is still
+    'unchecked', if the source changed since it was conformed, or if the
+    cached derivative is gone. Returns (None, error) if the media can't be
+    published; the job's status is left to the caller.
+    """
+    status = job.get("conform_status")
+    conformed_path = job.get("conformed_path")
+    stale = (status in (None, STATUS_UNCHECKED)
+             or job.get("conform_stamp") != source_stamp(os.path.join(PROJECT_ROOT, job["file_path"]))
+             or (status == STATUS_CONFORMED
+                 and not os.path.isfile(os.path.join(PROJECT_ROOT, conformed_path or ""))))
+    if stale:
+        status, conformed_path, message = conform_job(job, mark_failed=False)
+        if job.get("conformed_path") and job["conformed_path"] != conformed_path:
+            discard(job)  # Derivative of the previous version of the source
+        if status == STATUS_FAILED:
+            return None, f"Media not publishable: {message}"
+
+    if status == STATUS_FAILED:
+        return None, "Media not publishable (see conformance log)"
+    return conformed_path or job["file_path"], ""
+
+
+def discard(job: Dict[str, Any]) -> None:
+    """Delete a job's cached derivative once it has been posted."""
+    conformed_path = job.get("conformed_path")
+    if conformed_path:
+        try:
+            os.remove(os.path.join(PROJECT_ROOT, conformed_path))
+        except OSError:
+            pass
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Conform pending media to platform specs")
+    parser.add_argument("--check", metavar="FILE", help="Check/conform one file (relative to PROJECT_ROOT) and exit")
+    parser.add_argument("--platform", default="Instagram", help="Platform for --check (default: Instagram)")
+    parser.add_argument("--content-type", default="Photos", help="Content type for --check (default: Photos)")
+    parser.add_argument("--limit", type=int, default=1000, help="Max pending jobs to conform (default: 1000)")
+    args = parser.parse_args()
+
+    if args.check:
+        status, conformed_path, message = conform(args.check, args.platform, args.content_type)
+        print(f"{status}: {conformed_path or args.check} ({message})")
+        return
+
+    logger = setup_logger("conformance")
+    db.init_db()
+    total = 0
+    while total < args.limit:
+        checked = conform_pending(min(CONFORM_BATCH, args.limit - total), logger=logger)
+        if not checked:
+            break
+        total += checked
+    print(f"Conformed {total} pending job(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,25 @@
 Enhanced Dashboard with Login & Comment Approval - BB-Poster-Automation
 Fixed: Replaced emojis with Font Awesome icons for cross-browser compatibility
 """
-import os, sys, json, sqlite3, subprocess, requests, secrets, random, shutil
+import os, sys, json, sqlite3, subprocess, requests, secrets, random, shutil, threading
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from functools import wraps
-from flask import Flask, render_template_string, request, redirect, url_for, make_response, send_from_directory
+from flask import Flask, render_template_string, request, redirect, url_for, make_response, send_from_directory, send_file, g
+from werkzeug.utils import safe_join
+
+from api_cache import SWRCache
+import db
+import registry
+from metrics import read_metrics, read_points, render_prometheus
+from thumbnails import DerivativeCache, DERIVATIVE_SIZES, VIDEO_EXTENSIONS, source_version
 
 PROJECT_ROOT = os.path.expanduser("~/BB-Poster-Automation")
 DB_FILE = os.path.join(PROJECT_ROOT, "poster.sqlite3")
 PHOTOS_DIR = os.path.join(PROJECT_ROOT, "United_States", "Nyssa_Bloom", "Instagram", "Photos")
 STORIES_DIR = os.path.join(PROJECT_ROOT, "United_States", "Nyssa_Bloom", "Instagram", "Stories")
 TWITTER_PHOTOS_DIR = os.path.join(PROJECT_ROOT, "United_States", "Nyssa_Bloom", "Twitter", "Photos")
+REVIEW_MODEL, REVIEW_PLATFORM = "Nyssa_Bloom", "Instagram"  # Account shown on the posts review page
 FB_GRAPH_API = "https://graph.facebook.com/v21.0"
 
 # Twitter support
@@ -35,66 +44,93 @@ COOKIE_NAME = "nyssa_auth"
 COOKIE_MAX_AGE = 30 * 24 * 60 * 60  # 30 days
 TOKENS_FILE = os.path.join(PROJECT_ROOT, ".dashboard_tokens")
 
+# Bearer token for Prometheus scraping /metrics (unset = login cookie only).
+# Not a localhost allowance: the Cloudflare tunnel reaches us from 127.0.0.1 too.
+METRICS_TOKEN = os.environ.get("BB_METRICS_TOKEN", "")
+
 def generate_auth_token():
     return secrets.token_hex(32)
 
-def load_tokens():
-    """Load valid tokens from file - returns dict of token: role"""
+# Tokens are kept in memory and only re-read when .dashboard_tokens changes
+_token_cache = {"stamp": None, "tokens": {}}
+_token_lock = threading.Lock()
+_token_write_lock = threading.RLock()  # Serializes read-modify-write of TOKENS_FILE across request threads
+
+def read_tokens_file():
+    """Parse the tokens file - returns dict of token: role"""
+    tokens = {}
     try:
-        if os.path.exists(TOKENS_FILE):
-            with open(TOKENS_FILE, 'r') as f:
-                tokens = {}
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        parts = line.split(':')
-                        if len(parts) == 2:
-                            tokens[parts[0]] = parts[1]  # token: role
-                        else:
-                            tokens[line] = 'admin'  # legacy tokens default to admin
-                return tokens
+        with open(TOKENS_FILE, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    parts = line.split(':')
+                    if len(parts) == 2:
+                        tokens[parts[0]] = parts[1]  # token: role
+                    else:
+                        tokens[line] = 'admin'  # legacy tokens default to admin
     except:
         pass
-    return {}
+    return tokens
+
+def tokens_file_stamp():
+    try:
+        st = os.stat(TOKENS_FILE)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def load_tokens():
+    """Load valid tokens - returns dict of token: role (cached until the file changes)"""
+    stamp = tokens_file_stamp()
+    with _token_lock:
+        if stamp != _token_cache["stamp"]:
+            _token_cache["tokens"] = read_tokens_file() if stamp else {}
+            _token_cache["stamp"] = stamp
+        return _token_cache["tokens"]
 
 def save_tokens(tokens):
     """Save valid tokens to file - tokens is dict of token: role"""
     try:
-        with open(TOKENS_FILE, 'w') as f:
-            for token, role in tokens.items():
-                f.write(f"{token}:{role}\n")
+        with _token_write_lock:
+            tmp = f"{TOKENS_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w') as f:
+                for token, role in tokens.items():
+                    f.write(f"{token}:{role}\n")
+            os.replace(tmp, TOKENS_FILE)  # Atomic - readers never see a half-written file
+            with _token_lock:
+                _token_cache["tokens"] = dict(tokens)
+                _token_cache["stamp"] = tokens_file_stamp()
     except:
         pass
 
 def add_token(token, role='admin'):
     """Add a new valid token with role"""
-    tokens = load_tokens()
-    tokens[token] = role
-    # Keep only last 20 tokens to prevent unlimited growth
-    if len(tokens) > 20:
-        items = list(tokens.items())[-20:]
-        tokens = dict(items)
-    save_tokens(tokens)
+    with _token_write_lock:
+        tokens = dict(load_tokens())
+        tokens[token] = role
+        # Keep only last 20 tokens to prevent unlimited growth
+        if len(tokens) > 20:
+            items = list(tokens.items())[-20:]
+            tokens = dict(items)
+        save_tokens(tokens)
 
 def remove_token(token):
     """Remove a token (logout)"""
-    tokens = load_tokens()
-    tokens.pop(token, None)
-    save_tokens(tokens)
+    with _token_write_lock:
+        tokens = dict(load_tokens())
+        tokens.pop(token, None)
+        save_tokens(tokens)
 
 def get_user_role():
-    """Get the role of the current user (admin or guest)"""
-    token = request.cookies.get(COOKIE_NAME)
-    if not token:
-        return None
-    tokens = load_tokens()
-    return tokens.get(token)
+    """Get the role of the current user (admin or guest), looked up once per request"""
+    if 'user_role' not in g:
+        token = request.cookies.get(COOKIE_NAME)
+        g.user_role = load_tokens().get(token) if token else None
+    return g.user_role
 
 def is_authenticated():
-    token = request.cookies.get(COOKIE_NAME)
-    if not token:
-        return False
-    return token in load_tokens()
+    return get_user_role() is not None
 
 def is_admin():
     """Check if current user is admin"""
@@ -108,6 +144,21 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
+def requires_metrics_auth(f):
+    """Accept a logged-in user or Authorization: Bearer <BB_METRICS_TOKEN> (401 instead of a login redirect)"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth = request.headers.get('Authorization', '')
+        bearer = auth[7:].strip() if auth[:7].lower() == 'bearer ' else ''
+        if METRICS_TOKEN and bearer and secrets.compare_digest(bearer, METRICS_TOKEN):
+            return f(*args, **kwargs)
+        if is_authenticated():
+            return f(*args, **kwargs)
+        response = make_response("Unauthorized\n", 401)
+        response.headers['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    return decorated
+
 def requires_admin(f):
     """Decorator for admin-only routes"""
     @wraps(f)
@@ -262,6 +313,7 @@ DASHBOARD_HTML = """
     <div class="container">
         <h1><i class="fas fa-camera-retro"></i> Nyssa Bloom Dashboard</h1>
         <p class="subtitle">Last updated: {{ current_time }} | {% if user_role == 'admin' %}<span style="background: #4ade80; color: #000; padding: 2px 8px; border-radius: 4px; font-size: 0.75rem;"><i class="fas fa-crown"></i> Admin</span>{% else %}<span style="background: #60a5fa; color: #000; padding: 2px 8px; border-radius: 4px; font-size: 0.75rem;"><i class="fas fa-eye"></i> Guest (Read-Only)</span>{% endif %}</p>
+        {% if degraded_panels %}<p class="subtitle" style="color: #fbbf24;"><i class="fas fa-exclamation-triangle"></i> Unavailable: {{ degraded_panels|join(', ') }}</p>{% endif %}
         
         <div class="nav">
             <a href="/" class="active"><i class="fas fa-chart-line"></i> Dashboard</a>
@@ -329,7 +381,7 @@ DASHBOARD_HTML = """
                 <div class="service-status">
                     <div class="service-dot {{ 'running' if service.running else 'stopped' }}"></div>
                     <span>{{ service.name }}</span>
-                    <span style="margin-left: auto; color: #888; font-size: 0.8rem;">{{ 'PID ' + service.pid|string if service.running else 'Stopped' }}</span>
+                    <span style="margin-left: auto; color: #888; font-size: 0.8rem;">{{ 'PID ' + service.pid|string if service.running else 'Stopped' }}{% if service.heartbeat %} &middot; {{ service.heartbeat }}{% endif %}</span>
                 </div>
                 {% endfor %}
             </div>
@@ -453,8 +505,54 @@ DASHBOARD_HTML = """
                 </div>
             </div>
         </div>
+        <div class="grid">
+            <div class="card card-full">
+                <h2><i class="fas fa-tachometer-alt"></i> Performance (24h)
+                    <select id="metricSelect" style="float: right; background: #1a1a2e; color: #eee; border: 1px solid rgba(255,255,255,0.2); border-radius: 4px;">
+                        <option value="post_delay_seconds">Post delay after schedule (s)</option>
+                        <option value="queue_depth">Queue depth</option>
+                        <option value="scan_duration_seconds">Scan duration (s)</option>
+                        <option value="container_wait_seconds">Container wait (s)</option>
+                        <option value="openai_request_seconds">OpenAI latency (s)</option>
+                        <option value="media_request_seconds">Media request latency (s)</option>
+                    </select>
+                </h2>
+                <canvas id="metricChart" height="160" style="width: 100%;"></canvas>
+                <div id="metricSummary" style="color: #888; font-size: 0.8rem; margin-top: 8px;"></div>
+            </div>
+        </div>
         <p class="refresh-note">Auto-refreshes every 60 seconds</p>
     </div>
+    <script>
+        // Plain canvas line chart of /api/metrics points
+        function drawMetric(name) {
+            fetch('/api/metrics?name=' + name + '&hours=24').then(function(r) { return r.json(); }).then(function(data) {
+                var canvas = document.getElementById('metricChart');
+                var ctx = canvas.getContext('2d');
+                canvas.width = canvas.clientWidth;
+                ctx.clearRect(0, 0, canvas.width, canvas.height);
+                var points = data.points;
+                var summary = document.getElementById('metricSummary');
+                if (!points.length) { summary.textContent = 'No data yet'; return; }
+                var t0 = data.since, t1 = data.until;
+                var max = Math.max.apply(null, points.map(function(p) { return p.value; })) || 1;
+                var pad = 10, w = canvas.width - 2 * pad, h = canvas.height - 2 * pad;
+                ctx.strokeStyle = '#e94560'; ctx.fillStyle = '#e94560'; ctx.lineWidth = 1.5;
+                ctx.beginPath();
+                points.forEach(function(p, i) {
+                    var x = pad + (p.ts - t0) / (t1 - t0) * w, y = pad + h - p.value / max * h;
+                    if (i === 0) { ctx.moveTo(x, y); } else { ctx.lineTo(x, y); }
+                    ctx.fillRect(x - 1.5, y - 1.5, 3, 3);
+                });
+                ctx.stroke();
+                var avg = points.reduce(function(a, p) { return a + p.value; }, 0) / points.length;
+                summary.textContent = points.length + ' samples | max ' + max.toFixed(2) + ' | avg ' + avg.toFixed(2);
+            });
+        }
+        var metricSelect = document.getElementById('metricSelect');
+        metricSelect.addEventListener('change', function() { drawMetric(this.value); });
+        drawMetric(metricSelect.value);
+    </script>
 </body>
 </html>
 """
@@ -824,7 +922,7 @@ POST_REVIEW_HTML = """
                         {% if today_data.photos[slot] and today_data.photos[slot].exists %}
                         <div class="card-body">
                             <div class="post-content">
-                                <img src="/media/Photos/{{ today_data.photos[slot].filename }}" class="post-image" alt="{{ slot }} Photo">
+                                <img src="/media/Photos/{{ today_data.photos[slot].filename }}?size=thumb&v={{ today_data.photos[slot].version }}" class="post-image" loading="lazy" alt="{{ slot }} Photo">
                                 <div class="post-details">
                                     <div class="caption-container">
                                         <div class="caption-text collapsed" id="caption-today-photos-{{ slot }}">{{ today_data.photos[slot].caption }}</div>
@@ -873,11 +971,11 @@ POST_REVIEW_HTML = """
                             <div class="post-content">
                                 {% if today_data.stories[slot].is_video %}
                                 <div class="video-container">
-                                    <video src="/media/Stories/{{ today_data.stories[slot].filename }}" class="post-video story" muted></video>
+                                    <video src="/media/Stories/{{ today_data.stories[slot].filename }}?v={{ today_data.stories[slot].version }}" poster="/media/Stories/{{ today_data.stories[slot].filename }}?size=thumb&v={{ today_data.stories[slot].version }}" class="post-video story" muted preload="none"></video>
                                     <i class="fas fa-play-circle play-icon"></i>
                                 </div>
                                 {% else %}
-                                <img src="/media/Stories/{{ today_data.stories[slot].filename }}" class="post-image story" alt="{{ slot }} Story">
+                                <img src="/media/Stories/{{ today_data.stories[slot].filename }}?size=thumb&v={{ today_data.stories[slot].version }}" class="post-image story" loading="lazy" alt="{{ slot }} Story">
                                 {% endif %}
                                 <div class="post-details">
                                     <div class="caption-text">{{ today_data.stories[slot].caption_preview or '(No caption)' }}</div>
@@ -928,7 +1026,7 @@ POST_REVIEW_HTML = """
                         {% if tomorrow_data.photos[slot] and tomorrow_data.photos[slot].exists %}
                         <div class="card-body">
                             <div class="post-content">
-                                <img src="/media/Photos/{{ tomorrow_data.photos[slot].filename }}" class="post-image" alt="{{ slot }} Photo">
+                                <img src="/media/Photos/{{ tomorrow_data.photos[slot].filename }}?size=thumb&v={{ tomorrow_data.photos[slot].version }}" class="post-image" loading="lazy" alt="{{ slot }} Photo">
                                 <div class="post-details">
                                     <div class="caption-container">
                                         <div class="caption-text collapsed" id="caption-tomorrow-photos-{{ slot }}">{{ tomorrow_data.photos[slot].caption }}</div>
@@ -977,11 +1075,11 @@ POST_REVIEW_HTML = """
                             <div class="post-content">
                                 {% if tomorrow_data.stories[slot].is_video %}
                                 <div class="video-container">
-                                    <video src="/media/Stories/{{ tomorrow_data.stories[slot].filename }}" class="post-video story" muted></video>
+                                    <video src="/media/Stories/{{ tomorrow_data.stories[slot].filename }}?v={{ tomorrow_data.stories[slot].version }}" poster="/media/Stories/{{ tomorrow_data.stories[slot].filename }}?size=thumb&v={{ tomorrow_data.stories[slot].version }}" class="post-video story" muted preload="none"></video>
                                     <i class="fas fa-play-circle play-icon"></i>
                                 </div>
                                 {% else %}
-                                <img src="/media/Stories/{{ tomorrow_data.stories[slot].filename }}" class="post-image story" alt="{{ slot }} Story">
+                                <img src="/media/Stories/{{ tomorrow_data.stories[slot].filename }}?size=thumb&v={{ tomorrow_data.stories[slot].version }}" class="post-image story" loading="lazy" alt="{{ slot }} Story">
                                 {% endif %}
                                 <div class="post-details">
                                     <div class="caption-text">{{ tomorrow_data.stories[slot].caption_preview or '(No caption)' }}</div>
@@ -1060,7 +1158,7 @@ POST_REVIEW_HTML = """
                 document.getElementById('modalDateStr').value = dateStr;
                 document.getElementById('modalSlot').value = slot;
                 document.getElementById('modalCaption').value = caption;
-                document.getElementById('modalImage').src = '/media/' + contentType + '/' + filename;
+                document.getElementById('modalImage').src = '/media/' + contentType + '/' + filename + '?size=preview';
                 document.getElementById('editModal').classList.add('active');
             });
         });
@@ -1087,50 +1185,77 @@ POST_REVIEW_HTML = """
 # POST REVIEW HELPER FUNCTIONS
 # =============================================================================
 
-def parse_filename_date(filename):
-    """Parse MM_DD_YYYY_am/pm from filename"""
+# Preview cards load small cached derivatives (see thumbnails.py), not the originals
+THUMB_CACHE_DIR = os.path.join(PROJECT_ROOT, ".thumb_cache")
+media_cache = DerivativeCache(THUMB_CACHE_DIR)
+
+def date_str_to_iso(date_str):
+    """Convert MM_DD_YYYY to the YYYY-MM-DD schedule_date format"""
+    month, day, year = date_str.split('_')
+    return f"{int(year):04d}-{int(month):02d}-{int(day):02d}"
+
+def get_schedule_index(dates, content_types=('Photos', 'Stories')):
+    """
+    Look up scheduled media for the given dates in one indexed query.
+    Returns dict of (content_type, 'YYYY-MM-DD', slot): row
+    """
+    index = {}
+    if not dates:
+        return index
+    date_marks = ','.join('?' * len(dates))
+    type_marks = ','.join('?' * len(content_types))
     try:
-        base = os.path.splitext(filename)[0]
-        parts = base.split('_')
-        if len(parts) >= 4:
-            month, day, year = int(parts[0]), int(parts[1]), int(parts[2])
-            slot = parts[3].lower()
-            return datetime(year, month, day), slot
-    except:
-        pass
-    return None, None
+        con = sqlite3.connect(DB_FILE)
+        rows = con.execute(f"""
+            SELECT content_type, schedule_date, schedule_slot, file_path, scheduled_for, status, caption
+            FROM media_files
+            WHERE model_name = ? AND platform = ?
+              AND content_type IN ({type_marks}) AND schedule_date IN ({date_marks})
+            ORDER BY detected_at ASC, id ASC
+        """, (REVIEW_MODEL, REVIEW_PLATFORM, *content_types, *[d.strftime("%Y-%m-%d") for d in dates])).fetchall()
+        con.close()
+        # Latest detected row wins (e.g. a swap that changed the file extension)
+        for content_type, schedule_date, slot, file_path, scheduled_for, status, caption in rows:
+            index[(content_type, schedule_date, slot)] = {
+                'file_path': file_path, 'scheduled_for': scheduled_for, 'status': status, 'caption': caption
+            }
+    except Exception as e:
+        print(f"Error reading schedule index: {e}")
+    return index
 
 def get_next_posting_day():
     """Get the next day that has posts scheduled"""
     today = datetime.now().date()
     
-    for days_ahead in range(0, 60):
-        check_date = today + timedelta(days=days_ahead)
-        date_str = check_date.strftime("%m_%d_%Y")
-        
-        am_file = os.path.join(PHOTOS_DIR, f"{date_str}_am.jpg")
-        pm_file = os.path.join(PHOTOS_DIR, f"{date_str}_pm.jpg")
+    try:
+        con = sqlite3.connect(DB_FILE)
+        days = [row[0] for row in con.execute("""
+            SELECT DISTINCT schedule_date FROM media_files
+            WHERE model_name = ? AND platform = ? AND content_type = 'Photos'
+              AND schedule_date BETWEEN ? AND ?
+            ORDER BY schedule_date ASC LIMIT 2
+        """, (REVIEW_MODEL, REVIEW_PLATFORM, today.isoformat(), (today + timedelta(days=59)).isoformat()))]
         
-        if os.path.exists(am_file) or os.path.exists(pm_file):
-            if days_ahead == 0:
-                try:
-                    con = sqlite3.connect(DB_FILE)
-                    today_start = datetime.combine(today, datetime.min.time())
-                    cur = con.execute("SELECT COUNT(*) FROM media_files WHERE posted_at >= ? AND status = 'posted'", 
-                                     (int(today_start.timestamp()),))
-                    posted_today = cur.fetchone()[0]
-                    con.close()
-                    if posted_today >= 2:
-                        continue
-                except:
-                    pass
-            return check_date
+        if days and days[0] == today.isoformat():
+            # Today is done once both slots have posted
+            today_start = datetime.combine(today, datetime.min.time())
+            posted_today = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'posted' AND posted_at >= ?", 
+                                       (int(today_start.timestamp()),)).fetchone()[0]
+            if posted_today >= 2:
+                days = days[1:]
+        con.close()
+        if days:
+            return datetime.strptime(days[0], "%Y-%m-%d").date()
+    except:
+        pass
     
     return today + timedelta(days=1)
 
-def get_content_for_day(target_date, content_dir, content_type):
+def get_content_for_day(target_date, content_dir, content_type, index=None):
     """Get AM and PM content info for a specific date and content type"""
     date_str = target_date.strftime("%m_%d_%Y")
+    if index is None:
+        index = get_schedule_index([target_date], (content_type,))
     
     result = {
         'am': None,
@@ -1138,43 +1263,21 @@ def get_content_for_day(target_date, content_dir, content_type):
     }
     
     video_extensions = {'.mp4', '.mov', '.avi', '.mkv', '.webm'}
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
     
     for slot in ['am', 'pm']:
-        # Check for both image and video extensions
-        file_path = None
-        is_video = False
-        for ext in ['.jpg', '.jpeg', '.png', '.mp4', '.mov']:
-            test_path = os.path.join(content_dir, f"{date_str}_{slot}{ext}")
-            if os.path.exists(test_path):
-                file_path = test_path
-                is_video = ext.lower() in video_extensions
-                break
+        row = index.get((content_type, target_date.strftime("%Y-%m-%d"), slot))
         
-        if file_path:
+        if row:
+            file_path = os.path.join(PROJECT_ROOT, row['file_path'])
             filename = os.path.basename(file_path)
+            is_video = os.path.splitext(filename)[1].lower() in video_extensions
             
-            # Get caption, scheduled time and status from DATABASE (same source as poster!)
-            caption = ""
+            # Caption, scheduled time and status come from the DATABASE (same source as poster!)
+            caption = row['caption'] or ""
             scheduled_time = "9:00 AM" if slot == 'am' else "7:00 PM"
-            post_status = "pending"
-            
-            try:
-                con = sqlite3.connect(DB_FILE)
-                file_pattern = f"%{date_str}_{slot}%"
-                row = con.execute(
-                    "SELECT scheduled_for, status, caption FROM media_files WHERE file_path LIKE ? AND content_type = ? LIMIT 1",
-                    (file_pattern, content_type)
-                ).fetchone()
-                if row:
-                    if row[0]:
-                        sched_dt = datetime.fromtimestamp(row[0])
-                        scheduled_time = sched_dt.strftime("%I:%M %p").lstrip('0')
-                    post_status = row[1] or "pending"
-                    caption = row[2] or ""
-                con.close()
-            except:
-                pass
+            if row['scheduled_for']:
+                scheduled_time = datetime.fromtimestamp(row['scheduled_for']).strftime("%I:%M %p").lstrip('0')
+            post_status = row['status'] or "pending"
             
             # Fallback: if no caption in DB, read from file
             if not caption:
@@ -1193,6 +1296,7 @@ def get_content_for_day(target_date, content_dir, content_type):
                 'caption_preview': caption[:100] + '...' if len(caption) > 100 else caption,
                 'exists': True,
                 'is_video': is_video,
+                'version': source_version(file_path) or '',
                 'scheduled_time': scheduled_time,
                 'status': post_status,
                 'content_type': content_type
@@ -1202,16 +1306,18 @@ def get_content_for_day(target_date, content_dir, content_type):
     
     return result
 
-def get_post_for_day(target_date):
+def get_post_for_day(target_date, index=None):
     """Get Photos and Stories for a specific date"""
     date_str = target_date.strftime("%m_%d_%Y")
+    if index is None:
+        index = get_schedule_index([target_date])
     
     result = {
         'date': target_date,
         'date_display': target_date.strftime("%A, %B %d"),
         'date_str': date_str,
-        'photos': get_content_for_day(target_date, PHOTOS_DIR, 'Photos'),
-        'stories': get_content_for_day(target_date, STORIES_DIR, 'Stories'),
+        'photos': get_content_for_day(target_date, PHOTOS_DIR, 'Photos', index),
+        'stories': get_content_for_day(target_date, STORIES_DIR, 'Stories', index),
     }
     
     return result
@@ -1219,24 +1325,28 @@ def get_post_for_day(target_date):
 def get_future_posts(content_type, after_date, exclude_date_str=None, exclude_slot=None):
     """Get list of all future posts for swapping"""
     future_posts = []
+    seen = set()
     
-    content_dir = STORIES_DIR if content_type == 'Stories' else PHOTOS_DIR
-    
-    if not os.path.exists(content_dir):
+    try:
+        con = sqlite3.connect(DB_FILE)
+        rows = con.execute("""
+            SELECT schedule_date, schedule_slot, file_path FROM media_files
+            WHERE model_name = ? AND platform = ? AND content_type = ? AND schedule_date > ?
+            ORDER BY schedule_date ASC, schedule_slot ASC, detected_at DESC, id DESC
+        """, (REVIEW_MODEL, REVIEW_PLATFORM, content_type, after_date.isoformat())).fetchall()
+        con.close()
+    except Exception as e:
+        print(f"Error reading schedule index: {e}")
         return future_posts
     
-    for filename in os.listdir(content_dir):
-        if not any(filename.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.mp4', '.mov']):
-            continue
-        
-        file_date, slot = parse_filename_date(filename)
-        if file_date is None:
-            continue
-        
-        if file_date.date() <= after_date:
+    # Latest detected row per date/slot, the same one get_schedule_index shows
+    for schedule_date, slot, file_path in rows:
+        file_date = datetime.strptime(schedule_date, "%Y-%m-%d")
+        date_str = file_date.strftime("%m_%d_%Y")
+        if (date_str, slot) in seen:
             continue
+        seen.add((date_str, slot))
         
-        date_str = file_date.strftime("%m_%d_%Y")
         if exclude_date_str and exclude_slot:
             if date_str == exclude_date_str and slot == exclude_slot:
                 continue
@@ -1245,11 +1355,48 @@ def get_future_posts(content_type, after_date, exclude_date_str=None, exclude_sl
             'date': file_date,
             'date_str': date_str,
             'slot': slot,
-            'filename': filename
+            'filename': os.path.basename(file_path)
         })
     
     return future_posts
 
+def read_caption_sidecar(media_path):
+    """(caption, mtime) of a media file's .txt sidecar, as the scanner stores them"""
+    caption_path = os.path.splitext(media_path)[0] + ".txt"
+    try:
+        mtime = os.stat(caption_path).st_mtime
+        with open(caption_path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None, mtime
+    except OSError:
+        return None, None
+
+def update_swapped_rows(moves):
+    """
+    Point the media_files rows of swapped files at their new paths, with the
+    caption now next to them, in one transaction. Rows keep their schedule;
+    conforming starts over since the media changed.
+    """
+    con = sqlite3.connect(DB_FILE)
+    try:
+        rel = lambda path: os.path.relpath(path, PROJECT_ROOT)
+        for old_path, new_path in moves:
+            if new_path != old_path:
+                # Left behind by an earlier swap that only moved files (the file is gone)
+                con.execute("DELETE FROM media_files WHERE file_path = ? AND status != 'posted'", (rel(new_path),))
+        for old_path, new_path in moves:
+            caption, caption_mtime = read_caption_sidecar(new_path)
+            st = os.stat(new_path)
+            con.execute(
+                """UPDATE media_files
+                   SET file_path = ?, file_size = ?, file_mtime = ?, caption = ?, caption_mtime = ?,
+                       conform_status = NULL, conformed_path = NULL, conform_stamp = NULL
+                   WHERE file_path = ? AND status != 'posted'""",
+                (rel(new_path), st.st_size, st.st_mtime, caption, caption_mtime, rel(old_path))
+            )
+        con.commit()
+    finally:
+        con.close()
+
 def swap_posts(content_type, date1_str, slot1, date2_str, slot2):
     """Swap two posts (image and caption)"""
     try:
@@ -1294,6 +1441,9 @@ def swap_posts(content_type, date1_str, slot1, date2_str, slot2):
         elif os.path.exists(cap2):
             shutil.move(cap2, cap1)
         
+        # The poster and this page read the database, so it has to follow the files
+        update_swapped_rows([(img1, new_img1), (img2, new_img2)])
+        
         return True, f"Swapped with {date2_str} {slot2.upper()}"
     except Exception as e:
         return False, str(e)
@@ -1322,12 +1472,12 @@ def update_caption(content_type, date_str, slot, new_caption):
         with open(caption_path, 'w', encoding='utf-8') as f:
             f.write(new_caption)
         
-        # Update database
+        # Update database (every platform's copy of this post)
         con = sqlite3.connect(DB_FILE)
-        file_pattern = f"%{date_str}_{slot}%"
         con.execute(
-            "UPDATE media_files SET caption = ? WHERE file_path LIKE ? AND content_type = ?",
-            (new_caption, file_pattern, content_type)
+            """UPDATE media_files SET caption = ?
+               WHERE model_name = ? AND content_type = ? AND schedule_date = ? AND schedule_slot = ?""",
+            (new_caption, REVIEW_MODEL, content_type, date_str_to_iso(date_str), slot)
         )
         con.commit()
         con.close()
@@ -1340,6 +1490,12 @@ def update_caption(content_type, date_str, slot, new_caption):
 # INSTAGRAM API FUNCTIONS
 # =============================================================================
 
+# External API panels are served from a stale-while-revalidate cache
+# (memory + .dashboard_cache.json) refreshed in background threads
+DASHBOARD_CACHE_FILE = os.path.join(PROJECT_ROOT, ".dashboard_cache.json")
+INSTAGRAM_CACHE_TTL = 300  # 5 minutes
+api_cache = SWRCache(DASHBOARD_CACHE_FILE)
+
 def get_instagram_credentials():
     try:
         con = sqlite3.connect(DB_FILE)
@@ -1349,59 +1505,53 @@ def get_instagram_credentials():
     except:
         return None, None
 
-def get_instagram_profile():
+def fetch_instagram_profile():
     ig_user_id, token = get_instagram_credentials()
     if not ig_user_id: return None
-    try:
-        resp = requests.get(f"{FB_GRAPH_API}/{ig_user_id}", params={'fields': 'username,name,biography,followers_count,follows_count,media_count,profile_picture_url', 'access_token': token}, timeout=10)
-        data = resp.json()
-        if 'error' not in data:
-            return {'username': data.get('username', 'N/A'), 'name': data.get('name', 'N/A'), 'bio': data.get('biography', ''), 'followers': data.get('followers_count', 0), 'following': data.get('follows_count', 0), 'posts': data.get('media_count', 0), 'avatar': data.get('profile_picture_url', '')}
-    except: pass
-    return None
+    resp = requests.get(f"{FB_GRAPH_API}/{ig_user_id}", params={'fields': 'username,name,biography,followers_count,follows_count,media_count,profile_picture_url', 'access_token': token}, timeout=10)
+    data = resp.json()
+    if 'error' in data:
+        raise Exception(data['error'].get('message', 'Unknown error'))
+    return {'username': data.get('username', 'N/A'), 'name': data.get('name', 'N/A'), 'bio': data.get('biography', ''), 'followers': data.get('followers_count', 0), 'following': data.get('follows_count', 0), 'posts': data.get('media_count', 0), 'avatar': data.get('profile_picture_url', '')}
 
-def get_instagram_posts(limit=8):
+def fetch_instagram_posts(limit=8):
     ig_user_id, token = get_instagram_credentials()
-    if not ig_user_id: return []
-    try:
-        resp = requests.get(f"{FB_GRAPH_API}/{ig_user_id}/media", params={'fields': 'id,caption,media_type,timestamp,like_count,comments_count,permalink,thumbnail_url,media_url', 'limit': limit, 'access_token': token}, timeout=10)
-        data = resp.json()
-        posts = []
-        for post in data.get('data', []):
-            posts.append({'id': post.get('id'), 'media_type': post.get('media_type', 'IMAGE'), 'likes': post.get('like_count', 0), 'comments': post.get('comments_count', 0), 'permalink': post.get('permalink', '#'), 'thumbnail': post.get('thumbnail_url') or post.get('media_url', '')})
-        return posts
-    except: return []
+    if not ig_user_id: return None
+    resp = requests.get(f"{FB_GRAPH_API}/{ig_user_id}/media", params={'fields': 'id,caption,media_type,timestamp,like_count,comments_count,permalink,thumbnail_url,media_url', 'limit': limit, 'access_token': token}, timeout=10)
+    data = resp.json()
+    if 'error' in data:
+        raise Exception(data['error'].get('message', 'Unknown error'))
+    posts = []
+    for post in data.get('data', []):
+        posts.append({'id': post.get('id'), 'media_type': post.get('media_type', 'IMAGE'), 'likes': post.get('like_count', 0), 'comments': post.get('comments_count', 0), 'permalink': post.get('permalink', '#'), 'thumbnail': post.get('thumbnail_url') or post.get('media_url', '')})
+    return posts
+
+def get_instagram_profile():
+    """Cached Instagram profile (never blocks on the Graph API)"""
+    return api_cache.get("ig_profile", fetch_instagram_profile, INSTAGRAM_CACHE_TTL)
+
+def get_instagram_posts(limit=8):
+    """Cached recent Instagram posts (never blocks on the Graph API)"""
+    return api_cache.get(f"ig_posts_{limit}", lambda: fetch_instagram_posts(limit), INSTAGRAM_CACHE_TTL, default=[])
 
 # =============================================================================
-# TWITTER API FUNCTIONS (with caching to avoid rate limits)
+# TWITTER API FUNCTIONS (cached to avoid rate limits)
 # =============================================================================
 
-# Twitter cache - stores data in memory and file to survive restarts
-TWITTER_CACHE_FILE = os.path.join(PROJECT_ROOT, ".twitter_cache.json")
-TWITTER_CACHE_TTL = 21600  # 15 minutes - Twitter free tier limit
-_twitter_cache = {"profile": None, "tweets": None, "profile_time": 0, "tweets_time": 0}
-
-def load_twitter_cache():
-    """Load Twitter cache from file"""
-    global _twitter_cache
-    try:
-        if os.path.exists(TWITTER_CACHE_FILE):
-            with open(TWITTER_CACHE_FILE, 'r') as f:
-                _twitter_cache = json.load(f)
-    except:
-        pass
+TWITTER_CACHE_TTL = 21600  # 6 hours - Twitter free tier limit
+LEGACY_TWITTER_CACHE_FILE = os.path.join(PROJECT_ROOT, ".twitter_cache.json")
 
-def save_twitter_cache():
-    """Save Twitter cache to file"""
+def migrate_twitter_cache():
+    """Seed the dashboard cache from the old .twitter_cache.json file"""
     try:
-        with open(TWITTER_CACHE_FILE, 'w') as f:
-            json.dump(_twitter_cache, f)
+        if os.path.exists(LEGACY_TWITTER_CACHE_FILE):
+            with open(LEGACY_TWITTER_CACHE_FILE, 'r') as f:
+                legacy = json.load(f)
+            api_cache.seed("twitter_profile", legacy.get("profile"), legacy.get("profile_time", 0))
+            api_cache.seed("twitter_tweets_8", legacy.get("tweets"), legacy.get("tweets_time", 0))
     except:
         pass
 
-# Load cache on startup
-load_twitter_cache()
-
 def get_twitter_credentials():
     """Get Twitter API credentials from database"""
     try:
@@ -1417,132 +1567,109 @@ def get_twitter_credentials():
         pass
     return None
 
-def get_twitter_profile():
-    """Get Twitter profile information using tweepy (with caching)"""
-    global _twitter_cache
-    
-    # Check cache first
-    now = datetime.now().timestamp()
-    if _twitter_cache.get("profile") and (now - _twitter_cache.get("profile_time", 0)) < TWITTER_CACHE_TTL:
-        return _twitter_cache["profile"]
-    
+def get_twitter_client():
+    """Build an authenticated tweepy client, or None if unavailable"""
     if not TWEEPY_AVAILABLE:
-        return _twitter_cache.get("profile")  # Return stale cache if available
+        return None
     creds = get_twitter_credentials()
     if not creds:
-        return _twitter_cache.get("profile")
+        return None
+    return tweepy.Client(
+        consumer_key=creds['api_key'],
+        consumer_secret=creds['api_secret'],
+        access_token=creds['access_token'],
+        access_token_secret=creds['access_secret']
+    )
+
+def fetch_twitter_profile():
+    """Get Twitter profile information using tweepy"""
+    client = get_twitter_client()
+    if not client:
+        return None
     
-    try:
-        client = tweepy.Client(
-            consumer_key=creds['api_key'],
-            consumer_secret=creds['api_secret'],
-            access_token=creds['access_token'],
-            access_token_secret=creds['access_secret']
-        )
-        # Get authenticated user info
-        user = client.get_me(user_fields=['profile_image_url', 'description', 'public_metrics', 'username', 'name'])
-        if user and user.data:
-            u = user.data
-            metrics = u.public_metrics or {}
-            profile = {
-                'username': u.username or 'N/A',
-                'name': u.name or 'N/A',
-                'bio': u.description or '',
-                'followers': metrics.get('followers_count', 0),
-                'following': metrics.get('following_count', 0),
-                'posts': metrics.get('tweet_count', 0),
-                'avatar': (u.profile_image_url or '').replace('_normal', '_400x400')
-            }
-            # Update cache
-            _twitter_cache["profile"] = profile
-            _twitter_cache["profile_time"] = now
-            save_twitter_cache()
-            return profile
-    except Exception as e:
-        print(f"Twitter profile error: {e}")
-        # Return stale cache on error
-        if _twitter_cache.get("profile"):
-            return _twitter_cache["profile"]
-    return None
+    # Get authenticated user info
+    user = client.get_me(user_fields=['profile_image_url', 'description', 'public_metrics', 'username', 'name'])
+    if not user or not user.data:
+        return None
+    u = user.data
+    metrics = u.public_metrics or {}
+    return {
+        'username': u.username or 'N/A',
+        'name': u.name or 'N/A',
+        'bio': u.description or '',
+        'followers': metrics.get('followers_count', 0),
+        'following': metrics.get('following_count', 0),
+        'posts': metrics.get('tweet_count', 0),
+        'avatar': (u.profile_image_url or '').replace('_normal', '_400x400')
+    }
 
-def get_twitter_recent_tweets(limit=8):
-    """Get recent tweets from the authenticated user (with caching)"""
-    global _twitter_cache
+def fetch_twitter_recent_tweets(limit=8):
+    """Get recent tweets from the authenticated user"""
+    client = get_twitter_client()
+    if not client:
+        return None
     
-    # Check cache first
-    now = datetime.now().timestamp()
-    if _twitter_cache.get("tweets") and (now - _twitter_cache.get("tweets_time", 0)) < TWITTER_CACHE_TTL:
-        return _twitter_cache["tweets"]
+    # Get user ID first
+    user = client.get_me()
+    if not user or not user.data:
+        return None
+    user_id = user.data.id
     
-    if not TWEEPY_AVAILABLE:
-        return _twitter_cache.get("tweets", [])
-    creds = get_twitter_credentials()
-    if not creds:
-        return _twitter_cache.get("tweets", [])
+    # Get recent tweets with metrics
+    tweets = client.get_users_tweets(
+        user_id, 
+        max_results=min(limit, 100),
+        tweet_fields=['created_at', 'public_metrics', 'attachments'],
+        media_fields=['preview_image_url', 'url'],
+        expansions=['attachments.media_keys']
+    )
     
-    try:
-        client = tweepy.Client(
-            consumer_key=creds['api_key'],
-            consumer_secret=creds['api_secret'],
-            access_token=creds['access_token'],
-            access_token_secret=creds['access_secret']
-        )
-        # Get user ID first
-        user = client.get_me()
-        if not user or not user.data:
-            return _twitter_cache.get("tweets", [])
-        user_id = user.data.id
-        
-        # Get recent tweets with metrics
-        tweets = client.get_users_tweets(
-            user_id, 
-            max_results=min(limit, 100),
-            tweet_fields=['created_at', 'public_metrics', 'attachments'],
-            media_fields=['preview_image_url', 'url'],
-            expansions=['attachments.media_keys']
-        )
-        
-        if not tweets or not tweets.data:
-            return _twitter_cache.get("tweets", [])
-        
-        # Build media lookup
-        media_lookup = {}
-        if tweets.includes and 'media' in tweets.includes:
-            for m in tweets.includes['media']:
-                media_lookup[m.media_key] = m.url or m.preview_image_url or ''
-        
-        result = []
-        for tweet in tweets.data:
-            metrics = tweet.public_metrics or {}
-            # Get first media URL if available
-            thumbnail = ''
-            if tweet.attachments and 'media_keys' in tweet.attachments:
-                for mk in tweet.attachments['media_keys']:
-                    if mk in media_lookup:
-                        thumbnail = media_lookup[mk]
-                        break
-            
-            result.append({
-                'id': str(tweet.id),  # Convert to string for JSON
-                'text': tweet.text[:100] + '...' if len(tweet.text) > 100 else tweet.text,
-                'likes': metrics.get('like_count', 0),
-                'retweets': metrics.get('retweet_count', 0),
-                'replies': metrics.get('reply_count', 0),
-                'permalink': f"https://twitter.com/i/status/{tweet.id}",
-                'thumbnail': thumbnail
-            })
+    if not tweets or not tweets.data:
+        return None
+    
+    # Build media lookup
+    media_lookup = {}
+    if tweets.includes and 'media' in tweets.includes:
+        for m in tweets.includes['media']:
+            media_lookup[m.media_key] = m.url or m.preview_image_url or ''
+    
+    result = []
+    for tweet in tweets.data:
+        metrics = tweet.public_metrics or {}
+        # Get first media URL if available
+        thumbnail = ''
+        if tweet.attachments and 'media_keys' in tweet.attachments:
+            for mk in tweet.attachments['media_keys']:
+                if mk in media_lookup:
+                    thumbnail = media_lookup[mk]
+                    break
         
-        # Update cache
-        _twitter_cache["tweets"] = result
-        _twitter_cache["tweets_time"] = now
-        save_twitter_cache()
-        return result
-    except Exception as e:
-        print(f"Twitter tweets error: {e}")
-        # Return stale cache on error
-        if _twitter_cache.get("tweets"):
-            return _twitter_cache["tweets"]
-    return []
+        result.append({
+            'id': str(tweet.id),  # Convert to string for JSON
+            'text': tweet.text[:100] + '...' if len(tweet.text) > 100 else tweet.text,
+            'likes': metrics.get('like_count', 0),
+            'retweets': metrics.get('retweet_count', 0),
+            'replies': metrics.get('reply_count', 0),
+            'permalink': f"https://twitter.com/i/status/{tweet.id}",
+            'thumbnail': thumbnail
+        })
+    return result
+
+def get_twitter_profile():
+    """Cached Twitter profile (never blocks on the Twitter API)"""
+    return api_cache.get("twitter_profile", fetch_twitter_profile, TWITTER_CACHE_TTL)
+
+def get_twitter_recent_tweets(limit=8):
+    """Cached recent tweets (never blocks on the Twitter API)"""
+    return api_cache.get(f"twitter_tweets_{limit}", lambda: fetch_twitter_recent_tweets(limit), TWITTER_CACHE_TTL, default=[])
+
+def warm_api_cache():
+    """Kick off background refreshes so the first page load has data"""
+    migrate_twitter_cache()
+    get_instagram_profile()
+    get_instagram_posts(8)
+    get_twitter_profile()
+    get_twitter_recent_tweets(8)
 
 
 def calculate_engagement(posts, followers):
@@ -1602,67 +1729,94 @@ def send_comment_reply(comment_id, message):
 # DATABASE FUNCTIONS
 # =============================================================================
 
+def get_cloudflared_status():
+    # cloudflared is not ours to register, so it's still found with pgrep
+    try:
+        proc = subprocess.run(["pgrep", "-f", "cloudflared tunnel run"], capture_output=True, text=True)
+        pids = [p for p in proc.stdout.strip().split('\n') if p]
+        return {"name": "Cloudflare Tunnel", "running": len(pids) > 0, "pid": pids[0] if pids else None, "heartbeat": None}
+    except:
+        return {"name": "Cloudflare Tunnel", "running": False, "pid": None, "heartbeat": None}
+
 def get_service_status():
-    services = [("Media Server", "media_server.py"), ("Cloudflare Tunnel", "cloudflared"), ("Scanner", "scanner.py"), ("Poster", "poster.py"), ("Comment Responder", "comment_responder.py"), ("Dashboard", "dashboard.py")]
+    """Service status from the run/ registry files (see registry.py)"""
     result = []
-    for name, search in services:
-        try:
-            proc = subprocess.run(["pgrep", "-f", search], capture_output=True, text=True)
-            pids = [p for p in proc.stdout.strip().split('\n') if p]
-            result.append({"name": name, "running": len(pids) > 0, "pid": pids[0] if pids else None})
-        except:
-            result.append({"name": name, "running": False, "pid": None})
+    for info in registry.status_all():
+        heartbeat = None
+        if info["running"] and info["heartbeat_age"] is not None:
+            heartbeat = f"{int(info['heartbeat_age'])}s ago"
+            if info["last_loop_seconds"] is not None:
+                heartbeat += f", loop {info['last_loop_seconds']:.1f}s"
+        result.append({"name": info["label"], "running": info["running"], "pid": info["pid"], "heartbeat": heartbeat})
+    result.insert(1, get_cloudflared_status())
     return result
 
-def get_post_stats():
-    stats = {
+def empty_post_stats():
+    return {
         "posts_today": 0, "posts_pending": 0, "posts_failed": 0, 
         "photos_24h": 0, "stories_24h": 0, "total_queued": 0, "posts_week": 0,
         # Platform breakdown
         "ig_today": 0, "ig_pending": 0, "ig_failed": 0,
         "twitter_today": 0, "twitter_pending": 0, "twitter_failed": 0
     }
+
+def get_post_stats():
+    stats = empty_post_stats()
+    platform_keys = {"Instagram": "ig", "Twitter": "twitter"}
     try:
         con = sqlite3.connect(DB_FILE)
         now = int(datetime.now().timestamp())
         day_ago, week_ago = now - 86400, now - 604800
         today_start = int(datetime.now().replace(hour=0, minute=0, second=0).timestamp())
         
-        # Overall stats
-        stats["posts_today"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'posted' AND posted_at >= ?", (today_start,)).fetchone()[0]
-        stats["posts_pending"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'pending'").fetchone()[0]
-        stats["posts_failed"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'failed'").fetchone()[0]
-        stats["photos_24h"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'posted' AND posted_at >= ? AND content_type = 'Photos'", (day_ago,)).fetchone()[0]
-        stats["stories_24h"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'posted' AND posted_at >= ? AND content_type = 'Stories'", (day_ago,)).fetchone()[0]
-        stats["total_queued"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status IN ('pending', 'posting')").fetchone()[0]
-        stats["posts_week"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'posted' AND posted_at >= ?", (week_ago,)).fetchone()[0]
-        
-        # Instagram breakdown
-        stats["ig_today"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'posted' AND posted_at >= ? AND platform = 'Instagram'", (today_start,)).fetchone()[0]
-        stats["ig_pending"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'pending' AND platform = 'Instagram'").fetchone()[0]
-        stats["ig_failed"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'failed' AND platform = 'Instagram'").fetchone()[0]
+        # Queue state - only unposted rows, read from the (status, platform) index
+        rows = con.execute("""
+            SELECT status, platform, COUNT(*) FROM media_files
+            WHERE status IN ('pending', 'posting', 'failed')
+            GROUP BY status, platform
+        """).fetchall()
+        for status, platform, count in rows:
+            prefix = platform_keys.get(platform)
+            if status in ('pending', 'posting'):
+                stats["total_queued"] += count
+            if status in ('pending', 'failed'):
+                stats[f"posts_{status}"] += count
+                if prefix:
+                    stats[f"{prefix}_{status}"] += count
         
-        # Twitter breakdown
-        stats["twitter_today"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'posted' AND posted_at >= ? AND platform = 'Twitter'", (today_start,)).fetchone()[0]
-        stats["twitter_pending"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'pending' AND platform = 'Twitter'").fetchone()[0]
-        stats["twitter_failed"] = con.execute("SELECT COUNT(*) FROM media_files WHERE status = 'failed' AND platform = 'Twitter'").fetchone()[0]
+        # Posting activity - one pass over the last week of posts (posted_at index)
+        row = con.execute("""
+            SELECT COUNT(*),
+                   SUM(posted_at >= :today_start),
+                   SUM(posted_at >= :day_ago AND content_type = 'Photos'),
+                   SUM(posted_at >= :day_ago AND content_type = 'Stories'),
+                   SUM(posted_at >= :today_start AND platform = 'Instagram'),
+                   SUM(posted_at >= :today_start AND platform = 'Twitter')
+            FROM media_files
+            WHERE status = 'posted' AND posted_at >= :week_ago
+        """, {"today_start": today_start, "day_ago": day_ago, "week_ago": week_ago}).fetchone()
+        keys = ["posts_week", "posts_today", "photos_24h", "stories_24h", "ig_today", "twitter_today"]
+        for key, value in zip(keys, row):
+            stats[key] = value or 0
         
         con.close()
     except Exception as e:
         print(f"Error: {e}")
     return stats
 
-def get_comment_stats():
-    stats = {"comments_sent": 0, "comments_pending": 0, "comments_total": 0}
+def get_comment_status_counts():
+    """Reply counts by status in a single GROUP BY"""
     try:
         con = sqlite3.connect(DB_FILE)
-        stats["comments_sent"] = con.execute("SELECT COUNT(*) FROM comment_replies WHERE status = 'sent'").fetchone()[0]
-        stats["comments_pending"] = con.execute("SELECT COUNT(*) FROM comment_replies WHERE status = 'pending'").fetchone()[0]
-        stats["comments_total"] = con.execute("SELECT COUNT(*) FROM comment_replies").fetchone()[0]
+        rows = con.execute("SELECT status, COUNT(*) FROM comment_replies GROUP BY status").fetchall()
         con.close()
+        return {row[0]: row[1] for row in rows}
     except:
-        pass
-    return stats
+        return {}
+
+def get_comment_stats(counts=None):
+    counts = get_comment_status_counts() if counts is None else counts
+    return {"comments_sent": counts.get('sent', 0), "comments_pending": counts.get('pending', 0), "comments_total": sum(counts.values())}
 
 def get_pending_replies():
     replies = []
@@ -1689,17 +1843,16 @@ def get_recent_activity():
         pass
     return activity
 
-def get_comment_history(limit=30):
+def get_comment_history(limit=30, counts=None):
     history = []
-    total = 0
+    counts = get_comment_status_counts() if counts is None else counts
+    total = sum(counts.values())
     stats = {"sent": 0, "pending": 0, "skipped": 0, "failed": 0, "rejected": 0}
+    for status, count in counts.items():
+        if status in stats:
+            stats[status] = count
     try:
         con = sqlite3.connect(DB_FILE)
-        total = con.execute("SELECT COUNT(*) FROM comment_replies").fetchone()[0]
-        rows = con.execute("SELECT status, COUNT(*) FROM comment_replies GROUP BY status").fetchall()
-        for row in rows:
-            if row[0] in stats:
-                stats[row[0]] = row[1]
         rows = con.execute("SELECT username, comment_text, reply_text, status, created_at, replied_at FROM comment_replies ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
         for row in rows:
             created = datetime.fromtimestamp(row[4]).strftime("%Y-%m-%d %H:%M") if row[4] else "N/A"
@@ -1819,30 +1972,81 @@ def logout():
     resp.delete_cookie(COOKIE_NAME)
     return resp
 
+# Dashboard panels are loaded concurrently; a source that misses its timeout
+# renders with its default instead of holding up the whole page
+PANEL_TIMEOUT = 3.0  # seconds
+
+def load_comment_panels():
+    """Comment history and stats share one status count query"""
+    counts = get_comment_status_counts()
+    return get_comment_history(30, counts), get_comment_stats(counts)
+
+def load_panels(sources):
+    """
+    Run {name: (func, default)} or {name: (func, default, timeout)} in parallel.
+    Returns (results, degraded) where degraded lists the sources that failed or timed out.
+    
+    Each request gets its own workers, so a source still hanging from an earlier
+    page load can't queue this one's panels behind it and eat their timeout.
+    """
+    pool = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="panel")
+    start = datetime.now().timestamp()
+    futures = {name: pool.submit(spec[0]) for name, spec in sources.items()}
+    pool.shutdown(wait=False)
+    results, degraded = {}, []
+    for name, spec in sources.items():
+        default = spec[1]
+        timeout = spec[2] if len(spec) > 2 else PANEL_TIMEOUT
+        remaining = max(0.0, start + timeout - datetime.now().timestamp())
+        try:
+            results[name] = futures[name].result(timeout=remaining)
+        except FutureTimeout:
+            print(f"Panel {name} timed out after {timeout:.1f}s")
+            results[name] = default
+            degraded.append(f"{name} (timed out)")
+        except Exception as e:
+            print(f"Panel {name} unavailable: {e.__class__.__name__} {e}")
+            results[name] = default
+            degraded.append(f"{name} (error)")
+    return results, degraded
+
 @app.route("/")
 @requires_auth
 def dashboard():
-    profile = get_instagram_profile()
-    ig_posts = get_instagram_posts(8)
+    empty_history = ([], 0, {"sent": 0, "pending": 0, "skipped": 0, "failed": 0, "rejected": 0})
+    empty_comment_stats = {"comments_sent": 0, "comments_pending": 0, "comments_total": 0}
+    panels, degraded = load_panels({
+        "Instagram profile": (get_instagram_profile, None),
+        "Instagram posts": (lambda: get_instagram_posts(8), []),
+        "Twitter profile": (get_twitter_profile, None),
+        "Twitter posts": (lambda: get_twitter_recent_tweets(8), []),
+        "Services": (get_service_status, []),
+        "Post stats": (get_post_stats, empty_post_stats()),
+        "Comments": (load_comment_panels, (empty_history, empty_comment_stats)),
+        "Pending replies": (get_pending_replies, []),
+        "Recent activity": (get_recent_activity, []),
+    })
+    
+    profile, ig_posts = panels["Instagram profile"], panels["Instagram posts"]
     engagement = calculate_engagement(ig_posts, profile['followers'] if profile else 0)
-    comment_history, total_comments, history_stats = get_comment_history(30)
-    post_stats, comment_stats = get_post_stats(), get_comment_stats()
-    pending_count = get_pending_count()
+    (comment_history, total_comments, history_stats), comment_stats = panels["Comments"]
+    post_stats = panels["Post stats"]
+    pending_count = comment_stats["comments_pending"]
     
     # Twitter data
-    twitter_profile = get_twitter_profile()
-    twitter_posts = get_twitter_recent_tweets(8)
+    twitter_profile = panels["Twitter profile"]
+    twitter_posts = panels["Twitter posts"]
     
     return render_template_string(DASHBOARD_HTML, 
         current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        user_role=get_user_role(),
-        profile=profile, ig_posts=ig_posts, engagement=engagement, services=get_service_status(),
+        user_role=get_user_role(), degraded_panels=degraded,
+        profile=profile, ig_posts=ig_posts, engagement=engagement, services=panels["Services"],
         posts_today=post_stats["posts_today"], posts_pending=post_stats["posts_pending"],
         posts_failed=post_stats["posts_failed"], photos_24h=post_stats["photos_24h"],
         stories_24h=post_stats["stories_24h"], total_queued=post_stats["total_queued"],
         posts_week=post_stats["posts_week"], comments_sent=comment_stats["comments_sent"],
         comments_pending=comment_stats["comments_pending"], comments_total=comment_stats["comments_total"],
-        pending_replies=get_pending_replies(), recent_activity=get_recent_activity(),
+        pending_replies=panels["Pending replies"], recent_activity=panels["Recent activity"],
         comment_history=comment_history, total_comments=total_comments,
         stats_sent=history_stats["sent"], stats_pending=history_stats["pending"],
         stats_skipped=history_stats["skipped"], stats_failed=history_stats.get("failed", 0) + history_stats.get("rejected", 0),
@@ -1920,6 +2124,23 @@ def mod_delete(comment_id):
     success, msg = delete_comment(comment_id)
     return redirect(url_for('moderation', message=msg if success else None, error=None if success else msg))
 
+@app.route("/metrics")
+@requires_metrics_auth
+def prometheus_metrics():
+    """All daemons' metrics (from the metrics table) in Prometheus text format"""
+    response = make_response(render_prometheus(read_metrics(DB_FILE)))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+@app.route("/api/metrics")
+@requires_auth
+def api_metrics():
+    name = request.args.get('name', 'post_delay_seconds')
+    hours = min(request.args.get('hours', 24, type=float), 24 * 7)
+    until = datetime.now().timestamp()
+    since = until - hours * 3600
+    return {'name': name, 'since': since, 'until': until, 'points': read_points(name, since, DB_FILE)}
+
 @app.route("/api/stats")
 @requires_auth
 def api_stats():
@@ -1937,8 +2158,10 @@ def posts_review():
     today = datetime.now().date()
     tomorrow = today + timedelta(days=1)
     
-    today_data = get_post_for_day(today)
-    tomorrow_data = get_post_for_day(tomorrow)
+    # One indexed query covers both days
+    index = get_schedule_index([today, tomorrow])
+    today_data = get_post_for_day(today, index)
+    tomorrow_data = get_post_for_day(tomorrow, index)
     
     return render_template_string(POST_REVIEW_HTML,
         today_data=today_data,
@@ -1975,11 +2198,36 @@ def edit_caption():
 @app.route("/media/<content_type>/<filename>")
 @requires_auth
 def serve_media(content_type, filename):
-    if content_type == 'Stories':
-        return send_from_directory(STORIES_DIR, filename)
+    content_dir = STORIES_DIR if content_type == 'Stories' else PHOTOS_DIR
+    
+    # ?size=thumb|preview serves a small cached JPEG (poster frame for videos)
+    size = request.args.get('size')
+    derivative = None
+    if size in DERIVATIVE_SIZES:
+        src_path = safe_join(content_dir, filename)
+        if src_path and os.path.isfile(src_path):
+            derivative = media_cache.get(src_path, size)
+    
+    if derivative:
+        path, etag = derivative
+        response = send_file(path, mimetype='image/jpeg', etag=etag, conditional=True)
+    elif size in DERIVATIVE_SIZES and os.path.splitext(filename)[1].lower() in VIDEO_EXTENSIONS:
+        # No poster frame (ffmpeg missing/failed): the whole video is no use as an <img> or poster
+        return "No preview available", 404
+    else:
+        response = send_from_directory(content_dir, filename, conditional=True)
+    
+    # Versioned URLs (?v=<mtime+size>) change whenever the file does, so they can be cached forever
+    if request.args.get('v'):
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
     else:
-        return send_from_directory(PHOTOS_DIR, filename)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 if __name__ == "__main__":
+    # Schedule/conform columns are added by migrations; don't wait for the scanner to run them
+    db.init_db()
+    registry.register("dashboard")
+    warm_api_cache()
     print("Dashboard with auth on http://0.0.0.0:5000")
     app.run(host="0.0.0.0", port=5000, debug=False)
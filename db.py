@@ -54,13 +54,20 @@ CREATE TABLE IF NOT EXISTS media_files (
     
     -- Metadata
     caption         TEXT,                       -- Optional caption for the post
-    scheduled_for   INTEGER                     -- Optional: schedule for future posting
+    scheduled_for   INTEGER,                    -- Optional: schedule for future posting
+    
+    -- Schedule index, parsed from MM_DD_YYYY_am/pm filenames
+    schedule_date   TEXT,                       -- 'YYYY-MM-DD'
+    schedule_slot   TEXT                        -- 'am' or 'pm'
 );
 
 -- Indexes for common queries
 CREATE INDEX IF NOT EXISTS idx_media_status ON media_files(status);
 CREATE INDEX IF NOT EXISTS idx_media_platform_model ON media_files(platform, model_name);
 CREATE INDEX IF NOT EXISTS idx_media_detected ON media_files(detected_at);
+CREATE INDEX IF NOT EXISTS idx_media_status_scheduled ON media_files(status, scheduled_for);
+CREATE INDEX IF NOT EXISTS idx_media_status_platform ON media_files(status, platform);
+CREATE INDEX IF NOT EXISTS idx_media_posted ON media_files(status, posted_at);
 
 -- Credentials table for API access
 CREATE TABLE IF NOT EXISTS credentials (
@@ -98,11 +105,38 @@ CREATE INDEX IF NOT EXISTS idx_log_media ON post_log(media_file_id);
 """
 
 
+# Columns added after the first release: (table, column, type)
+MIGRATIONS = [
+    ("media_files", "schedule_date", "TEXT"),
+    ("media_files", "schedule_slot", "TEXT"),
+    ("media_files", "caption_mtime", "REAL"),     # mtime of the .txt sidecar the caption was read from
+    ("media_files", "conform_status", "TEXT"),    # See conformance.py ('ok', 'conformed', 'failed', 'unchecked')
+    ("media_files", "conformed_path", "TEXT"),    # Publishable derivative, relative to PROJECT_ROOT
+    ("media_files", "conform_stamp", "TEXT"),     # Source "size:mtime_ns" the conform result is for
+]
+
+# Indexes on migrated columns (created after MIGRATIONS have run)
+MIGRATED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_media_schedule
+    ON media_files(model_name, platform, content_type, schedule_date, schedule_slot);
+"""
+
+
+def migrate_db(con) -> None:
+    """Add any columns from MIGRATIONS missing in an older database."""
+    for table, column, col_type in MIGRATIONS:
+        columns = {row[1] for row in con.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+    con.executescript(MIGRATED_INDEXES)
+
+
 def init_db() -> None:
     """Initialize database with schema."""
     os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
     with sqlite3.connect(DB_FILE) as con:
         con.executescript(SCHEMA)
+        migrate_db(con)
         con.commit()
     print(f"Database initialized: {DB_FILE}")
 
@@ -141,7 +175,10 @@ def insert_media_file(
     platform: str,
     content_type: str,
     caption: Optional[str] = None,
-    scheduled_for: Optional[int] = None
+    scheduled_for: Optional[int] = None,
+    schedule_date: Optional[str] = None,
+    schedule_slot: Optional[str] = None,
+    caption_mtime: Optional[float] = None
 ) -> Optional[int]:
     """
     Insert a new media file into the queue.
@@ -153,11 +190,13 @@ def insert_media_file(
                 """
                 INSERT INTO media_files 
                     (file_path, file_size, file_mtime, detected_at,
-                     country, model_name, platform, content_type, caption, scheduled_for)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     country, model_name, platform, content_type, caption, scheduled_for,
+                     schedule_date, schedule_slot, caption_mtime)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (file_path, file_size, file_mtime, int(time.time()),
-                 country, model_name, platform, content_type, caption, scheduled_for)
+                 country, model_name, platform, content_type, caption, scheduled_for,
+                 schedule_date, schedule_slot, caption_mtime)
             )
             con.commit()
             return cur.lastrowid
@@ -198,6 +237,93 @@ def get_pending_jobs(
         return [dict(row) for row in cur.fetchall()]
 
 
+def get_upcoming_due_times(limit: int = 100) -> List[int]:
+    """
+    Get the next future scheduled_for times of pending jobs (soonest first).
+    Used by the poster to sleep until the next job is due.
+    """
+    with get_connection() as con:
+        cur = con.execute(
+            """
+            SELECT scheduled_for FROM media_files
+            WHERE status = ?
+              AND scheduled_for > ?
+              AND attempts < max_attempts
+            ORDER BY scheduled_for ASC LIMIT ?
+            """,
+            (STATUS_PENDING, int(time.time()), limit)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def get_unindexed_schedule_rows() -> List[Dict[str, Any]]:
+    """Get rows whose schedule_date/slot have not been filled in yet."""
+    with get_connection() as con:
+        cur = con.execute(
+            "SELECT id, file_path FROM media_files WHERE schedule_date IS NULL"
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+
+def update_schedule_keys(keys: List[tuple]) -> None:
+    """Bulk-set schedule index columns from (schedule_date, schedule_slot, id) tuples."""
+    with get_connection() as con:
+        con.executemany(
+            "UPDATE media_files SET schedule_date = ?, schedule_slot = ? WHERE id = ?",
+            keys
+        )
+        con.commit()
+
+
+def get_pending_caption_rows() -> List[Dict[str, Any]]:
+    """Get caption state of every pending row (for syncing from .txt sidecars)."""
+    with get_connection() as con:
+        cur = con.execute(
+            "SELECT id, file_path, caption, caption_mtime FROM media_files WHERE status = 'pending'"
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+
+def update_captions(updates: List[tuple]) -> None:
+    """Bulk-set captions from (caption, caption_mtime, id) tuples in one transaction."""
+    with get_connection() as con:
+        con.executemany(
+            "UPDATE media_files SET caption = ?, caption_mtime = ? WHERE id = ? AND status = 'pending'",
+            updates
+        )
+        con.commit()
+
+
+def get_unconformed_jobs(limit: int = 10) -> List[Dict[str, Any]]:
+    """Get pending jobs not yet checked by conformance.py, soonest scheduled first."""
+    with get_connection() as con:
+        cur = con.execute(
+            """
+            SELECT * FROM media_files
+            WHERE status = ? AND conform_status IS NULL
+            ORDER BY scheduled_for IS NULL, scheduled_for, detected_at
+            LIMIT ?
+            """,
+            (STATUS_PENDING, limit)
+        )
+        return [dict(row) for row in cur.fetchall()]
+
+
+def set_conform_result(
+    job_id: int,
+    conform_status: str,
+    conformed_path: Optional[str],
+    conform_stamp: Optional[str] = None
+) -> None:
+    """Store the outcome of conforming a job's media, and the source stamp it was computed for."""
+    with get_connection() as con:
+        con.execute(
+            "UPDATE media_files SET conform_status = ?, conformed_path = ?, conform_stamp = ? WHERE id = ?",
+            (conform_status, conformed_path, conform_stamp, job_id)
+        )
+        con.commit()
+
+
 def get_job_by_id(job_id: int) -> Optional[Dict[str, Any]]:
     """Get a single job by ID."""
     with get_connection() as con:
@@ -281,12 +407,12 @@ def reset_stale_jobs(stale_seconds: int = 300) -> int:
 
 
 def retry_failed_jobs(max_attempts: int = 3) -> int:
-    """Reset failed jobs that haven't exceeded max attempts."""
+    """Reset failed jobs that haven't exceeded max attempts (their media is re-conformed)."""
     with get_connection() as con:
         cur = con.execute(
             """
             UPDATE media_files 
-            SET status = ?
+            SET status = ?, conform_status = NULL, conformed_path = NULL, conform_stamp = NULL
             WHERE status = ? AND attempts < ?
             """,
             (STATUS_PENDING, STATUS_FAILED, max_attempts)
@@ -409,6 +535,16 @@ def get_all_scheduled_jobs() -> List[Dict[str, Any]]:
 # Statistics
 # -----------------------------------------------------------------------------
 
+def get_queue_depth() -> Dict[str, int]:
+    """Pending jobs per platform (read from the status/platform index)."""
+    with get_connection() as con:
+        cur = con.execute(
+            "SELECT platform, COUNT(*) as count FROM media_files WHERE status = ? GROUP BY platform",
+            (STATUS_PENDING,)
+        )
+        return {row["platform"]: row["count"] for row in cur.fetchall()}
+
+
 def get_stats() -> Dict[str, Any]:
     """Get queue statistics."""
     with get_connection() as con:
@@ -444,6 +580,7 @@ if __name__ == "__main__":
     import argparse
     import json
     from datetime import datetime
+    import scheduler
     
     parser = argparse.ArgumentParser(description="Database management for BB-Poster")
     parser.add_argument("--init", action="store_true", help="Initialize database")
@@ -502,10 +639,14 @@ if __name__ == "__main__":
         init_db()
         count = reset_stale_jobs()
         print(f"Reset {count} stale job(s).")
+        if count:
+            scheduler.notify("poster")
     elif args.retry_failed:
         init_db()
         count = retry_failed_jobs()
         print(f"Reset {count} failed job(s) for retry.")
+        if count:
+            scheduler.notify("poster")
     elif args.clear_pending:
         init_db()
         count = clear_pending_jobs()
@@ -1,12 +1,19 @@
-import os, shutil
+import os, shutil, json, argparse
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageFilter
 
 PHOTOS_DIR = os.path.expanduser("~/BB-Poster-Automation/United_States/Nyssa_Bloom/Instagram/Photos")
 BACKUP_DIR = os.path.expanduser("~/BB-Poster-Automation/backups/original_photos")
 
+# Photos already checked or fixed, by (size, mtime) of the file in PHOTOS_DIR - reruns skip them
+MANIFEST_FILE = os.path.join(BACKUP_DIR, ".aspect_manifest.json")
+
 TARGET_W, TARGET_H = 1080, 1350  # 4:5 canvas for IG feed
 MIN_AR, MAX_AR = 0.8, 1.91
 
+BLUR_RADIUS = 18
+BLUR_DOWNSCALE = 4  # Blur the background at 1/4 size, then upscale (same look, ~16x less work)
+
 def is_aspect_ok(w: int, h: int) -> bool:
     ar = w / h
     return MIN_AR <= ar <= MAX_AR
@@ -19,29 +26,94 @@ def fit_contain(im: Image.Image, tw: int, th: int) -> Image.Image:
 def fit_cover(im: Image.Image, tw: int, th: int) -> Image.Image:
     w, h = im.size
     scale = max(tw / w, th / h)
-    nw, nh = int(w * scale), int(h * scale)
+    nw, nh = max(tw, round(w * scale)), max(th, round(h * scale))
     return im.resize((nw, nh), Image.LANCZOS)
 
+def blurred_background(im: Image.Image, tw: int = TARGET_W, th: int = TARGET_H) -> Image.Image:
+    # Cover-crop at reduced size, blur there, scale up: a heavy blur has no detail to lose
+    sw, sh = tw // BLUR_DOWNSCALE, th // BLUR_DOWNSCALE
+    bg = fit_cover(im, sw, sh)
+    left = (bg.size[0] - sw) // 2
+    top  = (bg.size[1] - sh) // 2
+    bg = bg.crop((left, top, left + sw, top + sh))
+    bg = bg.filter(ImageFilter.GaussianBlur(radius=BLUR_RADIUS / BLUR_DOWNSCALE))
+    return bg.resize((tw, th), Image.BICUBIC)
+
+def pad_blur(im: Image.Image, tw: int, th: int) -> Image.Image:
+    """Fit im inside a tw x th canvas over a blurred, cover-cropped copy of itself."""
+    canvas = blurred_background(im, tw, th)
+    fg = fit_contain(im, tw, th)
+    x = (tw - fg.size[0]) // 2
+    y = (th - fg.size[1]) // 2
+    canvas.paste(fg, (x, y))
+    return canvas
+
 def pad_to_4x5_blur(src_path: str, dst_path: str) -> None:
     with Image.open(src_path) as im:
+        # JPEG: decode at the smallest DCT scale still covering the canvas
+        im.draft("RGB", (TARGET_W, TARGET_H))
         im = im.convert("RGB")
 
-        bg = fit_cover(im, TARGET_W, TARGET_H)
-        left = (bg.size[0] - TARGET_W) // 2
-        top  = (bg.size[1] - TARGET_H) // 2
-        bg = bg.crop((left, top, left + TARGET_W, top + TARGET_H))
-        bg = bg.filter(ImageFilter.GaussianBlur(radius=18))
-
-        fg = fit_contain(im, TARGET_W, TARGET_H)
+        canvas = pad_blur(im, TARGET_W, TARGET_H)
+        canvas.save(dst_path, "JPEG", quality=92, optimize=True)
 
-        canvas = bg
-        x = (TARGET_W - fg.size[0]) // 2
-        y = (TARGET_H - fg.size[1]) // 2
-        canvas.paste(fg, (x, y))
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest: dict) -> None:
+    tmp = MANIFEST_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST_FILE)
+
+def file_key(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def process_photo(fn: str):
+    """Check (and if needed fix) one photo. Returns (fn, status, message); runs in pool workers."""
+    photos_path = os.path.join(PHOTOS_DIR, fn)
+    backup_path = os.path.join(BACKUP_DIR, fn)
+
+    # Ensure a backup exists (copy from PHOTOS_DIR once), but NEVER modify backup
+    if not os.path.exists(backup_path):
+        shutil.copy2(photos_path, backup_path)
+
+    # Always read from BACKUP_DIR as the source of truth
+    src = backup_path
+
+    try:
+        with Image.open(src) as im:
+            w, h = im.size
+    except Exception as e:
+        return fn, "skip", f"[SKIP] {fn}: cannot open source backup ({e})"
+
+    if is_aspect_ok(w, h):
+        # If already valid, ensure PHOTOS_DIR has the original (optional)
+        # We do nothing to avoid extra writes.
+        return fn, "ok", None
+
+    # Overwrite ONLY the PHOTOS_DIR file, using backup as input
+    tmp = photos_path + f".{os.getpid()}.tmp.jpg"
+    try:
+        pad_to_4x5_blur(src, tmp)
+        os.replace(tmp, photos_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
-        canvas.save(dst_path, "JPEG", quality=92, optimize=True)
+    return fn, "fixed", f"[FIXED] {fn}: source={w}x{h} -> output={TARGET_W}x{TARGET_H} (PHOTOS_DIR overwritten, backup untouched)"
 
 def main():
+    parser = argparse.ArgumentParser(description="Pad IG feed photos to 4:5 with a blurred background")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Photos to process in parallel (default: 1)")
+    parser.add_argument("--force", action="store_true", help="Re-check photos already in the manifest")
+    args = parser.parse_args()
+
     os.makedirs(BACKUP_DIR, exist_ok=True)
 
     files = sorted([
@@ -49,37 +121,33 @@ def main():
         if f.lower().endswith((".jpg", ".jpeg"))
     ])
 
-    fixed = 0
-    for fn in files:
-        photos_path = os.path.join(PHOTOS_DIR, fn)
-        backup_path = os.path.join(BACKUP_DIR, fn)
-
-        # Ensure a backup exists (copy from PHOTOS_DIR once), but NEVER modify backup
-        if not os.path.exists(backup_path):
-            shutil.copy2(photos_path, backup_path)
-
-        # Always read from BACKUP_DIR as the source of truth
-        src = backup_path
-
-        try:
-            with Image.open(src) as im:
-                w, h = im.size
-        except Exception as e:
-            print(f"[SKIP] {fn}: cannot open source backup ({e})")
-            continue
-
-        if is_aspect_ok(w, h):
-            # If already valid, ensure PHOTOS_DIR has the original (optional)
-            # We do nothing to avoid extra writes.
-            continue
-
-        # Overwrite ONLY the PHOTOS_DIR file, using backup as input
-        tmp = photos_path + ".tmp.jpg"
-        pad_to_4x5_blur(src, tmp)
-        os.replace(tmp, photos_path)
+    # Skip photos unchanged since they were last checked or fixed
+    manifest = {} if args.force else load_manifest()
+    todo = [fn for fn in files if manifest.get(fn) != file_key(os.path.join(PHOTOS_DIR, fn))]
+    if len(todo) < len(files):
+        print(f"Skipping {len(files) - len(todo)} photo(s) already checked (use --force to re-check)")
+
+    if args.jobs > 1 and len(todo) > 1:
+        # Workers only decode at draft size and blur a small background, so memory stays bounded per worker
+        pool = ProcessPoolExecutor(max_workers=args.jobs)
+        results = pool.map(process_photo, todo, chunksize=4)
+    else:
+        pool = None
+        results = map(process_photo, todo)
 
-        fixed += 1
-        print(f"[FIXED] {fn}: source={w}x{h} -> output={TARGET_W}x{TARGET_H} (PHOTOS_DIR overwritten, backup untouched)")
+    fixed = 0
+    try:
+        for fn, status, message in results:
+            if message:
+                print(message)
+            if status == "skip":
+                continue
+            fixed += status == "fixed"
+            manifest[fn] = file_key(os.path.join(PHOTOS_DIR, fn))
+    finally:
+        if pool:
+            pool.shutdown()
+        save_manifest(manifest)
 
     print(f"\nDone. Fixed {fixed} image(s). Backups were only read from: {BACKUP_DIR}")
 
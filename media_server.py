@@ -7,6 +7,9 @@ import sqlite3
 from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse
 
+import registry
+from metrics import Metrics
+
 BASE_DIR = os.path.expanduser("~/BB-Poster-Automation/media_root")
 DB_FILE  = os.path.expanduser("~/BB-Poster-Automation/media_tokens/tokens.sqlite3")
 
@@ -16,6 +19,8 @@ NO_CACHE_HEADERS = {
     "Expires": "0",
 }
 
+metrics = Metrics("media_server")
+
 def _ensure_db():
     os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
     with sqlite3.connect(DB_FILE) as con:
@@ -78,11 +83,25 @@ def _increment_use(con, token: str):
     con.execute("UPDATE tokens SET uses = uses + 1 WHERE token = ?", (token,))
 
 class Handler(BaseHTTPRequestHandler):
+    status_code = None
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
     def do_HEAD(self):
-        self._serve(head_only=True)
+        self._timed(head_only=True)
 
     def do_GET(self):
-        self._serve(head_only=False)
+        self._timed(head_only=False)
+
+    def _timed(self, head_only: bool):
+        start = time.time()
+        try:
+            self._serve(head_only)
+        finally:
+            metrics.observe("media_request_seconds", time.time() - start,
+                            method=self.command, status=self.status_code or 0)
 
     def _serve(self, head_only: bool):
         u = urlparse(self.path)
@@ -163,6 +182,17 @@ class Handler(BaseHTTPRequestHandler):
         except BrokenPipeError:
             pass
 
+class Server(ThreadingHTTPServer):
+    # serve_forever() calls service_actions() every poll; use it as the registry heartbeat
+    last_heartbeat = 0.0
+
+    def service_actions(self):
+        now = time.time()
+        if now - self.last_heartbeat >= 30:
+            self.last_heartbeat = now
+            metrics.flush()
+            registry.heartbeat("media_server")
+
 def main():
     import argparse
     ap = argparse.ArgumentParser()
@@ -182,7 +212,8 @@ def main():
         return
 
     _ensure_db()
-    httpd = ThreadingHTTPServer((args.host, args.port), Handler)
+    registry.register("media_server")
+    httpd = Server((args.host, args.port), Handler)
     print(f"Serving on http://{args.host}:{args.port} (BASE_DIR={BASE_DIR}, DB={DB_FILE})")
     httpd.serve_forever()
 
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Metrics for BB-Poster-Automation daemons.
+
+Counters, gauges and histograms are kept in memory and flushed to SQLite
+(poster.sqlite3) by each daemon once per loop:
+
+  - metrics         current value per (service, name, labels)
+  - metric_points   individual gauge readings / histogram observations,
+                    kept for METRIC_RETENTION_DAYS so the dashboard can chart them
+
+The dashboard serves the `metrics` table as Prometheus text at /metrics.
+
+Usage:
+    metrics = Metrics("poster")
+    metrics.inc("posts_total", platform="Instagram", result="posted")
+    with metrics.timer("scan_duration_seconds"):
+        scan_all()
+    metrics.flush()
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import DB_FILE
+
+# Seconds - covers API calls (sub-second) up to posting delays (hours)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600, 14400)
+
+METRIC_RETENTION_DAYS = 7
+
+# -----------------------------------------------------------------------------
+# Database Setup
+# -----------------------------------------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    service         TEXT NOT NULL,              -- 'poster', 'scanner', ...
+    name            TEXT NOT NULL,              -- 'scan_duration_seconds'
+    labels          TEXT NOT NULL,              -- JSON object, sorted keys
+    kind            TEXT NOT NULL,              -- 'counter', 'gauge', 'histogram'
+    value           REAL,                       -- Counter / gauge value
+    count           INTEGER,                    -- Histogram observation count
+    sum             REAL,                       -- Histogram observation sum
+    buckets         TEXT,                       -- Histogram JSON [[le, count], ...]
+    updated_at      REAL NOT NULL,
+    PRIMARY KEY (service, name, labels)
+);
+
+CREATE TABLE IF NOT EXISTS metric_points (
+    ts              REAL NOT NULL,
+    service         TEXT NOT NULL,
+    name            TEXT NOT NULL,
+    labels          TEXT NOT NULL,
+    value           REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_metric_points_name_ts ON metric_points(name, ts);
+"""
+
+
+def _label_key(labels: Dict[str, Any]) -> str:
+    return json.dumps({k: str(v) for k, v in labels.items()}, sort_keys=True)
+
+
+# -----------------------------------------------------------------------------
+# Collector
+# -----------------------------------------------------------------------------
+
+class Metrics:
+    """In-memory metrics for one service, flushed to SQLite."""
+
+    def __init__(self, service: str, db_file: str = DB_FILE):
+        self.service = service
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, str], Dict[str, Any]] = {}  # (name, labels): state
+        self._points: List[Tuple[float, str, str, float]] = []     # Pending metric_points rows
+        self._dirty = set()
+        self._schema_ready = False
+        self._last_prune = 0.0
+
+    def _entry(self, kind: str, name: str, labels: Dict[str, Any]) -> Dict[str, Any]:
+        key = (name, _label_key(labels))
+        entry = self._values.get(key)
+        if entry is None:
+            entry = {"kind": kind, "value": 0.0}
+            if kind == "histogram":
+                entry.update(count=0, sum=0.0, buckets=[0] * len(DEFAULT_BUCKETS))
+            self._values[key] = entry
+        self._dirty.add(key)
+        return entry
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Increase a counter."""
+        with self._lock:
+            self._entry("counter", name, labels)["value"] += value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge (also recorded as a point for charting)."""
+        with self._lock:
+            self._entry("gauge", name, labels)["value"] = float(value)
+            self._points.append((time.time(), name, _label_key(labels), float(value)))
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a histogram observation (also recorded as a point for charting)."""
+        with self._lock:
+            entry = self._entry("histogram", name, labels)
+            entry["count"] += 1
+            entry["sum"] += value
+            for i, le in enumerate(DEFAULT_BUCKETS):
+                if value <= le:
+                    entry["buckets"][i] += 1
+                    break
+            self._points.append((time.time(), name, _label_key(labels), float(value)))
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of a block in seconds."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **labels)
+
+    def flush(self) -> None:
+        """Write changed metrics and pending points to SQLite (never raises)."""
+        with self._lock:
+            now = time.time()
+            rows = []
+            for key in self._dirty:
+                name, labels = key
+                entry = self._values[key]
+                cumulative, total = [], 0
+                for le, count in zip(DEFAULT_BUCKETS, entry.get("buckets", [])):
+                    total += count
+                    cumulative.append([le, total])
+                rows.append((
+                    self.service, name, labels, entry["kind"], entry["value"],
+                    entry.get("count"), entry.get("sum"),
+                    json.dumps(cumulative) if entry["kind"] == "histogram" else None, now
+                ))
+            points = [(ts, self.service, name, labels, value) for ts, name, labels, value in self._points]
+            self._dirty = set()
+            self._points = []
+
+        if not rows and not points:
+            return
+
+        try:
+            with sqlite3.connect(self.db_file, timeout=5) as con:
+                if not self._schema_ready:
+                    con.executescript(SCHEMA)
+                    self._schema_ready = True
+                con.executemany(
+                    """
+                    INSERT INTO metrics (service, name, labels, kind, value, count, sum, buckets, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(service, name, labels) DO UPDATE SET
+                        kind = excluded.kind, value = excluded.value, count = excluded.count,
+                        sum = excluded.sum, buckets = excluded.buckets, updated_at = excluded.updated_at
+                    """,
+                    rows
+                )
+                con.executemany(
+                    "INSERT INTO metric_points (ts, service, name, labels, value) VALUES (?, ?, ?, ?, ?)",
+                    points
+                )
+                if now - self._last_prune > 3600:
+                    self._last_prune = now
+                    con.execute(
+                        "DELETE FROM metric_points WHERE ts < ?",
+                        (now - METRIC_RETENTION_DAYS * 86400,)
+                    )
+                con.commit()
+        except sqlite3.Error as e:
+            print(f"Metrics flush failed: {e}")
+
+
+# -----------------------------------------------------------------------------
+# Readers (dashboard)
+# -----------------------------------------------------------------------------
+
+def read_metrics(db_file: str = DB_FILE) -> List[Dict[str, Any]]:
+    """Current value of every metric from every service."""
+    try:
+        con = sqlite3.connect(db_file)
+        con.row_factory = sqlite3.Row
+        rows = con.execute("SELECT * FROM metrics ORDER BY name, service, labels").fetchall()
+        con.close()
+    except sqlite3.Error:
+        return []
+    return [dict(row) for row in rows]
+
+
+def read_points(name: str, since: float, db_file: str = DB_FILE) -> List[Dict[str, Any]]:
+    """Chartable points for one metric since a Unix timestamp."""
+    try:
+        con = sqlite3.connect(db_file)
+        rows = con.execute(
+            "SELECT ts, service, labels, value FROM metric_points WHERE name = ? AND ts >= ? ORDER BY ts",
+            (name, since)
+        ).fetchall()
+        con.close()
+    except sqlite3.Error:
+        return []
+    return [{"ts": ts, "service": service, "labels": json.loads(labels), "value": value}
+            for ts, service, labels, value in rows]
+
+
+def render_prometheus(rows: Iterable[Dict[str, Any]]) -> str:
+    """Render rows from read_metrics() in the Prometheus text exposition format."""
+
+    def fmt_labels(labels: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> str:
+        merged = dict(labels, **(extra or {}))
+        parts = []
+        for k, v in merged.items():
+            v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            parts.append(f'{k}="{v}"')
+        return "{" + ",".join(parts) + "}"
+
+    lines, typed = [], set()
+    for row in rows:
+        name = row["name"]
+        labels = dict(json.loads(row["labels"]), service=row["service"])
+        if name not in typed:
+            lines.append(f"# TYPE {name} {row['kind']}")
+            typed.add(name)
+
+        if row["kind"] == "histogram":
+            for le, count in json.loads(row["buckets"] or "[]"):
+                lines.append(f"{name}_bucket{fmt_labels(labels, {'le': str(le)})} {count}")
+            lines.append(f"{name}_bucket{fmt_labels(labels, {'le': '+Inf'})} {row['count']}")
+            lines.append(f"{name}_sum{fmt_labels(labels)} {row['sum']}")
+            lines.append(f"{name}_count{fmt_labels(labels)} {row['count']}")
+        else:
+            lines.append(f"{name}{fmt_labels(labels)} {row['value']}")
+    return "\n".join(lines) + "\n"
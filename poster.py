@@ -21,6 +21,12 @@ except ImportError:
     TWEEPY_AVAILABLE = False
 
 import db
+import conformance
+import registry
+from metrics import Metrics
+from profiling import LoopProfiler
+from rate_limiter import RateLimiter, make_key
+from scheduler import DueScheduler
 from config import (
     PROJECT_ROOT, MEDIA_ROOT, MEDIA_SERVER_SCRIPT,
     PUBLIC_MEDIA_BASE_URL, TOKEN_TTL_SECONDS, TOKEN_MAX_USES,
@@ -32,6 +38,14 @@ from config import (
 # Logger (initialized in main)
 logger = None
 
+# Paces posts per account/platform (one post per POST_DELAY_SECONDS)
+rate_limiter: Optional[RateLimiter] = None
+
+metrics = Metrics("poster")
+
+# Armed with --profile N or SIGUSR1 (see profiling.py)
+profiler: Optional[LoopProfiler] = None
+
 # -----------------------------------------------------------------------------
 # Media Server Integration
 # -----------------------------------------------------------------------------
@@ -154,6 +168,19 @@ def is_rate_limited(job: Dict[str, Any]) -> Tuple[bool, str]:
     return False, ""
 
 
+def wait_for_post_slot(job: Dict[str, Any]) -> None:
+    """Block until the account/platform has budget for another post."""
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+    
+    key = make_key(job["model_name"], job["platform"], "post")
+    wait = rate_limiter.try_acquire(key, capacity=1, period=POST_DELAY_SECONDS)
+    if wait > 0:
+        logger.debug(f"Waiting {wait:.1f}s for {key} budget...")
+        rate_limiter.acquire(key, capacity=1, period=POST_DELAY_SECONDS)
+
+
 # -----------------------------------------------------------------------------
 # Facebook/Instagram API Helpers
 # -----------------------------------------------------------------------------
@@ -228,10 +255,12 @@ def wait_for_ig_container(
         
         if status_code == "FINISHED":
             logger.info(f"Container ready after {check_count} check(s), {time.time() - start:.1f}s")
+            metrics.observe("container_wait_seconds", time.time() - start, result="finished")
             return True, "FINISHED"
         elif status_code == "ERROR":
             error_detail = result.get("status", "Container processing error")
             logger.error(f"Container failed: {error_detail}")
+            metrics.observe("container_wait_seconds", time.time() - start, result="error")
             return False, error_detail
         elif status_code in ("IN_PROGRESS", "PUBLISHED", None, ""):
             # IN_PROGRESS = still processing
@@ -244,6 +273,7 @@ def wait_for_ig_container(
             time.sleep(CONTAINER_STATUS_INTERVAL)
     
     logger.error(f"Container timeout after {check_count} checks, {timeout}s")
+    metrics.observe("container_wait_seconds", time.time() - start, result="timeout")
     return False, "Timeout waiting for container"
 
 
@@ -685,7 +715,14 @@ def post_job(job: Dict[str, Any]) -> Tuple[bool, str, str]:
     platform = job["platform"]
     content_type = job["content_type"]
     caption = job.get("caption")
-    is_video = is_video_file(job["file_path"])
+    
+    # Conformed derivative if the media needed fixing (see conformance.py), else the original
+    media_path, error = conformance.publish_path(job)
+    if media_path is None:
+        return False, "", error
+    if media_path != job["file_path"]:
+        logger.info(f"Using conformed media: {media_path}")
+    is_video = is_video_file(media_path)
     
     # Twitter uses different credential fields and posts locally (no media URL needed)
     if platform == "Twitter":
@@ -698,7 +735,7 @@ def post_job(job: Dict[str, Any]) -> Tuple[bool, str, str]:
             return False, "", "Missing Twitter credentials (need api_key, api_secret, access_token, access_secret)"
         
         # Twitter posts directly from local file
-        local_path = os.path.join(PROJECT_ROOT, job["file_path"])
+        local_path = os.path.join(PROJECT_ROOT, media_path)
         if not os.path.isfile(local_path):
             return False, "", f"File not found: {local_path}"
         
@@ -717,7 +754,7 @@ def post_job(job: Dict[str, Any]) -> Tuple[bool, str, str]:
     if not access_token:
         return False, "", "No access token in credentials"
     
-    media_root_path = copy_to_media_root(job["file_path"])
+    media_root_path = copy_to_media_root(media_path)
     token = mint_media_token(media_root_path)
     
     if not token:
@@ -820,50 +857,97 @@ def process_pending_jobs(limit: int = 1) -> int:
         if not os.path.isfile(full_path):
             logger.warning(f"Job [{job_id}] file not found, marking as skipped")
             db.update_job_status(job_id, db.STATUS_SKIPPED, error_message="File not found")
+            metrics.inc("posts_total", platform=job["platform"], content_type=job["content_type"], result="skipped")
             continue
         
+        wait_for_post_slot(job)
         db.mark_job_posting(job_id)
         
+        labels = {"platform": job["platform"], "content_type": job["content_type"]}
         try:
-            success, post_id, error = post_job(job)
+            with metrics.timer("post_duration_seconds", **labels):
+                success, post_id, error = post_job(job)
             
             if success:
                 db.update_job_status(job_id, db.STATUS_POSTED, platform_post_id=post_id)
+                conformance.discard(db.get_job_by_id(job_id) or job)
                 logger.info(f"Job [{job_id}] SUCCESS: {post_id}")
+                if job.get("scheduled_for"):
+                    # Latency from scheduled_for to posted_at
+                    metrics.observe("post_delay_seconds", max(0, time.time() - job["scheduled_for"]), **labels)
             else:
                 db.update_job_status(job_id, db.STATUS_FAILED, error_message=error)
                 logger.error(f"Job [{job_id}] FAILED: {error}")
+            metrics.inc("posts_total", result="posted" if success else "failed", **labels)
             
             processed += 1
             
         except Exception as e:
             logger.error(f"Job [{job_id}] EXCEPTION: {e}", exc_info=True)
             db.update_job_status(job_id, db.STATUS_FAILED, error_message=str(e))
-        
-        if processed < len(jobs):
-            logger.debug(f"Waiting {POST_DELAY_SECONDS}s before next post...")
-            time.sleep(POST_DELAY_SECONDS)
+            metrics.inc("posts_total", result="error", **labels)
     
     return processed
 
 
 def run_worker(interval: int = 60, batch_size: int = 1) -> None:
-    """Run the poster worker continuously."""
-    logger.info(f"Starting poster worker (interval: {interval}s, batch: {batch_size})")
+    """
+    Run the poster worker continuously.
+    
+    Sleeps until the next job's scheduled_for (or until the scanner wakes it),
+    and only falls back to `interval` while due jobs are held back by rate limits.
+    """
+    logger.info(f"Starting poster worker (retry interval: {interval}s, batch: {batch_size})")
     
     stale = db.reset_stale_jobs()
     if stale:
         logger.info(f"Reset {stale} stale job(s)")
     
+    scheduler = DueScheduler("poster")
+    registry.register("poster")
+    queue_platforms = set()  # Keep reporting 0 once a platform's queue drains
+    profiler.install_signal_handler()
+    
     while True:
+        loop_start = time.time()
+        processed = 0
         try:
-            processed = process_pending_jobs(limit=batch_size)
+            with profiler.iteration():
+                processed = process_pending_jobs(limit=batch_size)
             if processed > 0:
                 logger.info(f"Processed {processed} job(s)")
         except Exception as e:
             logger.error(f"Worker error: {e}", exc_info=True)
         
-        time.sleep(interval)
+        try:
+            depths = db.get_queue_depth()
+            queue_platforms.update(depths)
+            for platform in queue_platforms:
+                metrics.set("queue_depth", depths.get(platform, 0), platform=platform)
+        except Exception as e:
+            logger.debug(f"Queue depth unavailable: {e}")
+        metrics.flush()
+        registry.heartbeat("poster", time.time() - loop_start)
+        
+        try:
+            due_left = bool(db.get_pending_jobs(limit=1))
+            if due_left and processed > 0:
+                continue  # More work is due right now
+            
+            scheduler.reload(db.get_upcoming_due_times())
+            deadline = scheduler.next_due()
+            if due_left:
+                # Due jobs are blocked (e.g. daily limit) - re-check after interval
+                retry_at = time.time() + interval
+                deadline = min(deadline, retry_at) if deadline else retry_at
+        except Exception as e:
+            logger.error(f"Scheduler error: {e}", exc_info=True)
+            deadline = time.time() + interval
+        
+        if deadline:
+            logger.debug(f"Sleeping until {datetime.fromtimestamp(deadline).strftime('%m/%d %H:%M:%S')}")
+        if scheduler.wait(deadline):
+            logger.debug("Woken by new jobs")
 
 
 # -----------------------------------------------------------------------------
@@ -871,16 +955,17 @@ def run_worker(interval: int = 60, batch_size: int = 1) -> None:
 # -----------------------------------------------------------------------------
 
 def main():
-    global logger
+    global logger, profiler
     import argparse
     
     parser = argparse.ArgumentParser(description="Post media to Facebook/Instagram")
     parser.add_argument("--once", action="store_true", help="Process one batch and exit")
     parser.add_argument("--daemon", action="store_true", help="Run continuously")
-    parser.add_argument("--interval", type=int, default=60, help="Check interval in seconds")
+    parser.add_argument("--interval", type=int, default=60, help="Retry interval for rate-limited jobs in seconds")
     parser.add_argument("--batch", type=int, default=1, help="Jobs per batch")
     parser.add_argument("--job-id", type=int, help="Process a specific job by ID")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="cProfile the first N batches into logs/")
     parser.add_argument(
         "--add-credentials", nargs=5,
         metavar=("COUNTRY", "MODEL", "PLATFORM", "PAGE_ID/IG_USER_ID", "ACCESS_TOKEN"),
@@ -894,6 +979,8 @@ def main():
     args = parser.parse_args()
     
     logger = setup_logger("poster", verbose=args.verbose)
+    profiler = LoopProfiler("poster", logger)
+    profiler.arm(args.profile)
     db.init_db()
     
     if args.add_credentials:
@@ -936,7 +1023,8 @@ def main():
     if args.daemon:
         run_worker(interval=args.interval, batch_size=args.batch)
     else:
-        processed = process_pending_jobs(limit=args.batch)
+        with profiler.iteration():
+            processed = process_pending_jobs(limit=args.batch)
         print(f"Processed {processed} job(s)")
 
 
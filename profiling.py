@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Opt-in cProfile hooks for BB-Poster-Automation daemon loops.
+
+A profiler wraps one hot function per daemon (scan_all, process_pending_jobs,
+scan_for_new_comments). It is idle until armed, so the disabled cost is a
+single integer check per loop.
+
+Arm it:
+    python3 poster.py --daemon --profile 5     # profile the first 5 iterations
+    kill -USR1 <pid>                           # profile the next PROFILE_ITERATIONS
+
+When the armed iterations finish, it writes to ~/BB-Poster-Automation/logs/:
+    profile_<name>_<timestamp>.pstats   (python3 -m pstats, snakeviz, ...)
+    profile_<name>_<timestamp>.txt      (top functions by cumulative time)
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import signal
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from config import LOG_DIR
+
+PROFILE_ITERATIONS = 10  # Iterations profiled per SIGUSR1
+TOP_FUNCTIONS = 40       # Rows in the .txt summary
+
+
+class LoopProfiler:
+    """
+    Usage:
+        profiler = LoopProfiler("poster", logger)
+        profiler.install_signal_handler()
+        while True:
+            with profiler.iteration():
+                process_pending_jobs()
+    """
+
+    def __init__(self, name: str, logger=None):
+        self.name = name
+        self.logger = logger
+        self.remaining = 0
+        self._profile: Optional[cProfile.Profile] = None
+        self._iterations = 0
+
+    def _log(self, message: str) -> None:
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def arm(self, iterations: int = PROFILE_ITERATIONS) -> None:
+        """Profile the next `iterations` loop iterations."""
+        self.remaining = max(0, iterations)
+
+    def install_signal_handler(self, signum: int = signal.SIGUSR1) -> None:
+        # The handler only sets a counter; profiling starts at the next iteration
+        signal.signal(signum, lambda *_: self.arm())
+
+    @contextmanager
+    def iteration(self):
+        if not self.remaining:
+            yield
+            return
+
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._iterations = 0
+            self._log(f"Profiling {self.remaining} iteration(s) of {self.name}")
+
+        self._profile.enable()
+        try:
+            yield
+        finally:
+            self._profile.disable()
+            self._iterations += 1
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self._dump()
+
+    def _dump(self) -> None:
+        profile, self._profile = self._profile, None
+        os.makedirs(LOG_DIR, exist_ok=True)
+        base = os.path.join(LOG_DIR, f"profile_{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+        try:
+            profile.dump_stats(f"{base}.pstats")
+
+            out = io.StringIO()
+            stats = pstats.Stats(profile, stream=out)
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            with open(f"{base}.txt", "w", encoding="utf-8") as f:
+                f.write(f"{self.name}: {self._iterations} iteration(s)\n")
+                f.write(out.getvalue())
+
+            self._log(f"Profile written: {base}.pstats")
+        except OSError as e:
+            self._log(f"Could not write profile: {e}")
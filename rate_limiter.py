@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Token-bucket rate limiter for BB-Poster-Automation.
+Shared by the poster and the comment responder to pace outgoing API calls.
+
+Each bucket is keyed by account/platform/action (e.g. 'Nyssa_Bloom/Instagram/post')
+and holds up to `capacity` tokens that refill continuously over `period` seconds.
+State lives in memory and is written through to SQLite so budgets survive restarts.
+
+A bucket paces calls; it is not a hard cap. A full bucket can be spent at once
+and refills during the same period, so up to 2 * capacity calls can fit in one
+rolling `period`. For a strict "N per hour", keep a separate count of what was
+actually sent (as comment_responder does) and use the bucket only for spacing.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import DB_FILE
+
+# -----------------------------------------------------------------------------
+# Database Setup
+# -----------------------------------------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    bucket_key      TEXT PRIMARY KEY,           -- 'account/platform/action'
+    tokens          REAL NOT NULL,              -- Tokens left at updated_at
+    updated_at      REAL NOT NULL               -- Unix timestamp of last refill
+);
+"""
+
+
+def make_key(account: str, platform: str, action: str) -> str:
+    """Build a bucket key from account, platform and action."""
+    return f"{account}/{platform}/{action}"
+
+
+# -----------------------------------------------------------------------------
+# Limiter
+# -----------------------------------------------------------------------------
+
+class RateLimiter:
+    """
+    In-memory token buckets persisted to SQLite.
+
+    Usage:
+        limiter = RateLimiter()
+        key = make_key("Nyssa_Bloom", "Instagram", "reply")
+        if limiter.acquire(key, capacity=1, period=2, max_wait=60):  # At most 1 per 2s
+            send()
+    """
+
+    def __init__(self, db_file: str = DB_FILE):
+        self.db_file = db_file
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key: (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._ensure_db()
+
+    def _ensure_db(self) -> None:
+        with sqlite3.connect(self.db_file) as con:
+            con.executescript(SCHEMA)
+            con.commit()
+
+    def _load(self, key: str, capacity: float) -> Tuple[float, float]:
+        """Get bucket state from memory, falling back to SQLite, then a full bucket."""
+        state = self._buckets.get(key)
+        if state is not None:
+            return state
+
+        with sqlite3.connect(self.db_file) as con:
+            row = con.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE bucket_key = ?",
+                (key,)
+            ).fetchone()
+
+        state = (float(row[0]), float(row[1])) if row else (float(capacity), time.time())
+        self._buckets[key] = state
+        return state
+
+    def _save(self, key: str, tokens: float, updated_at: float) -> None:
+        self._buckets[key] = (tokens, updated_at)
+        with sqlite3.connect(self.db_file) as con:
+            con.execute(
+                """
+                INSERT INTO rate_buckets (bucket_key, tokens, updated_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(bucket_key) DO UPDATE SET
+                    tokens = excluded.tokens,
+                    updated_at = excluded.updated_at
+                """,
+                (key, tokens, updated_at)
+            )
+            con.commit()
+
+    @staticmethod
+    def _refill(tokens: float, updated_at: float, capacity: float, period: float, now: float) -> float:
+        elapsed = max(0.0, now - updated_at)
+        return min(float(capacity), tokens + elapsed * capacity / period)
+
+    def available(self, key: str, capacity: float, period: float) -> float:
+        """Return the number of tokens currently in the bucket."""
+        with self._lock:
+            tokens, updated_at = self._load(key, capacity)
+            return self._refill(tokens, updated_at, capacity, period, time.time())
+
+    def wait_time(self, key: str, capacity: float, period: float, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens will be available (0.0 if available now)."""
+        tokens = self.available(key, capacity, period)
+        return max(0.0, (cost - tokens) * period / capacity)
+
+    def try_acquire(self, key: str, capacity: float, period: float, cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens if available.
+
+        Returns:
+            0.0 if the tokens were taken, otherwise the seconds to wait
+            until enough tokens will have refilled.
+        """
+        with self._lock:
+            now = time.time()
+            tokens, updated_at = self._load(key, capacity)
+            tokens = self._refill(tokens, updated_at, capacity, period, now)
+
+            if tokens >= cost:
+                self._save(key, tokens - cost, now)
+                return 0.0
+
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) * period / capacity
+
+    def acquire(
+        self,
+        key: str,
+        capacity: float,
+        period: float,
+        cost: float = 1.0,
+        max_wait: Optional[float] = None,
+    ) -> bool:
+        """
+        Block until `cost` tokens are available and take them.
+
+        Returns False without waiting if the required wait exceeds max_wait.
+        """
+        while True:
+            wait = self.try_acquire(key, capacity, period, cost)
+            if wait <= 0:
+                return True
+            if max_wait is not None and wait > max_wait:
+                return False
+            time.sleep(wait)
@@ -2,14 +2,33 @@
 """
 Regenerate captions for images using Claude Vision API.
 Analyzes each image and creates a matching caption.
+
+Images are downscaled to the model's effective resolution before upload
+(cached in ~/BB-Poster-Automation/.cache/caption_images/).
+
+Requests run on a small thread pool (--workers). Pacing adapts to the
+rate-limit headers the API returns, and failed requests are retried with
+jittered exponential backoff. Finished images are recorded in a progress
+journal so an interrupted run can continue with --resume.
+
+--batch submits every image as a Message Batches job instead, polls until
+it ends and writes the results the same way (captions, journal, --log).
 """
 
 import os
 import sys
+import json
 import base64
+import hashlib
+import io
+import random
+import threading
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
 try:
     import anthropic
@@ -18,9 +37,35 @@ except ImportError:
     os.system("pip install anthropic --break-system-packages")
     import anthropic
 
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:  # Originals are sent as-is
+    PIL_AVAILABLE = False
+
 PROJECT_ROOT = os.path.expanduser("~/BB-Poster-Automation")
 INSTAGRAM_PHOTOS = os.path.join(PROJECT_ROOT, "United_States/Nyssa_Bloom/Instagram/Photos")
 
+MODEL = "claude-sonnet-4-20250514"
+DEFAULT_WORKERS = 4
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 2.0   # Seconds, doubled per attempt (with full jitter)
+RETRY_MAX_DELAY = 60.0
+MIN_INTERVAL = 0.05      # Seconds between request starts when the API reports plenty of headroom
+JOURNAL_NAME = ".caption_journal.jsonl"  # Progress journal, kept in the photos folder
+
+# Images are downscaled before upload: the API resizes anything larger than
+# ~1.15 megapixels / 1568px long edge anyway, so extra pixels only cost upload time
+MAX_IMAGE_EDGE = 1568
+MAX_IMAGE_PIXELS = 1_150_000
+UPLOAD_JPEG_QUALITY = 85
+IMAGE_CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "caption_images")
+
+# --batch: Message Batches API (asynchronous, half price, results within 24h)
+BATCH_STATE_NAME = ".caption_batch.json"   # Submitted batches, kept in the photos folder
+BATCH_POLL_INTERVAL = float(os.environ.get("CAPTION_BATCH_POLL_INTERVAL", 30))  # Seconds between status checks
+MAX_BATCH_BYTES = 200 * 1024 * 1024        # Split below the API's 256 MB request limit
+
 # Nyssa's persona for caption generation
 PERSONA = """You are Nyssa Bloom, a 24-year-old AI-generated virtual influencer and model based in Miami. 
 Your personality: warm, playful, confident but approachable, lifestyle-focused.
@@ -37,10 +82,56 @@ Format:
 Keep it under 300 words total. Be genuine, not generic."""
 
 
-def encode_image(image_path: str) -> str:
-    """Encode image to base64."""
+def prepare_image(image_path: str) -> Tuple[str, str]:
+    """
+    Base64 data and media type to upload for an image.
+    
+    The image is downscaled to the model's effective resolution and
+    re-encoded as JPEG. Results are cached in IMAGE_CACHE_DIR by content
+    hash, so unchanged photos are only resized once. Falls back to the
+    original file if PIL is missing or the image can't be processed.
+    """
     with open(image_path, "rb") as f:
-        return base64.standard_b64encode(f.read()).decode("utf-8")
+        original = f.read()
+    if not PIL_AVAILABLE:
+        return base64.standard_b64encode(original).decode("utf-8"), get_image_media_type(image_path)
+    
+    digest = hashlib.sha256(original).hexdigest()
+    cache_path = os.path.join(
+        IMAGE_CACHE_DIR, f"{digest}_{MAX_IMAGE_EDGE}_{MAX_IMAGE_PIXELS}_q{UPLOAD_JPEG_QUALITY}.jpg")
+    try:
+        with open(cache_path, "rb") as f:
+            return base64.standard_b64encode(f.read()).decode("utf-8"), "image/jpeg"
+    except OSError:
+        pass
+    
+    try:
+        with Image.open(io.BytesIO(original)) as im:
+            im.draft("RGB", (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE))  # JPEG: decode at reduced scale
+            im = ImageOps.exif_transpose(im).convert("RGB")
+            scale = min(1.0, MAX_IMAGE_EDGE / max(im.size), (MAX_IMAGE_PIXELS / (im.width * im.height)) ** 0.5)
+            if scale < 1.0:
+                im = im.resize((max(1, int(im.width * scale)), max(1, int(im.height * scale))), Image.LANCZOS)
+            out = io.BytesIO()
+            im.save(out, "JPEG", quality=UPLOAD_JPEG_QUALITY, optimize=True)
+            data = out.getvalue()
+    except Exception as e:
+        print(f"  (sending original {os.path.basename(image_path)}: {e})")
+        return base64.standard_b64encode(original).decode("utf-8"), get_image_media_type(image_path)
+    
+    # Keep whichever is smaller (small originals can grow when re-encoded)
+    if len(data) >= len(original) and get_image_media_type(image_path) == "image/jpeg":
+        data = original
+    
+    try:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass
+    return base64.standard_b64encode(data).decode("utf-8"), "image/jpeg"
 
 
 def get_image_media_type(image_path: str) -> str:
@@ -55,14 +146,148 @@ def get_image_media_type(image_path: str) -> str:
     }.get(ext, "image/jpeg")
 
 
-def generate_caption(client: anthropic.Anthropic, image_path: str) -> str:
-    """Generate a caption for the image using Claude Vision."""
+# -----------------------------------------------------------------------------
+# Rate limiting
+# -----------------------------------------------------------------------------
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds until an RFC 3339 reset timestamp (None if missing/invalid)."""
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveLimiter:
+    """
+    Spaces request starts across worker threads.
     
-    image_data = encode_image(image_path)
-    media_type = get_image_media_type(image_path)
+    After every response the spacing is recomputed from the rate-limit
+    headers: remaining requests / input tokens are spread evenly over the
+    time left until they reset. A 429 or overload pauses every worker
+    until its retry-after has passed.
+    """
     
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
+    def __init__(self, min_interval: float = MIN_INTERVAL):
+        self.min_interval = min_interval
+        self.interval = min_interval
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self._tokens_per_request: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def wait(self, stop: Optional[threading.Event] = None) -> None:
+        """Block until this thread may start a request (or `stop` is set)."""
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next_start, self._paused_until)
+            self._next_start = start + self.interval
+        if start > now:
+            if stop:
+                stop.wait(start - now)
+            else:
+                time.sleep(start - now)
+    
+    def update(self, headers, input_tokens: Optional[int] = None) -> None:
+        """Recompute spacing from a response's anthropic-ratelimit-* headers."""
+        def number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+        
+        with self._lock:
+            if input_tokens:
+                # Running average, used to turn a token budget into requests
+                previous = self._tokens_per_request
+                self._tokens_per_request = input_tokens if previous is None else 0.8 * previous + 0.2 * input_tokens
+            
+            interval = self.min_interval
+            budgets = [(number("anthropic-ratelimit-requests-remaining"),
+                        _parse_reset(headers.get("anthropic-ratelimit-requests-reset")), 1.0)]
+            if self._tokens_per_request:
+                budgets.append((number("anthropic-ratelimit-input-tokens-remaining"),
+                                _parse_reset(headers.get("anthropic-ratelimit-input-tokens-reset")),
+                                self._tokens_per_request))
+            for remaining, reset_in, cost in budgets:
+                if remaining is None or reset_in is None:
+                    continue
+                requests_left = remaining / cost
+                interval = max(interval, reset_in / max(requests_left, 1.0))
+            self.interval = interval
+    
+    def pause(self, seconds: float) -> None:
+        """Hold back every worker for `seconds` (429 / overloaded)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+
+
+def _retry_after(error) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (anthropic.RateLimitError, anthropic.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status >= 500 or status == 408)  # 529 = overloaded
+
+
+# -----------------------------------------------------------------------------
+# Caption generation
+# -----------------------------------------------------------------------------
+
+def generate_caption(client: anthropic.Anthropic, image_path: str,
+                     limiter: Optional[AdaptiveLimiter] = None,
+                     stop: Optional[threading.Event] = None) -> str:
+    """
+    Generate a caption for the image using Claude Vision.
+    
+    Transient failures (429, overloaded, 5xx, connection errors) are retried
+    up to MAX_RETRIES times with jittered exponential backoff. Setting `stop`
+    abandons the image at the next wait instead of retrying on.
+    """
+    
+    image_data, media_type = prepare_image(image_path)
+    limiter = limiter or AdaptiveLimiter()
+    stop = stop or threading.Event()
+    
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.wait(stop)
+        if stop.is_set():
+            raise RuntimeError("Cancelled")
+        try:
+            raw = client.messages.with_raw_response.create(**caption_request(image_data, media_type))
+        except Exception as e:
+            if attempt == MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                limiter.pause(retry_after)
+                delay = max(delay, retry_after)
+            if stop.wait(delay):
+                raise RuntimeError("Cancelled")
+            continue
+        
+        message = raw.parse()
+        limiter.update(raw.headers, getattr(message.usage, "input_tokens", None))
+        return message.content[0].text
+
+
+def caption_request(image_data: str, media_type: str) -> Dict:
+    """Messages API parameters for one image."""
+    return dict(
+        model=MODEL,
         max_tokens=500,
         messages=[
             {
@@ -84,8 +309,161 @@ def generate_caption(client: anthropic.Anthropic, image_path: str) -> str:
             }
         ],
     )
+
+
+# -----------------------------------------------------------------------------
+# Batch mode
+# -----------------------------------------------------------------------------
+
+class BatchState:
+    """
+    Batches submitted but not yet collected, so an interrupted --batch run
+    can pick them up with --resume instead of paying for them twice:
+        {"batches": [{"id": ..., "images": {custom_id: filename}}]}
+    """
     
-    return message.content[0].text
+    def __init__(self, path: str):
+        self.path = path
+        self.batches = []
+        try:
+            with open(path, "r") as f:
+                self.batches = json.load(f).get("batches", [])
+        except (OSError, ValueError):
+            pass
+    
+    def save(self) -> None:
+        if not self.batches:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"batches": self.batches}, f)
+        os.replace(tmp, self.path)
+
+
+def submit_batches(client: anthropic.Anthropic, images: List[Path], state: BatchState) -> None:
+    """
+    Submit one or more batches covering `images`, split by request size.
+    Each batch is saved to `state` as soon as it's created, so a failure
+    part-way leaves the ones already billed collectable with --resume.
+    """
+    requests, names, size = [], {}, 0
+    
+    def flush():
+        batch = client.messages.batches.create(requests=requests)
+        state.batches.append({"id": batch.id, "images": dict(names)})
+        state.save()
+        print(f"Submitted batch {batch.id} ({len(requests)} images)")
+    
+    for i, image_path in enumerate(images):
+        image_data, media_type = prepare_image(str(image_path))
+        custom_id = f"img-{i:05d}"  # Filenames contain '.', which custom_id doesn't allow
+        if requests and size + len(image_data) > MAX_BATCH_BYTES:
+            flush()
+            requests, names, size = [], {}, 0
+        requests.append({"custom_id": custom_id, "params": caption_request(image_data, media_type)})
+        names[custom_id] = image_path.name
+        size += len(image_data)
+    if requests:
+        flush()
+
+
+def batch_results(client: anthropic.Anthropic, state: BatchState, folder: Path):
+    """Poll every batch in `state` until it ends, yielding (image_path, caption or exception)."""
+    while state.batches:
+        batch = state.batches[0]
+        status = client.messages.batches.retrieve(batch["id"])
+        if status.processing_status != "ended":
+            counts = status.request_counts
+            print(f"Batch {batch['id']}: {counts.processing} processing, "
+                  f"{counts.succeeded} succeeded, {counts.errored} errored")
+            time.sleep(BATCH_POLL_INTERVAL)
+            continue
+        
+        for entry in client.messages.batches.results(batch["id"]):
+            filename = batch["images"].get(entry.custom_id)
+            if filename is None:
+                continue
+            result = entry.result
+            if result.type == "succeeded":
+                yield folder / filename, result.message.content[0].text
+            else:
+                error = getattr(result, "error", None)
+                yield folder / filename, RuntimeError(f"batch request {result.type}: {error or ''}".strip(": "))
+        
+        state.batches.pop(0)
+        state.save()
+
+
+def pool_results(client: anthropic.Anthropic, images: List[Path], workers: int):
+    """Caption images on a thread pool, yielding (image_path, caption or exception) as they finish."""
+    limiter = AdaptiveLimiter()
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = {pool.submit(generate_caption, client, str(image_path), limiter, stop): image_path
+               for image_path in images}
+    try:
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+    finally:
+        # Ctrl-C / early close: drop queued images and stop in-flight ones from
+        # retrying, or the (non-daemon) workers keep the process alive
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------------------------------------------------------------
+# Progress journal
+# -----------------------------------------------------------------------------
+
+class CaptionJournal:
+    """
+    JSON lines, one per image whose new caption was saved:
+        {"file": ..., "size": ..., "mtime_ns": ..., "saved_at": ...}
+    An entry only counts for --resume while the image is unchanged.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, Dict] = {}
+    
+    def load(self) -> "CaptionJournal":
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from an interrupted write
+                    self.done[entry["file"]] = entry
+        except OSError:
+            pass
+        return self
+    
+    def reset(self) -> None:
+        open(self.path, "w").close()
+        self.done = {}
+    
+    def is_done(self, image_path: Path) -> bool:
+        entry = self.done.get(image_path.name)
+        if not entry:
+            return False
+        st = image_path.stat()
+        return entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+    
+    def record(self, image_path: Path) -> None:
+        st = image_path.stat()
+        entry = {"file": image_path.name, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                 "saved_at": datetime.now().isoformat(timespec="seconds")}
+        self.done[image_path.name] = entry
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
 
 
 def main():
@@ -97,12 +475,39 @@ def main():
     parser.add_argument("--start-from", type=str, default="", help="Start from this filename")
     parser.add_argument("--folder", type=str, default=INSTAGRAM_PHOTOS, help="Photos folder path")
     parser.add_argument("--log", type=str, default="", help="Log changes to file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent API requests (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip images already saved by an earlier run (see the progress journal)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit all images as one Message Batches job and wait for the results")
+    parser.add_argument("--base-url", type=str, default=None,
+                        help="API base URL (e.g. a local stub server for testing)")
+    parser.add_argument("--discard-batches", action="store_true",
+                        help=f"With --batch: forget batches listed in {BATCH_STATE_NAME} and submit new ones")
     args = parser.parse_args()
     
-    client = anthropic.Anthropic(api_key=args.api_key)
+    # Caption request retries are handled here (with the shared limiter), not by the SDK;
+    # batch submit/poll calls keep a couple of SDK retries
+    client = anthropic.Anthropic(api_key=args.api_key, base_url=args.base_url,
+                                 max_retries=2 if args.batch else 0)
     
-    # Get all jpg files
     folder = Path(args.folder)
+    
+    # Batches are billed when submitted; nothing here can preview without paying
+    if args.batch and args.dry_run:
+        print("--dry-run can't be combined with --batch (submitted batches are billed)")
+        sys.exit(1)
+    
+    # Batches from an interrupted run are already paid for - don't silently replace them
+    if args.batch and not args.resume and not args.discard_batches:
+        pending = BatchState(str(folder / BATCH_STATE_NAME)).batches
+        if pending:
+            print(f"{len(pending)} batch(es) from an earlier run are still listed in {folder / BATCH_STATE_NAME}")
+            print("Run with --resume to collect them, or --discard-batches to submit new ones anyway")
+            sys.exit(1)
+    
+    # Get all jpg files
     images = sorted([f for f in folder.glob("*.jpg")])
     
     print(f"Found {len(images)} images in {folder}")
@@ -113,30 +518,58 @@ def main():
         images = images[start_idx:]
         print(f"Starting from {args.start_from}, {len(images)} remaining")
     
+    # Skip images finished by an interrupted run
+    journal = CaptionJournal(str(folder / JOURNAL_NAME))
+    if args.resume:
+        journal.load()
+        before = len(images)
+        images = [f for f in images if not journal.is_done(f)]
+        print(f"Resuming: {before - len(images)} already done, {len(images)} remaining")
+    elif not args.dry_run:
+        journal.reset()
+    
     # Apply limit
     if args.limit > 0:
         images = images[:args.limit]
         print(f"Limited to {len(images)} images")
     
-    # Open log file if specified
-    log_file = open(args.log, "w") if args.log else None
+    # Open log file if specified (appended to when resuming)
+    log_file = open(args.log, "a" if args.resume else "w") if args.log else None
     
     processed = 0
     errors = 0
     
-    for i, image_path in enumerate(images):
-        txt_path = image_path.with_suffix(".txt")
-        
-        # Read old caption
-        old_caption = ""
-        if txt_path.exists():
-            with open(txt_path, "r") as f:
-                old_caption = f.read()
-        
-        print(f"[{i+1}/{len(images)}] {image_path.name}...", end=" ", flush=True)
-        
-        try:
-            new_caption = generate_caption(client, str(image_path))
+    # Captions arrive as they finish; files, journal and log are only written here
+    if args.batch:
+        state = BatchState(str(folder / BATCH_STATE_NAME))
+        if state.batches and args.resume:
+            print(f"Collecting {len(state.batches)} batch(es) submitted by the interrupted run")
+        else:
+            state.batches = []
+            state.save()
+            submit_batches(client, images, state)
+        total = sum(len(batch["images"]) for batch in state.batches)
+        results = batch_results(client, state, folder)
+    else:
+        total = len(images)
+        results = pool_results(client, images, args.workers)
+    
+    try:
+        for done, (image_path, new_caption) in enumerate(results, 1):
+            txt_path = image_path.with_suffix(".txt")
+            
+            # Read old caption
+            old_caption = ""
+            if txt_path.exists():
+                with open(txt_path, "r") as f:
+                    old_caption = f.read()
+            
+            print(f"[{done}/{total}] {image_path.name}...", end=" ", flush=True)
+            
+            if isinstance(new_caption, Exception):
+                print(f"? Error: {new_caption}")
+                errors += 1
+                continue
             
             if args.dry_run or args.compare:
                 print(f"\n{'='*60}")
@@ -152,10 +585,12 @@ def main():
                 if not args.dry_run:
                     with open(txt_path, "w") as f:
                         f.write(new_caption)
+                    journal.record(image_path)
                     print(f"  ? Saved!")
             else:
                 with open(txt_path, "w") as f:
                     f.write(new_caption)
+                journal.record(image_path)
                 print("?")
             
             # Log to file
@@ -167,14 +602,10 @@ def main():
                 log_file.flush()
             
             processed += 1
-            
-            # Rate limiting - be gentle on the API
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"? Error: {e}")
-            errors += 1
-            time.sleep(2)  # Back off on errors
+    except KeyboardInterrupt:
+        print("\n\nInterrupted - run again with --resume to continue")
+    finally:
+        results.close()
     
     if log_file:
         log_file.close()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Process registry for BB-Poster-Automation services.
+
+Each service writes ~/BB-Poster-Automation/run/<name>.json at startup and
+refreshes it on every loop (heartbeat). Status checks are then a few file
+reads instead of `pgrep -f` subprocesses, and they can't be fooled by an
+unrelated process whose command line happens to contain the script name.
+
+Record fields:
+    pid, started_at, proc_start   identity of the registered process
+    heartbeat_at, loops           refreshed by heartbeat()
+    last_loop_seconds             duration of the most recent loop
+
+Usage (in a daemon):
+    registry.register("poster")
+    while True:
+        start = time.time()
+        do_work()
+        registry.heartbeat("poster", time.time() - start)
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from config import RUN_DIR
+
+# Registered service name -> display name (cloudflared is external, see run.py)
+SERVICES = [
+    ("media_server", "Media Server"),
+    ("scanner", "Scanner"),
+    ("poster", "Poster"),
+    ("responder", "Comment Responder"),
+    ("dashboard", "Dashboard"),
+    ("supervisor", "Supervisor"),  # run.py --foreground
+]
+
+# Records this process owns, so heartbeats never need to re-read the file
+_records: Dict[str, Dict[str, Any]] = {}
+
+
+def record_path(name: str) -> str:
+    return os.path.join(RUN_DIR, f"{name}.json")
+
+
+def _proc_start_time(pid: int) -> Optional[str]:
+    """Kernel start time of a process (Linux), used to detect PID reuse."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+        # Field 22; split after the parenthesised command name, which may contain spaces
+        return stat.rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+
+
+def _write(name: str, record: Dict[str, Any]) -> None:
+    os.makedirs(RUN_DIR, exist_ok=True)
+    path = record_path(name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp, path)
+
+
+# -----------------------------------------------------------------------------
+# Writers (called by the service itself)
+# -----------------------------------------------------------------------------
+
+def register(name: str) -> None:
+    """Record the current process as the running instance of `name`."""
+    pid = os.getpid()
+    now = time.time()
+    record = {
+        "pid": pid,
+        "proc_start": _proc_start_time(pid),
+        "started_at": now,
+        "heartbeat_at": now,
+        "loops": 0,
+        "last_loop_seconds": None,
+    }
+    _records[name] = record
+    _write(name, record)
+
+
+def heartbeat(name: str, loop_seconds: Optional[float] = None) -> None:
+    """Refresh the heartbeat of a registered service (never raises)."""
+    record = _records.get(name)
+    if record is None:
+        return
+    record["heartbeat_at"] = time.time()
+    record["loops"] += 1
+    if loop_seconds is not None:
+        record["last_loop_seconds"] = round(loop_seconds, 3)
+    try:
+        _write(name, record)
+    except OSError:
+        pass
+
+
+def unregister(name: str) -> None:
+    """Remove the record if it still belongs to this process."""
+    _records.pop(name, None)
+    record = read(name)
+    if record and record.get("pid") == os.getpid():
+        try:
+            os.remove(record_path(name))
+        except OSError:
+            pass
+
+
+# -----------------------------------------------------------------------------
+# Readers
+# -----------------------------------------------------------------------------
+
+def read(name: str) -> Optional[Dict[str, Any]]:
+    """Raw record for a service, or None if it never registered."""
+    try:
+        with open(record_path(name), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def status(name: str) -> Dict[str, Any]:
+    """
+    Status of a service:
+        {"name", "running", "pid", "started_at", "heartbeat_at",
+         "heartbeat_age", "loops", "last_loop_seconds"}
+    """
+    record = read(name) or {}
+    pid = record.get("pid")
+
+    running = bool(pid) and _pid_alive(pid)
+    if running and record.get("proc_start"):
+        # Same PID but a different process: the service died and the PID was reused
+        running = _proc_start_time(pid) == record["proc_start"]
+
+    heartbeat_at = record.get("heartbeat_at")
+    return {
+        "name": name,
+        "running": running,
+        "pid": pid if running else None,
+        "started_at": record.get("started_at"),
+        "heartbeat_at": heartbeat_at,
+        "heartbeat_age": time.time() - heartbeat_at if heartbeat_at else None,
+        "loops": record.get("loops", 0),
+        "last_loop_seconds": record.get("last_loop_seconds"),
+    }
+
+
+def is_running(name: str) -> bool:
+    return status(name)["running"]
+
+
+def status_all() -> List[Dict[str, Any]]:
+    """Status of every known service, with its display name as "label"."""
+    result = []
+    for name, label in SERVICES:
+        info = status(name)
+        info["label"] = label
+        result.append(info)
+    return result
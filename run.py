@@ -4,41 +4,70 @@ BB-Poster-Automation Runner
 Single command to start everything.
 
 Usage:
-    python3 run.py           # Start all services
-    python3 run.py --status  # Check what's running
-    python3 run.py --stop    # Stop all services
+    python3 run.py               # Start the supervisor (and all services) in the background
+    python3 run.py --foreground  # Run the supervisor in this terminal
+    python3 run.py --status      # Check what's running
+    python3 run.py --stop        # Stop all services
+
+The supervisor starts every service in parallel, waits for readiness probes,
+restarts crashed services with exponential backoff and writes their
+stdout/stderr to logs/<service>.out.log.
 """
 
 import os
 import sys
 import time
+import signal
+import logging
+import threading
 import subprocess
 import argparse
+import urllib.error
+import urllib.request
+from logging.handlers import RotatingFileHandler
+from typing import Optional
 
 PROJECT_ROOT = os.path.expanduser("~/BB-Poster-Automation")
+sys.path.insert(0, PROJECT_ROOT)
+
+import registry
+from config import LOG_DIR, setup_logger
 
 # -----------------------------------------------------------------------------
 # Process Checking
 # -----------------------------------------------------------------------------
 
-def is_process_running(search_term: str) -> bool:
-    """Check if a process containing search_term is running."""
+# Our own services register themselves in run/<name>.json (see registry.py).
+# cloudflared is an external binary, so it's still found with pgrep/pkill.
+CLOUDFLARED_SEARCH = "cloudflared tunnel run projectmodel"
+
+# Readiness probes:
+#   "http://..."  any HTTP response (even 404) means the server is accepting requests
+#   "heartbeat"   the service has registered itself in run/<name>.json
+#   "alive"       the process is still up after ALIVE_GRACE seconds
+# name, display name, command, readiness probe, extra status text
+SERVICES = [
+    ("media_server", "Media Server", [sys.executable, os.path.join(PROJECT_ROOT, "media_server.py")], "http://127.0.0.1:8787/", ""),
+    ("cloudflared", "Cloudflare Tunnel", ["cloudflared", "tunnel", "run", "projectmodel"], "alive", ""),
+    ("scanner", "Scanner", [sys.executable, os.path.join(PROJECT_ROOT, "scanner.py"), "--daemon"], "heartbeat", ""),
+    ("poster", "Poster", [sys.executable, os.path.join(PROJECT_ROOT, "poster.py"), "--daemon"], "heartbeat", ""),
+    ("responder", "Comment Responder", [sys.executable, os.path.join(PROJECT_ROOT, "comment_responder.py")], "heartbeat", ""),
+    ("dashboard", "Dashboard", [sys.executable, os.path.join(PROJECT_ROOT, "dashboard.py")], "http://127.0.0.1:5000/login", " - http://localhost:5000"),
+]
+
+READY_TIMEOUT = 30     # Seconds to wait for a service to pass its readiness probe
+ALIVE_GRACE = 2        # Seconds an "alive"-probed process must survive
+BACKOFF_BASE = 1       # First restart delay (seconds), doubled per consecutive crash
+BACKOFF_MAX = 300      # Longest restart delay
+STABLE_AFTER = 60      # A service that ran this long resets its backoff
+STOP_TIMEOUT = 10      # Seconds to wait after SIGTERM before SIGKILL
+
+
+def get_cloudflared_pids() -> list:
+    """Get PIDs of the cloudflare tunnel."""
     try:
         result = subprocess.run(
-            ["pgrep", "-f", search_term],
-            capture_output=True,
-            text=True
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
-
-
-def get_process_pid(search_term: str) -> list:
-    """Get PIDs of processes matching search_term."""
-    try:
-        result = subprocess.run(
-            ["pgrep", "-f", search_term],
+            ["pgrep", "-f", CLOUDFLARED_SEARCH],
             capture_output=True,
             text=True
         )
@@ -49,161 +78,232 @@ def get_process_pid(search_term: str) -> list:
         return []
 
 
-def kill_process(search_term: str) -> bool:
-    """Kill processes matching search_term."""
+def get_service_pid(name: str) -> Optional[int]:
+    """PID of a running service, or None."""
+    if name == "cloudflared":
+        pids = get_cloudflared_pids()
+        return pids[0] if pids else None
+    return registry.status(name)["pid"]
+
+
+def is_service_running(name: str) -> bool:
+    return get_service_pid(name) is not None
+
+
+def kill_service(name: str) -> bool:
+    """Stop a service with SIGTERM."""
     try:
-        subprocess.run(["pkill", "-f", search_term], capture_output=True)
+        if name == "cloudflared":
+            subprocess.run(["pkill", "-f", CLOUDFLARED_SEARCH], capture_output=True)
+        else:
+            pid = get_service_pid(name)
+            if pid:
+                os.kill(pid, signal.SIGTERM)
         return True
     except Exception:
         return False
 
 
-# -----------------------------------------------------------------------------
-# Service Management
-# -----------------------------------------------------------------------------
-
-def start_media_server() -> bool:
-    """Start media server if not running."""
-    if is_process_running("media_server.py"):
-        print("? Media server already running")
-        return True
-    
-    print("? Starting media server...")
-    subprocess.Popen(
-        [sys.executable, os.path.join(PROJECT_ROOT, "media_server.py")],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True
-    )
-    time.sleep(1)
-    
-    if is_process_running("media_server.py"):
-        print("? Media server started")
+def http_ready(url: str) -> bool:
+    try:
+        urllib.request.urlopen(url, timeout=1).close()
         return True
-    else:
-        print("? Failed to start media server")
+    except urllib.error.HTTPError:
+        return True  # Server answered, just not with 200
+    except Exception:
         return False
 
 
-def start_cloudflared() -> bool:
-    """Start cloudflared tunnel if not running."""
-    if is_process_running("cloudflared tunnel run projectmodel"):
-        print("? Cloudflare tunnel already running")
-        return True
-    
-    print("? Starting cloudflare tunnel...")
-    subprocess.Popen(
-        ["cloudflared", "tunnel", "run", "projectmodel"],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True
-    )
-    time.sleep(2)
-    
-    if is_process_running("cloudflared"):
-        print("? Cloudflare tunnel started")
-        return True
-    else:
-        print("? Failed to start cloudflare tunnel")
-        return False
+def is_ready(name: str, probe: str, pid: Optional[int] = None, started_at: float = 0.0) -> bool:
+    """Run a service's readiness probe. `pid` restricts heartbeat probes to that process."""
+    if probe.startswith("http"):
+        return http_ready(probe)
+    if probe == "heartbeat":
+        info = registry.status(name)
+        return info["running"] and (pid is None or info["pid"] == pid)
+    # "alive"
+    return is_service_running(name) and time.time() - started_at >= ALIVE_GRACE
 
 
-def start_scanner() -> bool:
-    """Start scanner daemon if not running."""
-    if is_process_running("scanner.py --daemon"):
-        print("? Scanner already running")
-        return True
+# -----------------------------------------------------------------------------
+# Supervisor
+# -----------------------------------------------------------------------------
+
+class Child:
+    """A supervised service process."""
     
-    print("? Starting scanner...")
-    subprocess.Popen(
-        [sys.executable, os.path.join(PROJECT_ROOT, "scanner.py"), "--daemon"],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True
-    )
-    time.sleep(1)
+    def __init__(self, name: str, label: str, cmd: list, probe: str):
+        self.name = name
+        self.label = label
+        self.cmd = cmd
+        self.probe = probe
+        self.proc: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.ready = False
+        self.external = False      # Already running when the supervisor started
+        self.crashes = 0           # Consecutive crashes, drives the backoff
+        self.restart_at: Optional[float] = None
+        self.output = self._output_logger()
     
-    if is_process_running("scanner.py"):
-        print("? Scanner started")
-        return True
-    else:
-        print("? Failed to start scanner")
-        return False
-
-
-def start_poster() -> bool:
-    """Start poster daemon if not running."""
-    if is_process_running("poster.py --daemon"):
-        print("? Poster already running")
-        return True
+    def _output_logger(self) -> logging.Logger:
+        """Rotating logs/<name>.out.log for the child's raw stdout/stderr."""
+        logger = logging.getLogger(f"output.{self.name}")
+        if not logger.handlers:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            handler = RotatingFileHandler(
+                os.path.join(LOG_DIR, f"{self.name}.out.log"),
+                maxBytes=5 * 1024 * 1024,
+                backupCount=5,
+                encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        return logger
     
-    print("? Starting poster...")
-    subprocess.Popen(
-        [sys.executable, os.path.join(PROJECT_ROOT, "poster.py"), "--daemon"],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True
-    )
-    time.sleep(1)
+    def _pump_output(self, proc: subprocess.Popen) -> None:
+        for line in proc.stdout:
+            self.output.info(line.decode("utf-8", errors="replace").rstrip())
     
-    if is_process_running("poster.py"):
-        print("? Poster started")
-        return True
-    else:
-        print("? Failed to start poster")
-        return False
+    def start(self) -> None:
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            cwd=PROJECT_ROOT,
+            env=env,
+            start_new_session=True
+        )
+        self.started_at = time.time()
+        self.ready = False
+        self.restart_at = None
+        threading.Thread(
+            target=self._pump_output, args=(self.proc,),
+            name=f"output-{self.name}", daemon=True
+        ).start()
 
 
-def start_responder() -> bool:
-    """Start comment responder daemon if not running."""
-    if is_process_running("comment_responder.py"):
-        print("? Comment Responder already running")
-        return True
+class Supervisor:
+    """Starts all services, restarts crashed ones with backoff, stops them on SIGTERM."""
     
-    print("? Starting comment responder...")
-    subprocess.Popen(
-        [sys.executable, os.path.join(PROJECT_ROOT, "comment_responder.py")],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True
-    )
-    time.sleep(1)
+    def __init__(self):
+        self.log = setup_logger("supervisor")
+        self.children = [Child(name, label, cmd, probe) for name, label, cmd, probe, _ in SERVICES]
+        self.stopping = False
     
-    if is_process_running("comment_responder.py"):
-        print("? Comment Responder started")
-        return True
-    else:
-        print("? Failed to start comment responder")
-        return False
-
-
-def start_dashboard() -> bool:
-    """Start dashboard web server if not running."""
-    if is_process_running("dashboard.py"):
-        print("? Dashboard already running")
-        return True
+    def _handle_signal(self, signum, frame) -> None:
+        self.stopping = True
     
-    print("? Starting dashboard...")
-    subprocess.Popen(
-        [sys.executable, os.path.join(PROJECT_ROOT, "dashboard.py")],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True
-    )
-    time.sleep(1)
+    def _spawn(self, child: Child) -> None:
+        try:
+            child.start()
+            self.log.info(f"Started {child.label} (PID {child.proc.pid})")
+        except OSError as e:
+            self.log.error(f"Could not start {child.label}: {e}")
+            self._schedule_restart(child)
     
-    if is_process_running("dashboard.py"):
-        print("? Dashboard started (http://localhost:5000)")
-        return True
-    else:
-        print("? Failed to start dashboard")
-        return False
+    def _schedule_restart(self, child: Child) -> None:
+        if child.started_at and time.time() - child.started_at >= STABLE_AFTER:
+            child.crashes = 0
+        child.crashes += 1
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (child.crashes - 1))
+        child.proc = None
+        child.ready = False
+        child.restart_at = time.time() + delay
+        self.log.info(f"Restarting {child.label} in {delay}s (crash #{child.crashes})")
+    
+    def _check(self, child: Child) -> None:
+        now = time.time()
+        
+        if child.external:
+            # Someone else started it - take over once it goes away
+            if not is_service_running(child.name):
+                self.log.warning(f"{child.label} (not supervised) stopped - starting it")
+                child.external = False
+                self._spawn(child)
+            return
+        
+        if child.proc is None:
+            if child.restart_at is not None and now >= child.restart_at:
+                self._spawn(child)
+            return
+        
+        code = child.proc.poll()
+        if code is not None:
+            self.log.error(f"{child.label} exited with code {code} after {now - child.started_at:.0f}s")
+            self._schedule_restart(child)
+            return
+        
+        if not child.ready:
+            if is_ready(child.name, child.probe, child.proc.pid, child.started_at):
+                child.ready = True
+                self.log.info(f"{child.label} ready in {now - child.started_at:.1f}s")
+            elif now - child.started_at > READY_TIMEOUT:
+                self.log.error(f"{child.label} not ready after {READY_TIMEOUT}s - restarting")
+                self._terminate([child])
+                self._schedule_restart(child)
+    
+    def _terminate(self, children: list) -> None:
+        running = [c for c in children if c.proc is not None and c.proc.poll() is None]
+        for child in running:
+            try:
+                os.killpg(child.proc.pid, signal.SIGTERM)
+            except OSError:
+                pass
+        
+        deadline = time.time() + STOP_TIMEOUT
+        for child in running:
+            try:
+                child.proc.wait(timeout=max(0.1, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                self.log.warning(f"{child.label} did not stop - killing")
+                try:
+                    os.killpg(child.proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+    
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        registry.register("supervisor")
+        self.log.info("Supervisor started")
+        
+        # Start everything at once; readiness is checked in the loop below
+        for child in self.children:
+            if is_service_running(child.name):
+                child.external = True
+                self.log.info(f"{child.label} already running - not supervised until it stops")
+            else:
+                self._spawn(child)
+        
+        while not self.stopping:
+            loop_start = time.time()
+            for child in self.children:
+                self._check(child)
+            registry.heartbeat("supervisor", time.time() - loop_start)
+            # Poll faster while anything is starting up or waiting to restart
+            time.sleep(0.5 if any(not c.ready and not c.external for c in self.children) else 2)
+        
+        self.log.info("Stopping services...")
+        self._terminate(list(reversed(self.children)))
+        registry.unregister("supervisor")
+        self.log.info("Supervisor stopped")
 
 
 # -----------------------------------------------------------------------------
 # Commands
 # -----------------------------------------------------------------------------
 
+def init_database() -> None:
+    subprocess.run(
+        [sys.executable, os.path.join(PROJECT_ROOT, "db.py"), "--init"],
+        capture_output=True
+    )
+
+
 def start_all():
     """Start all services."""
     print("=" * 50)
@@ -213,21 +313,35 @@ def start_all():
     
     # Initialize database first
     print("? Initializing database...")
-    subprocess.run(
-        [sys.executable, os.path.join(PROJECT_ROOT, "db.py"), "--init"],
-        capture_output=True
-    )
+    init_database()
     print("? Database ready")
     print()
     
-    # Start services
-    success = True
-    success = start_media_server() and success
-    success = start_cloudflared() and success
-    success = start_scanner() and success
-    success = start_poster() and success
-    success = start_responder() and success
-    success = start_dashboard() and success
+    if registry.is_running("supervisor"):
+        print("? Supervisor already running")
+    else:
+        print("? Starting supervisor...")
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--foreground"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+    
+    # The supervisor starts everything in parallel - report as services become ready
+    pending = {name: (label, probe) for name, label, _, probe, _ in SERVICES}
+    started_at = time.time()
+    deadline = started_at + READY_TIMEOUT
+    while pending and time.time() < deadline:
+        for name, (label, probe) in list(pending.items()):
+            if is_ready(name, probe, started_at=started_at):
+                print(f"? {label} ready ({time.time() - started_at:.1f}s)")
+                del pending[name]
+        time.sleep(0.25)
+    
+    for name, (label, _) in pending.items():
+        print(f"? {label} not ready after {READY_TIMEOUT}s (see logs/{name}.out.log)")
+    success = not pending
     
     print()
     if success:
@@ -252,26 +366,27 @@ def show_status():
     print("=" * 50)
     print()
     
-    services = [
-        ("Media Server", "media_server.py"),
-        ("Cloudflare Tunnel", "cloudflared"),
-        ("Scanner", "scanner.py"),
-        ("Poster", "poster.py"),
-        ("Comment Responder", "comment_responder.py"),
-        ("Dashboard", "dashboard.py"),
-    ]
+    supervisor = registry.status("supervisor")
+    if supervisor["running"]:
+        print(f"? Supervisor: Running (PID: {supervisor['pid']})")
+    else:
+        print("? Supervisor: Not running (crashed services will not be restarted)")
     
     all_running = True
-    for name, search in services:
-        pids = get_process_pid(search)
-        if pids:
-            if name == "Dashboard":
-                print(f"? {name}: Running (PID: {', '.join(map(str, pids))}) - http://localhost:5000")
-            else:
-                print(f"? {name}: Running (PID: {', '.join(map(str, pids))})")
-        else:
-            print(f"? {name}: Not running")
+    for name, label, _, _, extra in SERVICES:
+        pid = get_service_pid(name)
+        if not pid:
+            print(f"? {label}: Not running")
             all_running = False
+            continue
+        
+        info = registry.status(name) if name != "cloudflared" else {}
+        details = ""
+        if info.get("heartbeat_age") is not None:
+            details = f", heartbeat {int(info['heartbeat_age'])}s ago"
+            if info.get("last_loop_seconds") is not None:
+                details += f", last loop {info['last_loop_seconds']:.1f}s"
+        print(f"? {label}: Running (PID: {pid}{details}){extra}")
     
     print()
     
@@ -322,26 +437,28 @@ def stop_all():
     print("=" * 50)
     print()
     
-    services = [
-        ("Dashboard", "dashboard.py"),
-        ("Comment Responder", "comment_responder.py"),
-        ("Poster", "poster.py"),
-        ("Scanner", "scanner.py"),
-        ("Media Server", "media_server.py"),
-        ("Cloudflare Tunnel", "cloudflared tunnel run projectmodel"),
-    ]
+    # The supervisor stops its children itself
+    supervisor = registry.status("supervisor")
+    if supervisor["running"]:
+        print("? Stopping supervisor...")
+        os.kill(supervisor["pid"], signal.SIGTERM)
+        deadline = time.time() + STOP_TIMEOUT + 5
+        while registry.is_running("supervisor") and time.time() < deadline:
+            time.sleep(0.25)
+        print("? Supervisor stopped")
     
-    for name, search in services:
-        if is_process_running(search):
-            print(f"? Stopping {name}...")
-            kill_process(search)
+    # Anything it wasn't supervising
+    for name, label, _, _, _ in reversed(SERVICES):
+        if is_service_running(name):
+            print(f"? Stopping {label}...")
+            kill_service(name)
             time.sleep(0.5)
-            if not is_process_running(search):
-                print(f"? {name} stopped")
+            if not is_service_running(name):
+                print(f"? {label} stopped")
             else:
-                print(f"? {name} may still be running")
+                print(f"? {label} may still be running")
         else:
-            print(f"- {name} was not running")
+            print(f"- {label} was not running")
     
     print()
     print("All services stopped.")
@@ -357,13 +474,15 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
-  python3 run.py           Start all services
-  python3 run.py --status  Check what's running
-  python3 run.py --stop    Stop all services
+  python3 run.py               Start all services (supervised, in the background)
+  python3 run.py --foreground  Run the supervisor in this terminal
+  python3 run.py --status      Check what's running
+  python3 run.py --stop        Stop all services
         """
     )
     parser.add_argument("--status", action="store_true", help="Show status of all services")
     parser.add_argument("--stop", action="store_true", help="Stop all services")
+    parser.add_argument("--foreground", action="store_true", help="Run the supervisor in the foreground")
     args = parser.parse_args()
     
     os.chdir(PROJECT_ROOT)
@@ -372,6 +491,12 @@ Examples:
         show_status()
     elif args.stop:
         stop_all()
+    elif args.foreground:
+        if registry.is_running("supervisor"):
+            print("Supervisor already running (python3 run.py --stop first)")
+            sys.exit(1)
+        init_database()
+        Supervisor().run()
     else:
         start_all()
 
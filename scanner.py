@@ -15,12 +15,18 @@ import os
 import re
 import time
 import random
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Tuple, List
 from dataclasses import dataclass
 
 import db
+import conformance
+import registry
+from metrics import Metrics
+from profiling import LoopProfiler
+import scheduler
 from config import PROJECT_ROOT, POSTING_SCHEDULE, setup_logger
 
 # -----------------------------------------------------------------------------
@@ -53,6 +59,14 @@ IGNORE_PATTERNS = {
 # Logger (initialized in main)
 logger = None
 
+metrics = Metrics("scanner")
+
+# Armed with --profile N or SIGUSR1 (see profiling.py)
+profiler: Optional[LoopProfiler] = None
+
+# Background conformance run (daemon mode), at most one at a time
+_conform_thread: Optional[threading.Thread] = None
+
 
 # -----------------------------------------------------------------------------
 # Filename Parsing for Scheduled Posts
@@ -158,6 +172,19 @@ def calculate_scheduled_time(
     return int(scheduled_dt.timestamp())
 
 
+def caption_path_for(media_path: str) -> str:
+    """'.../12_26_2025_am.jpg' -> '.../12_26_2025_am.txt'"""
+    return os.path.splitext(media_path)[0] + ".txt"
+
+
+def caption_mtime_for(media_path: str) -> Optional[float]:
+    """mtime of a media file's caption sidecar, or None if there is none."""
+    try:
+        return os.stat(caption_path_for(media_path)).st_mtime
+    except OSError:
+        return None
+
+
 def find_caption_file(media_path: str) -> Optional[str]:
     """
     Look for a caption file associated with a media file.
@@ -168,11 +195,8 @@ def find_caption_file(media_path: str) -> Optional[str]:
     Returns:
         Caption text or None if no caption file found
     """
-    # Get base name without extension
-    base = os.path.splitext(media_path)[0]
-    
     # Check for .txt file with same base name
-    caption_path = base + ".txt"
+    caption_path = caption_path_for(media_path)
     if os.path.isfile(caption_path):
         try:
             with open(caption_path, "r", encoding="utf-8") as f:
@@ -379,15 +403,18 @@ def scan_all() -> Tuple[int, int]:
         
         # Parse scheduled filename (e.g., 12_26_2025_am.jpg)
         scheduled_for = None
+        schedule_date = schedule_slot = ""  # Empty = indexed, not a scheduled filename
         schedule_info = parse_scheduled_filename(parsed.filename)
         if schedule_info:
             date, time_slot = schedule_info
+            schedule_date, schedule_slot = date.strftime("%Y-%m-%d"), time_slot
             scheduled_for = calculate_scheduled_time(date, time_slot, parsed.content_type)
             if scheduled_for:
                 scheduled_dt = datetime.fromtimestamp(scheduled_for)
                 logger.debug(f"Scheduled {parsed.filename} for {scheduled_dt}")
         
-        # Look for caption file
+        # Look for caption file (its mtime lets sync_captions() spot later edits)
+        caption_mtime = caption_mtime_for(abs_path)
         caption = find_caption_file(abs_path)
         if caption:
             logger.debug(f"Found caption for {parsed.filename}: {caption[:50]}...")
@@ -401,7 +428,10 @@ def scan_all() -> Tuple[int, int]:
             platform=parsed.platform,
             content_type=parsed.content_type,
             caption=caption,
-            scheduled_for=scheduled_for
+            scheduled_for=scheduled_for,
+            schedule_date=schedule_date,
+            schedule_slot=schedule_slot,
+            caption_mtime=caption_mtime
         )
         
         if row_id:
@@ -412,28 +442,118 @@ def scan_all() -> Tuple[int, int]:
                 schedule_note = f" [scheduled: {scheduled_dt.strftime('%m/%d/%Y %I:%M %p')}]"
             logger.info(f"NEW: [{row_id}] {parsed.platform}/{parsed.content_type} - {parsed.file_path}{schedule_note}")
     
+    if added:
+        scheduler.notify("poster")  # Let the poster re-plan its next wakeup
+    
     return len(all_files), added
 
 
+def sync_captions(dry_run: bool = False) -> int:
+    """
+    Pick up edited .txt sidecars (e.g. from regenerate_captions.py) for pending rows.
+    
+    Only sidecars whose mtime differs from the one recorded with the caption
+    are read; all changes are written in one transaction. Rows queued before
+    caption_mtime existed are compared once and then tracked by mtime.
+    
+    Returns:
+        Number of rows whose caption changed
+    """
+    updates = []
+    changed = 0
+    for row in db.get_pending_caption_rows():
+        abs_path = os.path.join(PROJECT_ROOT, row["file_path"])
+        mtime = caption_mtime_for(abs_path)
+        if mtime == row["caption_mtime"]:
+            continue
+        
+        caption = find_caption_file(abs_path) if mtime is not None else None
+        if caption != row["caption"]:
+            changed += 1
+            action = "Would update caption" if dry_run else "Caption updated"
+            logger.info(f"{action}: [{row['id']}] {row['file_path']}")
+        updates.append((caption, mtime, row["id"]))
+    
+    if updates and not dry_run:
+        db.update_captions(updates)
+    if changed:
+        logger.info(f"{'Would sync' if dry_run else 'Synced'} {changed} caption(s) from .txt files")
+    return changed
+
+
+def backfill_schedule_index() -> int:
+    """
+    Fill schedule_date/schedule_slot for rows queued before those columns existed.
+    Rows without a scheduled filename get an empty date so they are only checked once.
+    """
+    keys = []
+    for row in db.get_unindexed_schedule_rows():
+        schedule_info = parse_scheduled_filename(os.path.basename(row["file_path"]))
+        if schedule_info:
+            date, time_slot = schedule_info
+            keys.append((date.strftime("%Y-%m-%d"), time_slot, row["id"]))
+        else:
+            keys.append(("", "", row["id"]))
+    
+    if keys:
+        db.update_schedule_keys(keys)
+        logger.info(f"Indexed schedule for {len(keys)} existing row(s)")
+    return len(keys)
+
+
 # -----------------------------------------------------------------------------
 # Daemon Mode
 # -----------------------------------------------------------------------------
 
+def start_conform_worker() -> bool:
+    """
+    Conform pending jobs on a background thread, so video transcodes (minutes
+    for a long reel) don't hold up new-file detection and caption sync.
+    Returns False if the previous run is still going.
+    """
+    global _conform_thread
+    if _conform_thread is not None and _conform_thread.is_alive():
+        return False
+    
+    def work():
+        try:
+            with metrics.timer("conform_duration_seconds"):
+                conformance.conform_pending(logger=logger)
+        except Exception as e:
+            logger.error(f"Conform error: {e}", exc_info=True)
+    
+    _conform_thread = threading.Thread(target=work, name="conform", daemon=True)
+    _conform_thread.start()
+    return True
+
+
 def run_daemon(interval_seconds: int = 60) -> None:
     """Run scanner in daemon mode, polling at specified interval."""
     logger.info(f"Starting scanner daemon (interval: {interval_seconds}s)")
     logger.info(f"Project root: {PROJECT_ROOT}")
+    registry.register("scanner")
+    profiler.install_signal_handler()
     
     while True:
+        loop_start = time.time()
         try:
-            found, added = scan_all()
+            with metrics.timer("scan_duration_seconds"), profiler.iteration():
+                found, added = scan_all()
+                synced = sync_captions()
+            start_conform_worker()
+            metrics.set("scan_files_found", found)
+            metrics.inc("scan_files_added_total", added)
+            metrics.inc("captions_synced_total", synced)
             if added > 0:
                 logger.info(f"Scan complete: {added} new file(s) queued")
             else:
                 logger.debug(f"Scan complete: no new files (total: {found})")
         except Exception as e:
             logger.error(f"Scan error: {e}", exc_info=True)
+            metrics.inc("scan_errors_total")
         
+        metrics.flush()
+        registry.heartbeat("scanner", time.time() - loop_start)
         time.sleep(interval_seconds)
 
 
@@ -442,7 +562,7 @@ def run_daemon(interval_seconds: int = 60) -> None:
 # -----------------------------------------------------------------------------
 
 def main():
-    global logger
+    global logger, profiler
     import argparse
     
     parser = argparse.ArgumentParser(description="Scan for new media files")
@@ -452,10 +572,15 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Show what would be added")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
     parser.add_argument("--list-countries", action="store_true", help="List discovered folders")
+    parser.add_argument("--sync-captions", action="store_true", help="Update pending captions from edited .txt files and exit")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="cProfile the first N scans into logs/")
     args = parser.parse_args()
     
     logger = setup_logger("scanner", verbose=args.verbose)
+    profiler = LoopProfiler("scanner", logger)
+    profiler.arm(args.profile)
     db.init_db()
+    backfill_schedule_index()
     
     if args.list_countries:
         countries = discover_country_folders()
@@ -464,6 +589,11 @@ def main():
             print(f"  - {c}")
         return
     
+    if args.sync_captions:
+        changed = sync_captions(dry_run=args.dry_run)
+        print(f"Caption sync complete: {changed} caption(s) {'would change' if args.dry_run else 'updated'}")
+        return
+    
     if args.dry_run:
         if SCAN_ROOTS:
             roots = [os.path.join(PROJECT_ROOT, r) for r in SCAN_ROOTS]
@@ -490,8 +620,12 @@ def main():
     if args.daemon:
         run_daemon(interval_seconds=args.interval)
     else:
-        found, added = scan_all()
-        print(f"Scan complete: {found} total files, {added} new file(s) queued")
+        with profiler.iteration():
+            found, added = scan_all()
+            synced = sync_captions()
+        conformed = conformance.conform_pending(logger=logger)
+        print(f"Scan complete: {found} total files, {added} new file(s) queued, {synced} caption(s) updated, "
+              f"{conformed} job(s) conformed")
 
 
 if __name__ == "__main__":
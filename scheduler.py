@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Deadline scheduler for BB-Poster-Automation daemons.
+
+Keeps upcoming due times (media_files.scheduled_for, comment_replies.scheduled_at)
+in a min-heap and sleeps exactly until the earliest one instead of polling.
+
+Other processes can wake a sleeping daemon early by calling notify(channel),
+which sends a datagram to ~/BB-Poster-Automation/run/<channel>.sock
+(e.g. the scanner wakes the poster after queueing new files).
+"""
+
+import heapq
+import os
+import select
+import socket
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+
+from config import RUN_DIR, MAX_IDLE_SLEEP
+
+
+def socket_path(channel: str) -> str:
+    """Path of the wakeup socket for a channel."""
+    return os.path.join(RUN_DIR, f"{channel}.sock")
+
+
+def notify(channel: str) -> bool:
+    """
+    Wake the daemon listening on `channel`.
+    Returns False if nobody is listening (the daemon will catch up on its own).
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(b"wake", socket_path(channel))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class DueScheduler:
+    """
+    Min-heap of due times with a wakeable sleep.
+
+    Usage:
+        scheduler = DueScheduler("poster")
+        while True:
+            process_due_work()
+            scheduler.reload(db.get_upcoming_due_times())
+            scheduler.wait(scheduler.next_due())
+    """
+
+    def __init__(self, channel: Optional[str] = None, max_sleep: float = MAX_IDLE_SLEEP):
+        self.channel = channel
+        self.max_sleep = max_sleep
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._counter = 0  # Tie-breaker so items never get compared
+        self._sock: Optional[socket.socket] = None
+
+        if channel:
+            os.makedirs(RUN_DIR, exist_ok=True)
+            path = socket_path(channel)
+            if os.path.exists(path):
+                os.unlink(path)  # Left over from a previous run
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.bind(path)
+            self._sock.setblocking(False)
+
+    # -------------------------------------------------------------------------
+    # Heap
+    # -------------------------------------------------------------------------
+
+    def push(self, due_at: float, item: Any = None) -> None:
+        """Add a due time (e.g. right after inserting a row in this process)."""
+        heapq.heappush(self._heap, (float(due_at), self._counter, item))
+        self._counter += 1
+
+    def reload(self, due_times: Iterable[float]) -> None:
+        """Replace the heap with fresh due times from the database."""
+        self._heap = []
+        for due in due_times:
+            self.push(due)
+
+    def next_due(self) -> Optional[float]:
+        """Earliest due time, or None if nothing is scheduled."""
+        return self._heap[0][0] if self._heap else None
+
+    # -------------------------------------------------------------------------
+    # Sleeping
+    # -------------------------------------------------------------------------
+
+    def wait(self, deadline: Optional[float] = None) -> bool:
+        """
+        Sleep until `deadline` (capped at max_sleep) or until notified.
+        Returns True if woken early by notify().
+        """
+        timeout = self.max_sleep
+        if deadline is not None:
+            timeout = min(timeout, max(0.0, deadline - time.time()))
+
+        if self._sock is None:
+            time.sleep(timeout)
+            return False
+
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if not readable:
+            return False
+
+        # Drain every pending wakeup so a burst of inserts wakes us once
+        while True:
+            try:
+                self._sock.recv(64)
+            except (BlockingIOError, InterruptedError):
+                break
+        return True
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(socket_path(self.channel))
+            except OSError:
+                pass
@@ -24,15 +24,34 @@ Usage:
   python3 story_processor.py                    # Process all videos
   python3 story_processor.py --start-date 01_15_2026
   python3 story_processor.py --dry-run          # Preview without processing
+  python3 story_processor.py --jobs 4           # Render 4 videos at a time
+  python3 story_processor.py --force            # Re-render even up-to-date outputs
+  python3 story_processor.py --resume           # Continue an interrupted run
+
+Outputs whose inputs and settings haven't changed since the last render
+are skipped (see .render_manifest.json in the output folder). Scaled
+signature frames and outro clips are cached in .cache/story_outros/.
 """
 
 import os
 import sys
+import json
+import shutil
+import hashlib
+import tempfile
 import subprocess
 import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows - OutroCache renders without cross-process locks
+    fcntl = None
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -62,6 +81,34 @@ OUTPUT_FPS = 24
 VIDEO_CRF = 20
 AUDIO_BITRATE = "192k"
 
+# ffmpeg -threads per render (0 = ffmpeg decides). Set per worker with --jobs.
+FFMPEG_THREADS = 0
+
+# Render manifest - bump RENDER_VERSION when the ffmpeg pipeline changes output
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, ".render_manifest.json")
+PROBE_CACHE_FILE = os.path.join(OUTPUT_DIR, ".probe_cache.json")
+JOURNAL_FILE = os.path.join(OUTPUT_DIR, ".render_journal.jsonl")  # Checkpoints for --resume
+
+# Prepared signature frames and outro clips (see OutroCache)
+OUTRO_CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache", "story_outros")
+RENDER_VERSION = 2
+
+
+def render_settings():
+    """Every setting that affects rendered output (part of each render key)"""
+    return {
+        'version': RENDER_VERSION,
+        'signature_text': SIGNATURE_TEXT,
+        'signature_font_size': SIGNATURE_FONT_SIZE,
+        'signature_font': SIGNATURE_FONT,
+        'text_duration': TEXT_DURATION,
+        'fade_duration': FADE_DURATION,
+        'min_outro_time': MIN_OUTRO_TIME,
+        'fps': OUTPUT_FPS,
+        'crf': VIDEO_CRF,
+        'audio_bitrate': AUDIO_BITRATE,
+    }
+
 
 # =============================================================================
 # HELPERS
@@ -72,21 +119,94 @@ def run_cmd(cmd):
     return subprocess.run(cmd, capture_output=True, text=True)
 
 
-def get_duration(filepath):
-    """Get media duration in seconds"""
-    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-           '-of', 'default=noprint_wrappers=1:nokey=1', filepath]
-    result = run_cmd(cmd)
-    return float(result.stdout.strip())
+def parse_rate(rate):
+    """'30000/1001' -> 29.97"""
+    try:
+        num, _, den = str(rate).partition('/')
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
 
 
-def get_dimensions(video_path):
-    """Get video width, height"""
-    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
-           '-show_entries', 'stream=width,height', '-of', 'csv=p=0', video_path]
+def probe_media(filepath):
+    """
+    Get media info in a single ffprobe call:
+        duration, width, height (as displayed, i.e. after rotation),
+        video_codec, pix_fmt, fps, rotation, audio_codec
+    """
+    cmd = ['ffprobe', '-v', 'error', '-print_format', 'json',
+           '-show_format', '-show_streams', filepath]
     result = run_cmd(cmd)
-    w, h = result.stdout.strip().split(',')
-    return int(w), int(h)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {filepath}: {result.stderr.strip()[-200:]}")
+    data = json.loads(result.stdout)
+    
+    streams = data.get('streams', [])
+    video = next((st for st in streams if st.get('codec_type') == 'video'), {})
+    audio = next((st for st in streams if st.get('codec_type') == 'audio'), {})
+    
+    rotation = int(float(video.get('tags', {}).get('rotate', 0) or 0))
+    for side_data in video.get('side_data_list', []):
+        if 'rotation' in side_data:
+            rotation = int(side_data['rotation'])
+    
+    width, height = video.get('width', 0), video.get('height', 0)
+    if rotation % 180:
+        width, height = height, width  # ffmpeg auto-rotates when filtering
+    
+    return {
+        'duration': float(data.get('format', {}).get('duration') or video.get('duration') or 0),
+        'width': width,
+        'height': height,
+        'video_codec': video.get('codec_name'),
+        'pix_fmt': video.get('pix_fmt'),
+        'fps': parse_rate(video.get('avg_frame_rate') or video.get('r_frame_rate')),
+        'rotation': rotation,
+        'audio_codec': audio.get('codec_name'),
+    }
+
+
+class ProbeCache:
+    """probe_media() results persisted by (path, size, mtime)"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.probes = 0  # ffprobe runs this session
+        try:
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+    
+    def get(self, filepath):
+        st = os.stat(filepath)
+        cached = self.entries.get(filepath)
+        if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+            return cached['info']
+        
+        info = probe_media(filepath)
+        self.probes += 1
+        self.entries[filepath] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'info': info}
+        return info
+    
+    def save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+def cpu_cores():
+    """Cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def thread_args():
+    """ffmpeg output option limiting encoder threads (empty = ffmpeg default)"""
+    return ['-threads', str(FFMPEG_THREADS)] if FFMPEG_THREADS else []
 
 
 def prepare_signature(src_image, width, height, output_path):
@@ -95,7 +215,7 @@ def prepare_signature(src_image, width, height, output_path):
            f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
            f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black',
            output_path]
-    run_cmd(cmd)
+    return run_cmd(cmd)
 
 
 def get_sorted_files(directory, extensions):
@@ -122,94 +242,515 @@ def generate_output_name(index, start_date):
 
 
 # =============================================================================
-# MAIN PROCESSOR
+# RENDER MANIFEST
 # =============================================================================
 
-def process_video(video_path, audio_path, signature_path, output_path, verbose=True):
+class RenderManifest:
     """
-    Process single video: replace audio, add signature outro if needed
+    Remembers the render key (hash of input contents + settings) of every output.
+    
+    File content hashes are cached by (size, mtime) so unchanged inputs
+    are only hashed once.
     """
-    if verbose:
-        print(f"\n  Video: {os.path.basename(video_path)}")
-        print(f"  Audio: {os.path.basename(audio_path)}")
-        print(f"  Signature: {os.path.basename(signature_path)}")
     
-    # Get info
-    video_dur = get_duration(video_path)
-    audio_dur = get_duration(audio_path)
-    width, height = get_dimensions(video_path)
-    extra_time = audio_dur - video_dur
+    def __init__(self, path):
+        self.path = path
+        self.files = {}    # input path: {size, mtime_ns, sha256}
+        self.outputs = {}  # output name: render key
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.files = data.get('files', {})
+            self.outputs = data.get('outputs', {})
+        except (OSError, ValueError):
+            pass
     
-    if verbose:
-        print(f"  Duration - Video: {video_dur:.2f}s | Audio: {audio_dur:.2f}s | Extra: {extra_time:.2f}s")
+    def file_hash(self, path):
+        st = os.stat(path)
+        cached = self.files.get(path)
+        if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+            return cached['sha256']
+        
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        self.files[path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': h.hexdigest()}
+        return h.hexdigest()
     
-    # Decide processing method
-    use_signature = extra_time >= MIN_OUTRO_TIME
+    def render_key(self, video, audio, sig):
+        inputs = {
+            'video': self.file_hash(video),
+            'audio': self.file_hash(audio),
+            'signature': self.file_hash(sig),
+            'settings': render_settings(),
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
     
-    if use_signature:
-        if verbose:
-            print(f"  ? Adding signature outro")
-        
-        # Prepare signature image
-        temp_sig = '/tmp/sig_temp.png'
-        prepare_signature(signature_path, width, height, temp_sig)
+    def is_current(self, output_path, key):
+        return os.path.exists(output_path) and self.outputs.get(os.path.basename(output_path)) == key
+    
+    def record(self, output_path, key):
+        self.outputs[os.path.basename(output_path)] = key
+        self.save()
+    
+    def save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'files': self.files, 'outputs': self.outputs}, f)
+        os.replace(tmp, self.path)
+
+
+# =============================================================================
+# RENDER JOURNAL
+# =============================================================================
+
+class RenderJournal:
+    """
+    Append-only checkpoint log of the current run (JSON lines):
+    
+      {"run": {...}}                       run header: start date, options, planned outputs
+      {"output": ..., "key": ..., ...}     one line per completed output
+      {"complete": true}                   the run finished without failures
+    
+    Every line is flushed and fsynced, so after a crash or Ctrl-C the journal
+    lists exactly the outputs that were finished; --resume continues from there.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.run = None
+        self.completed = {}  # output name: render key
+        self.complete = False
+    
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from an interrupted write
+                    if 'run' in entry:
+                        self.run = entry['run']
+                    elif 'output' in entry:
+                        self.completed[entry['output']] = entry['key']
+                    elif entry.get('complete'):
+                        self.complete = True
+        except OSError:
+            pass
+        return self
+    
+    def _append(self, entry):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def start(self, run):
+        """Begin a new run (discards the previous journal)"""
+        open(self.path, 'w').close()
+        self.run, self.completed, self.complete = run, {}, False
+        self._append({'run': run})
+    
+    def resume(self):
+        """Continue the loaded run"""
+        self._append({'resumed_at': datetime.now().isoformat(timespec='seconds')})
+    
+    def is_done(self, output_path, key):
+        return self.completed.get(os.path.basename(output_path)) == key and os.path.exists(output_path)
+    
+    def record(self, output_path, key, video, audio, sig):
+        name = os.path.basename(output_path)
+        self.completed[name] = key
+        self._append({
+            'output': name, 'key': key,
+            'video': video, 'audio': audio, 'signature': sig,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+        })
+    
+    def finish(self):
+        self.complete = True
+        self._append({'complete': True})
+
+
+# =============================================================================
+# OUTRO CACHE
+# =============================================================================
+
+class OutroCache:
+    """
+    Prepared signature frames and pre-rendered outro clips, kept on disk per
+    (signature content, width, height, fps) so each is only rendered once -
+    across jobs, workers and runs.
+    
+    Entries are rendered to a unique temp file and renamed into place, and a
+    per-entry lock stops parallel workers rendering the same entry twice.
+    """
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._hashes = {}  # signature path: (size, mtime_ns, sha256)
+    
+    def _signature_hash(self, signature_path):
+        st = os.stat(signature_path)
+        cached = self._hashes.get(signature_path)
+        if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+            return cached[2]
         
-        # Calculate durations
-        main_end = video_dur - FADE_DURATION
-        sig_duration = extra_time - TEXT_DURATION + FADE_DURATION + 0.1
+        with open(signature_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._hashes[signature_path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+    
+    def _entry_path(self, kind, signature_path, width, height, ext):
+        key = hashlib.sha256(json.dumps({
+            'signature': self._signature_hash(signature_path),
+            'size': [width, height],
+            'settings': render_settings(),
+        }, sort_keys=True).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{kind}_{width}x{height}_{OUTPUT_FPS}fps_{key}{ext}")
+    
+    @contextmanager
+    def _locked(self, path):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _get(self, path, render):
+        """Return path, rendering it with render(temp_path) if it isn't cached yet"""
+        if os.path.exists(path):
+            return path
         
-        # Complex filter for signature outro
-        filter_complex = f"""
-            color=black:{width}x{height}:d={TEXT_DURATION + 0.5},fps={OUTPUT_FPS}[black];
-            
-            [0:v]fps={OUTPUT_FPS},trim=0:{main_end + FADE_DURATION},setpts=PTS-STARTPTS,
-            fade=t=out:st={main_end}:d={FADE_DURATION}[main];
-            
-            [black]drawtext=text='{SIGNATURE_TEXT}':fontsize={SIGNATURE_FONT_SIZE}:
-            fontcolor=white:fontfile={SIGNATURE_FONT}:
-            x=(w-text_w)/2:y=(h-text_h)/2:
-            alpha='if(lt(t,0.4),t/0.4,if(lt(t,{TEXT_DURATION - 0.4}),1,({TEXT_DURATION}-t)/0.4))',
-            trim=0:{TEXT_DURATION},setpts=PTS-STARTPTS[text];
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._locked(path):
+            if os.path.exists(path):  # Rendered by another worker while we waited
+                return path
             
-            [1:v]fps={OUTPUT_FPS},loop=loop=-1:size=1:start=0,
-            trim=0:{sig_duration},setpts=PTS-STARTPTS,
-            fade=t=in:st=0:d={FADE_DURATION}[sig];
-            
-            [main][text][sig]concat=n=3:v=1:a=0[vout]
-        """.replace('\n', ' ')
+            base, ext = os.path.splitext(path)
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(base) + '.', suffix=ext, dir=self.cache_dir)
+            os.close(fd)
+            try:
+                result = render(tmp)
+                if result.returncode != 0:
+                    raise RuntimeError(f"Render of {os.path.basename(path)} failed: {result.stderr[-300:]}")
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        return path
+    
+    def signature_frame(self, signature_path, width, height):
+        """Signature image scaled and padded to the video dimensions"""
+        path = self._entry_path('sig', signature_path, width, height, '.png')
+        return self._get(path, lambda tmp: prepare_signature(signature_path, width, height, tmp))
+    
+    def outro_clip(self, signature_path, width, height):
+        """Pre-rendered MPEG-TS outro for the signature at these dimensions"""
+        path = self._entry_path('outro', signature_path, width, height, '.ts')
+        frame = self.signature_frame(signature_path, width, height)
+        return self._get(path, lambda tmp: render_outro(frame, width, height, tmp))
+
+
+outro_cache = OutroCache(OUTRO_CACHE_DIR)
+
+
+# =============================================================================
+# MAIN PROCESSOR
+# =============================================================================
+
+# Encoding plans
+PLAN_REPLACE = 'replace'            # Audio <= video: copy video, new audio
+PLAN_LOOP_COPY = 'loop_copy'        # Loop compatible video by stream copy
+PLAN_LOOP_ENCODE = 'loop_encode'    # Loop with a full re-encode
+PLAN_OUTRO_CONCAT = 'outro_concat'  # Copy head + encode faded tail + cached outro, concat
+PLAN_OUTRO_ENCODE = 'outro_encode'  # Full re-encode with the outro filter graph
+
+OUTRO_CLIP_SECONDS = 30  # Length of pre-rendered outro clips (longer outros fully re-encode)
+
+
+def x264_args():
+    return ['-c:v', 'libx264', '-preset', 'fast', '-crf', str(VIDEO_CRF), '-pix_fmt', 'yuv420p']
+
+
+def is_copy_compatible(video_info):
+    """Can this video's stream be copied next to our own libx264 segments?"""
+    return (
+        video_info.get('video_codec') == 'h264'
+        and video_info.get('pix_fmt') in ('yuv420p', 'yuvj420p')
+        and abs(video_info.get('fps', 0) - OUTPUT_FPS) < 0.01
+        and not video_info.get('rotation')
+    )
+
+
+def plan_encoding(video_info, audio_info):
+    """Pick the cheapest way to render a story for these inputs"""
+    extra_time = audio_info['duration'] - video_info['duration']
+    
+    if extra_time >= MIN_OUTRO_TIME:
+        fits_outro = extra_time + 1 < OUTRO_CLIP_SECONDS
+        if fits_outro and video_info['duration'] > FADE_DURATION and is_copy_compatible(video_info):
+            return PLAN_OUTRO_CONCAT
+        return PLAN_OUTRO_ENCODE
+    
+    if extra_time > 0:
+        return PLAN_LOOP_COPY if video_info.get('video_codec') == 'h264' else PLAN_LOOP_ENCODE
+    
+    return PLAN_REPLACE
+
+
+def last_keyframe_before(video_path, t):
+    """Timestamp of the last keyframe at or before t (0.0 if none) - reads packets, no decoding"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path]
+    result = run_cmd(cmd)
+    best = 0.0
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        try:
+            pts = float(pts)
+        except ValueError:
+            continue
+        if 'K' in flags and best < pts <= t:
+            best = pts
+    return best
+
+
+def render_outro(signature_frame, width, height, output_path):
+    """
+    Render the outro (text card, then the signature fading in) as an MPEG-TS
+    clip of OUTRO_CLIP_SECONDS, ready to be concatenated and cut.
+    signature_frame is already scaled to width x height (see OutroCache).
+    """
+    filter_complex = f"""
+        color=black:{width}x{height}:d={TEXT_DURATION + 0.5},fps={OUTPUT_FPS},
+        drawtext=text='{SIGNATURE_TEXT}':fontsize={SIGNATURE_FONT_SIZE}:
+        fontcolor=white:fontfile={SIGNATURE_FONT}:
+        x=(w-text_w)/2:y=(h-text_h)/2:
+        alpha='if(lt(t,0.4),t/0.4,if(lt(t,{TEXT_DURATION - 0.4}),1,({TEXT_DURATION}-t)/0.4))',
+        trim=0:{TEXT_DURATION},setpts=PTS-STARTPTS[text];
         
-        cmd = [
+        [0:v]fps={OUTPUT_FPS},loop=loop=-1:size=1:start=0,
+        trim=0:{OUTRO_CLIP_SECONDS - TEXT_DURATION},setpts=PTS-STARTPTS,
+        fade=t=in:st=0:d={FADE_DURATION}[sig];
+        
+        [text][sig]concat=n=2:v=1:a=0[vout]
+    """.replace('\n', ' ')
+    cmd = [
+        'ffmpeg', '-y', '-i', signature_frame,
+        '-filter_complex', filter_complex, '-map', '[vout]',
+        *x264_args(), *thread_args(),
+        '-f', 'mpegts', output_path
+    ]
+    return run_cmd(cmd)
+
+
+def render_outro_concat(video_path, audio_path, signature_path, output_path, video_info, audio_info):
+    """
+    Outro without re-encoding the whole video:
+      head  - stream copy up to the last keyframe before the fade-out
+      tail  - re-encode only from that keyframe, with the fade-out
+      outro - pre-rendered clip, cut to length by the final -t
+    joined with the MPEG-TS concat protocol and muxed with the audio.
+    """
+    video_dur, audio_dur = video_info['duration'], audio_info['duration']
+    main_end = video_dur - FADE_DURATION
+    outro = outro_cache.outro_clip(signature_path, video_info['width'], video_info['height'])
+    keyframe = last_keyframe_before(video_path, main_end)
+    
+    work_dir = tempfile.mkdtemp(prefix='story_')
+    try:
+        head = os.path.join(work_dir, 'head.ts')
+        tail = os.path.join(work_dir, 'tail.ts')
+        segments = [tail, outro]
+        
+        if keyframe > 0:
+            result = run_cmd([
+                'ffmpeg', '-y', '-i', video_path, '-t', str(keyframe), '-an',
+                '-c:v', 'copy', '-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts', head
+            ])
+            if result.returncode != 0:
+                return result
+            segments.insert(0, head)
+        
+        result = run_cmd([
+            'ffmpeg', '-y', '-ss', str(keyframe), '-i', video_path, '-an',
+            '-vf', f'fps={OUTPUT_FPS},fade=t=out:st={main_end - keyframe}:d={FADE_DURATION}',
+            *x264_args(), *thread_args(), '-f', 'mpegts', tail
+        ])
+        if result.returncode != 0:
+            return result
+        
+        return run_cmd([
             'ffmpeg', '-y',
-            '-i', video_path,
-            '-i', temp_sig,
+            '-i', 'concat:' + '|'.join(segments),
             '-i', audio_path,
-            '-filter_complex', filter_complex,
-            '-map', '[vout]', '-map', '2:a',
-            '-c:v', 'libx264', '-preset', 'fast', '-crf', str(VIDEO_CRF),
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy',
             '-c:a', 'aac', '-b:a', AUDIO_BITRATE,
             '-t', str(audio_dur),
+            '-movflags', '+faststart',
             output_path
-        ]
+        ])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def outro_encode_cmd(video_path, audio_path, signature_frame, output_path, video_info, audio_info):
+    """Full re-encode with the outro filter graph (any input)"""
+    video_dur, audio_dur = video_info['duration'], audio_info['duration']
+    width, height = video_info['width'], video_info['height']
+    extra_time = audio_dur - video_dur
+    
+    # Calculate durations
+    main_end = video_dur - FADE_DURATION
+    sig_duration = extra_time - TEXT_DURATION + FADE_DURATION + 0.1
+    
+    # Complex filter for signature outro
+    filter_complex = f"""
+        color=black:{width}x{height}:d={TEXT_DURATION + 0.5},fps={OUTPUT_FPS}[black];
+        
+        [0:v]fps={OUTPUT_FPS},trim=0:{main_end + FADE_DURATION},setpts=PTS-STARTPTS,
+        fade=t=out:st={main_end}:d={FADE_DURATION}[main];
+        
+        [black]drawtext=text='{SIGNATURE_TEXT}':fontsize={SIGNATURE_FONT_SIZE}:
+        fontcolor=white:fontfile={SIGNATURE_FONT}:
+        x=(w-text_w)/2:y=(h-text_h)/2:
+        alpha='if(lt(t,0.4),t/0.4,if(lt(t,{TEXT_DURATION - 0.4}),1,({TEXT_DURATION}-t)/0.4))',
+        trim=0:{TEXT_DURATION},setpts=PTS-STARTPTS[text];
+        
+        [1:v]fps={OUTPUT_FPS},loop=loop=-1:size=1:start=0,
+        trim=0:{sig_duration},setpts=PTS-STARTPTS,
+        fade=t=in:st=0:d={FADE_DURATION}[sig];
+        
+        [main][text][sig]concat=n=3:v=1:a=0[vout]
+    """.replace('\n', ' ')
+    
+    return [
+        'ffmpeg', '-y',
+        '-i', video_path,
+        '-i', signature_frame,
+        '-i', audio_path,
+        '-filter_complex', filter_complex,
+        '-map', '[vout]', '-map', '2:a',
+        '-c:v', 'libx264', '-preset', 'fast', '-crf', str(VIDEO_CRF),
+        '-c:a', 'aac', '-b:a', AUDIO_BITRATE,
+        '-t', str(audio_dur),
+        *thread_args(),
+        output_path
+    ]
+
+
+def partial_path(output_path):
+    """Hidden temp file an output is rendered to before it's renamed into place"""
+    directory, name = os.path.split(output_path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.partial{ext}")
+
+
+def remove_partials(directory):
+    """Delete temp outputs left behind by an interrupted run"""
+    removed = 0
+    for name in os.listdir(directory):
+        if name.startswith('.') and '.partial.' in name:
+            os.remove(os.path.join(directory, name))
+            removed += 1
+    return removed
+
+
+def process_video(video_path, audio_path, signature_path, output_path, verbose=True, log=None,
+                  video_info=None, audio_info=None):
+    """
+    Process single video: replace audio, add signature outro if needed
+    
+    video_info / audio_info are probe_media() results (probed here if not given).
+    Progress goes to `log` (default: print when verbose).
+    
+    The output is rendered to a hidden .partial file and renamed into place
+    only when complete, so Stories/ (and the scanner) never see half-written files.
+    """
+    if log is None:
+        log = print if verbose else (lambda *args: None)
+    
+    temp_path = partial_path(output_path)
+    try:
+        ok = render_video(video_path, audio_path, signature_path, temp_path, log, video_info, audio_info)
+        if ok:
+            os.replace(temp_path, output_path)
+            log(f"  ? Output: {os.path.basename(output_path)}")
+        return ok
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def render_video(video_path, audio_path, signature_path, output_path, log, video_info=None, audio_info=None):
+    """Render one story to output_path (see process_video)"""
+    log(f"\n  Video: {os.path.basename(video_path)}")
+    log(f"  Audio: {os.path.basename(audio_path)}")
+    log(f"  Signature: {os.path.basename(signature_path)}")
+    
+    # Get info
+    video_info = video_info or probe_media(video_path)
+    audio_info = audio_info or probe_media(audio_path)
+    video_dur = video_info['duration']
+    audio_dur = audio_info['duration']
+    width, height = video_info['width'], video_info['height']
+    extra_time = audio_dur - video_dur
     
-    elif extra_time > 0:
+    log(f"  Duration - Video: {video_dur:.2f}s | Audio: {audio_dur:.2f}s | Extra: {extra_time:.2f}s")
+    
+    # Decide processing method
+    plan = plan_encoding(video_info, audio_info)
+    
+    if plan == PLAN_OUTRO_CONCAT:
+        log(f"  ? Adding signature outro (copy + tail encode + cached outro)")
+        try:
+            result = render_outro_concat(video_path, audio_path, signature_path, output_path,
+                                         video_info, audio_info)
+        except RuntimeError as e:
+            result = subprocess.CompletedProcess([], 1, '', str(e))
+        if result.returncode == 0:
+            return True
+        log(f"  ? Fast path failed, re-encoding: {result.stderr.strip()[-200:]}")
+        plan = PLAN_OUTRO_ENCODE
+    
+    if plan == PLAN_OUTRO_ENCODE:
+        log(f"  ? Adding signature outro")
+        
+        # Signature image scaled to the video (cached per signature and size)
+        try:
+            signature_frame = outro_cache.signature_frame(signature_path, width, height)
+        except RuntimeError as e:
+            log(f"  ? Error: {e}")
+            return False
+        cmd = outro_encode_cmd(video_path, audio_path, signature_frame, output_path, video_info, audio_info)
+    
+    elif plan in (PLAN_LOOP_COPY, PLAN_LOOP_ENCODE):
         # Loop video to match audio (no signature)
-        if verbose:
-            print(f"  ? Looping video to match audio")
+        copy = plan == PLAN_LOOP_COPY
+        log(f"  ? Looping video to match audio{' (stream copy)' if copy else ''}")
         cmd = [
             'ffmpeg', '-y',
             '-stream_loop', '-1', '-i', video_path,
             '-i', audio_path,
             '-map', '0:v:0', '-map', '1:a:0',
-            '-c:v', 'libx264', '-preset', 'fast', '-crf', str(VIDEO_CRF),
+            *(['-c:v', 'copy'] if copy else ['-c:v', 'libx264', '-preset', 'fast', '-crf', str(VIDEO_CRF)]),
             '-c:a', 'aac', '-b:a', AUDIO_BITRATE,
-            '-shortest',
+            '-t', str(audio_dur),
+            *thread_args(),
             output_path
         ]
     
     else:
         # Audio shorter or equal to video - just replace audio
-        if verbose:
-            print(f"  ? Simple audio replacement")
+        log(f"  ? Simple audio replacement")
         cmd = [
             'ffmpeg', '-y',
             '-i', video_path,
@@ -218,6 +759,7 @@ def process_video(video_path, audio_path, signature_path, output_path, verbose=T
             '-c:v', 'copy',
             '-c:a', 'aac', '-b:a', AUDIO_BITRATE,
             '-shortest',
+            *thread_args(),
             output_path
         ]
     
@@ -225,16 +767,88 @@ def process_video(video_path, audio_path, signature_path, output_path, verbose=T
     result = run_cmd(cmd)
     
     if result.returncode == 0:
-        if verbose:
-            print(f"  ? Output: {os.path.basename(output_path)}")
         return True
     else:
-        if verbose:
-            print(f"  ? Error!")
-            print(result.stderr[-500:] if result.stderr else "Unknown error")
+        log(f"  ? Error!")
+        log(result.stderr[-500:] if result.stderr else "Unknown error")
         return False
 
 
+# =============================================================================
+# PARALLEL RENDERING
+# =============================================================================
+
+def init_worker(threads, slot_counter):
+    """
+    Pool worker setup: cap ffmpeg threads and pin the worker (and the ffmpeg
+    processes it starts) to its own block of cores so jobs don't oversubscribe.
+    """
+    global FFMPEG_THREADS
+    FFMPEG_THREADS = threads
+    
+    if hasattr(os, 'sched_setaffinity'):
+        with slot_counter.get_lock():
+            slot = slot_counter.value
+            slot_counter.value += 1
+        cores = cpu_cores()
+        start = (slot * threads) % len(cores)
+        os.sched_setaffinity(0, cores[start:start + threads] or cores)
+
+
+def render_job(video, audio, sig, output_path, video_info=None, audio_info=None):
+    """Run process_video in a pool worker, returning its log instead of printing"""
+    lines = []
+    try:
+        ok = process_video(video, audio, sig, output_path, log=lines.append,
+                           video_info=video_info, audio_info=audio_info)
+    except Exception as e:
+        lines.append(f"  ? Error: {e}")
+        ok = False
+    return ok, lines
+
+
+def render_all(jobs, infos, manifest, journal, args):
+    """Render jobs (in a process pool with --jobs), checkpointing each finished output"""
+    success = 0
+    failed = 0
+    
+    if args.jobs > 1 and len(jobs) > 1:
+        workers = min(args.jobs, len(jobs))
+        threads = max(1, len(cpu_cores()) // workers)
+        print(f"Rendering with {workers} workers, {threads} thread(s) each\n")
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(threads, multiprocessing.Value('i', 0))) as pool:
+            futures = {pool.submit(render_job, *job[:4], *infos.get(job[3], (None, None))): job
+                       for job in jobs}
+            for done, future in enumerate(as_completed(futures), 1):
+                ok, lines = future.result()
+                output_path, key = futures[future][3:]
+                print(f"[{done}/{len(jobs)}] {'done' if ok else 'FAILED'}: {os.path.basename(output_path)}")
+                if args.verbose or not ok:
+                    print("\n".join(lines))
+                if ok:
+                    manifest.record(output_path, key)
+                    journal.record(output_path, key, *futures[future][:3])
+                    success += 1
+                else:
+                    failed += 1
+    else:
+        for i, (video, audio, sig, output_path, key) in enumerate(jobs):
+            print(f"[{i+1}/{len(jobs)}] ? {os.path.basename(output_path)}")
+            
+            video_info, audio_info = infos.get(output_path, (None, None))
+            if process_video(video, audio, sig, output_path, verbose=True,
+                             video_info=video_info, audio_info=audio_info):
+                manifest.record(output_path, key)
+                journal.record(output_path, key, video, audio, sig)
+                success += 1
+            else:
+                failed += 1
+    
+    return success, failed
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Process raw videos into scheduled stories with custom audio',
@@ -247,9 +861,28 @@ def main():
                         help='Preview without processing')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Verbose output')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Videos to render in parallel (default: 1)')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-render outputs even if they are up to date')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the last interrupted run (same start date and options)')
     
     args = parser.parse_args()
     
+    # Resuming reuses the interrupted run's options and skips what it finished
+    journal = RenderJournal(JOURNAL_FILE)
+    if args.resume:
+        journal.load()
+        if not journal.run:
+            print(f"No run to resume ({JOURNAL_FILE} not found)")
+            sys.exit(1)
+        if journal.complete:
+            print("The last run completed - nothing to resume")
+            return
+        args.start_date = journal.run['start_date']
+        args.force = journal.run['force']
+    
     # Parse start date
     try:
         parts = args.start_date.split('_')
@@ -294,6 +927,9 @@ def main():
     
     # Create output directory
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    removed = remove_partials(OUTPUT_DIR)
+    if removed:
+        print(f"\nRemoved {removed} partial output(s) from an interrupted run")
     
     print(f"\nStart date: {start_date.strftime('%B %d, %Y')} AM")
     end_index = len(videos) - 1
@@ -304,46 +940,80 @@ def main():
     
     print(f"\n{'='*60}")
     
+    # Audio and signature assignment is by index, so it's the same however jobs run.
+    # Outputs whose render key (input contents + settings) is unchanged are skipped,
+    # as are outputs the interrupted run already finished (--resume).
+    manifest = RenderManifest(MANIFEST_FILE)
+    jobs = []
+    up_to_date = []
+    for i, video in enumerate(videos):
+        audio = audios[i % len(audios)]
+        sig = signatures[i % len(signatures)]
+        output_path = os.path.join(OUTPUT_DIR, generate_output_name(i, start_date))
+        key = manifest.render_key(video, audio, sig)
+        if journal.is_done(output_path, key) or (not args.force and manifest.is_current(output_path, key)):
+            up_to_date.append(output_path)
+        else:
+            jobs.append((video, audio, sig, output_path, key))
+    manifest.save()  # Keep the input hashes we just computed
+    
+    # Probe every input once, here, so workers never run ffprobe
+    # (audio files are cycled, so most are shared by many videos)
+    probes = ProbeCache(PROBE_CACHE_FILE)
+    infos = {}
+    if not args.dry_run:
+        for video, audio, _, output_path, _ in jobs:
+            try:
+                infos[output_path] = (probes.get(video), probes.get(audio))
+            except (RuntimeError, ValueError) as e:
+                print(f"  ? Probe failed: {e}")
+        probes.save()
+        if jobs:
+            print(f"Probed {probes.probes} new file(s) for {len(jobs)} render(s)\n")
+    
     if args.dry_run:
         print("DRY RUN - Preview only:\n")
-        for i, video in enumerate(videos):
-            audio = audios[i % len(audios)]
-            sig = signatures[i % len(signatures)]
-            output_name = generate_output_name(i, start_date)
-            
+        for i, (video, audio, sig, output_path, _) in enumerate(jobs):
             print(f"[{i+1:3}] {os.path.basename(video)}")
             print(f"      + {os.path.basename(audio)}")
             print(f"      + {os.path.basename(sig)}")
-            print(f"      ? {output_name}")
+            print(f"      ? {os.path.basename(output_path)}")
             print()
         
-        print(f"Total: {len(videos)} videos to process")
+        print(f"Total: {len(jobs)} videos to process ({len(up_to_date)} up to date)")
         print("Run without --dry-run to process")
         return
     
     # Process videos
     print("PROCESSING:\n")
+    if args.resume:
+        print(f"Resuming run started {journal.run['started_at']} "
+              f"({len(journal.completed)} output(s) already finished)\n")
+        journal.resume()
+    else:
+        journal.start({
+            'start_date': args.start_date,
+            'force': args.force,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'outputs': [os.path.basename(job[3]) for job in jobs],
+        })
+    if up_to_date:
+        print(f"Skipping {len(up_to_date)} up-to-date output(s) (use --force to re-render)\n")
     
-    success = 0
-    failed = 0
+    try:
+        success, failed = render_all(jobs, infos, manifest, journal, args)
+    except KeyboardInterrupt:
+        print(f"\n\nInterrupted - run with --resume to continue")
+        sys.exit(130)
     
-    for i, video in enumerate(videos):
-        audio = audios[i % len(audios)]
-        sig = signatures[i % len(signatures)]
-        output_name = generate_output_name(i, start_date)
-        output_path = os.path.join(OUTPUT_DIR, output_name)
-        
-        print(f"[{i+1}/{len(videos)}] ? {output_name}")
-        
-        if process_video(video, audio, sig, output_path, verbose=True):
-            success += 1
-        else:
-            failed += 1
+    if not failed:
+        journal.finish()
     
     print(f"\n{'='*60}")
     print("COMPLETE")
     print("="*60)
     print(f"  Success: {success}")
+    print(f"  Skipped: {len(up_to_date)} (up to date)")
     print(f"  Failed:  {failed}")
     print(f"  Output:  {OUTPUT_DIR}")
     
@@ -0,0 +1,182 @@
+"""
+Tests for conformance.py: spec checks and when publish_path re-conforms.
+
+Run: python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import conformance
+import db
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+def video_info(**overrides):
+    info = {"width": 1080, "height": 1920, "video_codec": "h264", "pix_fmt": "yuv420p",
+            "audio_codec": "aac", "fps": 30.0, "duration": 20.0}
+    info.update(overrides)
+    return info
+
+
+class CheckVideoTest(unittest.TestCase):
+
+    def test_conforming_story(self):
+        self.assertEqual(conformance.check_video(video_info(), "a.mp4", conformance.IG_STORY_VIDEO), ([], []))
+
+    def test_fixable_problems(self):
+        fixable, fatal = conformance.check_video(
+            video_info(video_codec="hevc", audio_codec="opus", width=1920, height=1080, fps=120.0),
+            "a.mov", conformance.IG_STORY_VIDEO)
+        self.assertEqual(fatal, [])
+        self.assertEqual(len(fixable), 5)  # container, video, audio, aspect, fps
+        self.assertTrue(fixable[0].startswith("container .mov"))
+
+    def test_too_short_and_too_long_are_fatal(self):
+        _, fatal = conformance.check_video(video_info(duration=0.5), "a.mp4", conformance.IG_STORY_VIDEO)
+        self.assertEqual(fatal, ["duration 0.5s < 1s"])
+
+        fixable, fatal = conformance.check_video(video_info(duration=75.0), "a.mp4", conformance.IG_STORY_VIDEO)
+        self.assertEqual(fixable, [])
+        self.assertIn("trim the source", fatal[0])
+
+        _, fatal = conformance.check_video(video_info(duration=75.0), "a.mp4", conformance.IG_REEL_VIDEO)
+        self.assertEqual(fatal, [])
+
+    def test_no_video_stream(self):
+        _, fatal = conformance.check_video(video_info(width=0, height=0), "a.mp4", conformance.IG_REEL_VIDEO)
+        self.assertEqual(fatal, ["no video stream"])
+
+
+@unittest.skipUnless(PIL_AVAILABLE, "PIL not installed")
+class CheckImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def image(self, name, size, fmt):
+        path = os.path.join(self.tmp.name, name)
+        Image.new("RGB", size, "gray").save(path, fmt)
+        return path
+
+    def test_conforming_feed_photo(self):
+        path = self.image("a.jpg", (1080, 1350), "JPEG")
+        self.assertEqual(conformance.check_image(path, conformance.IG_FEED_IMAGE), [])
+
+    def test_feed_photo_problems(self):
+        path = self.image("a.png", (2000, 800), "PNG")
+        problems = conformance.check_image(path, conformance.IG_FEED_IMAGE)
+        self.assertEqual([p.split()[0] for p in problems], ["format", "aspect", "width"])
+
+    def test_twitter_size_limit(self):
+        path = self.image("a.jpg", (100, 100), "JPEG")
+        with mock.patch.dict(conformance.TWITTER_IMAGE, max_bytes=10):
+            problems = conformance.check_image(path, conformance.TWITTER_IMAGE)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].startswith("file size"))
+
+
+class PublishPathTest(unittest.TestCase):
+    """publish_path re-conforms only when the stored result may be out of date."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        patches = [
+            mock.patch.object(conformance, "PROJECT_ROOT", root),
+            mock.patch.object(db, "DB_FILE", os.path.join(root, "poster.sqlite3")),
+            mock.patch("builtins.print"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        db.init_db()
+
+        self.file_path = "Photos/01_02_2027_am.mp4"
+        self.derivative = "conformed/abc.mp4"
+        for rel in (self.file_path, self.derivative):
+            os.makedirs(os.path.join(root, os.path.dirname(rel)), exist_ok=True)
+            Path(root, rel).write_bytes(b"media")
+        with db.get_connection() as con:
+            con.execute(
+                "INSERT INTO media_files (file_path, detected_at, platform, content_type, status) "
+                "VALUES (?, 1, 'Instagram', 'Reels', 'pending')", (self.file_path,))
+            con.commit()
+        self.stamp = conformance.source_stamp(os.path.join(root, self.file_path))
+
+        patch = mock.patch.object(
+            conformance, "conform", return_value=(conformance.STATUS_CONFORMED, self.derivative, "aspect"))
+        self.conform = patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def job(self, status, conformed_path=None, stamp=None):
+        db.set_conform_result(1, status, conformed_path, stamp)
+        return db.get_job_by_id(1)
+
+    def test_fresh_result_is_reused(self):
+        job = self.job(conformance.STATUS_CONFORMED, self.derivative, self.stamp)
+        self.assertEqual(conformance.publish_path(job), (self.derivative, ""))
+        self.conform.assert_not_called()
+
+        job = self.job(conformance.STATUS_OK, None, self.stamp)
+        self.assertEqual(conformance.publish_path(job), (self.file_path, ""))
+        self.conform.assert_not_called()
+
+    def test_reconforms_unchecked_and_unconformed(self):
+        for status in (None, conformance.STATUS_UNCHECKED):
+            self.conform.reset_mock()
+            job = self.job(status, None, self.stamp)
+            self.assertEqual(conformance.publish_path(job), (self.derivative, ""))
+            self.conform.assert_called_once()
+            self.assertEqual(db.get_job_by_id(1)["conform_stamp"], self.stamp)
+
+    def test_reconforms_when_source_changed(self):
+        job = self.job(conformance.STATUS_FAILED, None, "1:1")
+        self.assertEqual(conformance.publish_path(job), (self.derivative, ""))
+        self.conform.assert_called_once()
+
+    def test_reconforms_when_derivative_missing(self):
+        job = self.job(conformance.STATUS_CONFORMED, "conformed/gone.mp4", self.stamp)
+        self.assertEqual(conformance.publish_path(job), (self.derivative, ""))
+        self.conform.assert_called_once()
+
+    def test_failed_result_leaves_job_status_to_caller(self):
+        job = self.job(conformance.STATUS_FAILED, None, self.stamp)
+        self.assertEqual(conformance.publish_path(job), (None, "Media not publishable (see conformance log)"))
+        self.conform.assert_not_called()
+
+        self.conform.return_value = (conformance.STATUS_FAILED, None, "duration 75.0s > 60s limit")
+        job = self.job(conformance.STATUS_UNCHECKED, None, self.stamp)
+        path, error = conformance.publish_path(job)
+        self.assertIsNone(path)
+        self.assertIn("75.0s", error)
+        row = db.get_job_by_id(1)
+        self.assertEqual((row["status"], row["attempts"]), ("pending", 0))
+
+    def test_retry_clears_conform_result(self):
+        self.job(conformance.STATUS_FAILED, None, self.stamp)
+        db.update_job_status(1, db.STATUS_FAILED, error_message="Media not publishable")
+        self.assertEqual(db.retry_failed_jobs(), 1)
+        row = db.get_job_by_id(1)
+        self.assertEqual((row["status"], row["conform_status"], row["conform_stamp"]), ("pending", None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+Tests for regenerate_captions.py --batch against a local stub of the
+Message Batches API (create, retrieve, results JSONL).
+
+Run: python3 -m unittest discover tests
+"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / "regenerate_captions.py"
+BATCHES = "/v1/messages/batches"
+
+
+def batch_object(batch_id, status, count, results_url=None):
+    return {
+        "id": batch_id, "type": "message_batch", "processing_status": status,
+        "request_counts": {"processing": 0 if status == "ended" else count,
+                           "succeeded": count if status == "ended" else 0,
+                           "errored": 0, "canceled": 0, "expired": 0},
+        "created_at": "2026-01-01T00:00:00Z", "expires_at": "2026-01-02T00:00:00Z",
+        "ended_at": "2026-01-01T00:01:00Z" if status == "ended" else None,
+        "archived_at": None, "cancel_initiated_at": None, "results_url": results_url,
+    }
+
+
+def result_line(custom_id):
+    if custom_id.endswith("9"):  # img-00009 is the failing request
+        result = {"type": "errored", "error": {"type": "error", "error": {
+            "type": "invalid_request_error", "message": "bad image"}}}
+    else:
+        result = {"type": "succeeded", "message": {
+            "id": f"msg_{custom_id}", "type": "message", "role": "assistant", "model": "stub",
+            "content": [{"type": "text", "text": f"New caption {custom_id}"}],
+            "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": 10, "output_tokens": 5},
+        }}
+    return json.dumps({"custom_id": custom_id, "result": result})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Batches are 'in_progress' on the first retrieve, then 'ended'."""
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with stub["lock"]:
+            batch_id = f"msgbatch_{len(stub['batches']) + 1:03d}"
+            stub["batches"][batch_id] = [r["custom_id"] for r in body["requests"]]
+            stub["created"].append(batch_id)
+        self.send_json(batch_object(batch_id, "in_progress", len(body["requests"])))
+
+    def do_GET(self):
+        stub = self.server.stub
+        parts = self.path.split("?")[0][len(BATCHES) + 1:].split("/")
+        batch_id = parts[0]
+        custom_ids = stub["batches"].get(batch_id)
+        if custom_ids is None:
+            self.send_error(404)
+        elif len(parts) == 2 and parts[1] == "results":
+            self.send_json("\n".join(result_line(c) for c in custom_ids) + "\n",
+                           "application/binary")
+        else:
+            with stub["lock"]:
+                polls = stub["polls"][batch_id] = stub["polls"].get(batch_id, 0) + 1
+            host, port = self.server.server_address
+            status = "ended" if polls > 1 else "in_progress"
+            results_url = f"http://{host}:{port}{BATCHES}/{batch_id}/results" if status == "ended" else None
+            self.send_json(batch_object(batch_id, status, len(custom_ids), results_url))
+
+
+@unittest.skipUnless(importlib.util.find_spec("anthropic"), "anthropic SDK not installed")
+class BatchModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.stub = {"batches": {}, "created": [], "polls": {}, "lock": threading.Lock()}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.home = Path(self.tmp.name)
+        self.folder = self.home / "photos"
+        self.folder.mkdir()
+        for i in range(10):
+            (self.folder / f"photo_{i:02d}.jpg").write_bytes(b"\xff\xd8not really a jpeg\xff\xd9")
+            (self.folder / f"photo_{i:02d}.txt").write_text(f"Old caption {i}")
+        self.log = self.home / "caption_changes.log"
+        self.state_file = self.folder / ".caption_batch.json"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def run_script(self, *extra):
+        host, port = self.server.server_address
+        env = dict(os.environ, HOME=str(self.home), CAPTION_BATCH_POLL_INTERVAL="0.1")
+        return subprocess.run(
+            [sys.executable, str(SCRIPT), "--api-key", "test-key", "--batch",
+             "--base-url", f"http://{host}:{port}", "--folder", str(self.folder),
+             "--log", str(self.log), *extra],
+            capture_output=True, text=True, env=env, timeout=60,
+        )
+
+    def test_batch_rewrites_captions(self):
+        result = self.run_script()
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertEqual(self.server.stub["created"], ["msgbatch_001"])
+        self.assertIn("Batch msgbatch_001: 10 processing", result.stdout)  # Polled until ended
+
+        for i in range(9):
+            self.assertEqual((self.folder / f"photo_{i:02d}.txt").read_text(), f"New caption img-{i:05d}")
+        self.assertEqual((self.folder / "photo_09.txt").read_text(), "Old caption 9")  # Errored request
+
+        log = self.log.read_text()
+        self.assertEqual(log.count("FILE: "), 9)
+        self.assertIn("FILE: photo_03.jpg\nOLD: Old caption 3...\nNEW: New caption img-00003...", log)
+        self.assertIn("Processed: 9, Errors: 1", result.stdout)
+        self.assertFalse(self.state_file.exists())
+
+    def test_resume_collects_submitted_batch(self):
+        self.server.stub["batches"]["msgbatch_old"] = ["img-00000", "img-00001"]
+        self.state_file.write_text(json.dumps({"batches": [
+            {"id": "msgbatch_old", "images": {"img-00000": "photo_04.jpg", "img-00001": "photo_07.jpg"}},
+        ]}))
+
+        result = self.run_script("--resume")
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertEqual(self.server.stub["created"], [])  # Nothing resubmitted
+        self.assertEqual((self.folder / "photo_04.txt").read_text(), "New caption img-00000")
+        self.assertEqual((self.folder / "photo_07.txt").read_text(), "New caption img-00001")
+        self.assertEqual((self.folder / "photo_00.txt").read_text(), "Old caption 0")
+        self.assertIn("FILE: photo_07.jpg", self.log.read_text())
+        self.assertFalse(self.state_file.exists())
+
+    def test_refuses_to_replace_submitted_batches(self):
+        state = json.dumps({"batches": [{"id": "msgbatch_old", "images": {"img-00000": "photo_04.jpg"}}]})
+        self.state_file.write_text(state)
+
+        result = self.run_script()
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("--resume", result.stdout)
+        self.assertEqual(self.server.stub["created"], [])
+        self.assertEqual(self.state_file.read_text(), state)
+
+        result = self.run_script("--discard-batches")
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertEqual(self.server.stub["created"], ["msgbatch_001"])
+
+    def test_dry_run_submits_nothing(self):
+        result = self.run_script("--dry-run")
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("--dry-run", result.stdout)
+        self.assertEqual(self.server.stub["created"], [])
+        self.assertEqual((self.folder / "photo_00.txt").read_text(), "Old caption 0")
+
+
+if __name__ == "__main__":
+    unittest.main()
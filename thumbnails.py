@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Thumbnail / preview derivative cache for BB-Poster-Automation.
+
+The dashboard serves small JPEG derivatives of scheduled media instead of
+the full-resolution originals:
+
+  - images are downscaled with PIL
+  - videos get a poster frame extracted with ffmpeg
+  - derivatives are keyed by source path + mtime + size + variant, so an
+    edited or swapped file automatically gets a new derivative (and ETag)
+  - the cache directory is a size-bounded LRU (least recently served first)
+"""
+
+import hashlib
+import os
+import subprocess
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
+
+# Longest edge in pixels for each variant
+DERIVATIVE_SIZES = {
+    "thumb": 640,     # Preview cards
+    "preview": 1280,  # Edit modal
+}
+
+JPEG_QUALITY = 82
+
+
+def source_version(src_path: str) -> Optional[str]:
+    """Short version tag for a source file (changes when the file changes)."""
+    try:
+        st = os.stat(src_path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns:x}{st.st_size:x}"
+
+
+class DerivativeCache:
+    """
+    Usage:
+        cache = DerivativeCache("~/BB-Poster-Automation/.thumb_cache")
+        result = cache.get("/path/to/12_26_2025_am.jpg", "thumb")
+        if result:
+            path, etag = result
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # Lazily computed on first write
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, src_path: str, variant: str) -> Optional[Tuple[str, str]]:
+        """
+        Return (derivative_path, etag) for a source file, generating it if needed.
+        Returns None if the variant is unknown or the derivative can't be made.
+        """
+        max_edge = DERIVATIVE_SIZES.get(variant)
+        if not max_edge:
+            return None
+
+        version = source_version(src_path)
+        if not version:
+            return None
+
+        etag = hashlib.sha1(f"{src_path}:{version}:{variant}".encode()).hexdigest()
+        out_path = os.path.join(self.cache_dir, f"{etag}.jpg")
+
+        if os.path.exists(out_path):
+            try:
+                os.utime(out_path)  # Mark as recently used for LRU eviction
+            except OSError:
+                pass
+            return out_path, etag
+
+        tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp.jpg"
+        try:
+            if os.path.splitext(src_path)[1].lower() in VIDEO_EXTENSIONS:
+                made = self._render_video_frame(src_path, tmp_path, max_edge)
+            else:
+                made = self._render_image(src_path, tmp_path, max_edge)
+            if not made:
+                return None
+            os.replace(tmp_path, out_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._account(os.path.getsize(out_path))
+        return out_path, etag
+
+    # -------------------------------------------------------------------------
+    # Rendering
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _render_image(src_path: str, out_path: str, max_edge: int) -> bool:
+        if not PIL_AVAILABLE:
+            return False
+        try:
+            with Image.open(src_path) as im:
+                im.draft("RGB", (max_edge, max_edge))  # JPEG: decode at reduced scale
+                im = ImageOps.exif_transpose(im).convert("RGB")
+                im.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                im.save(out_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            return True
+        except Exception as e:
+            print(f"Thumbnail error for {src_path}: {e}")
+            return False
+
+    @staticmethod
+    def _render_video_frame(src_path: str, out_path: str, max_edge: int) -> bool:
+        cmd = [
+            "ffmpeg", "-y", "-v", "error",
+            "-ss", "0.5", "-i", src_path,
+            "-frames:v", "1",
+            "-vf", f"scale=w={max_edge}:h={max_edge}:force_original_aspect_ratio=decrease",
+            "-q:v", "4",
+            out_path,
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=30)
+            return result.returncode == 0 and os.path.exists(out_path)
+        except Exception as e:
+            print(f"Poster frame error for {src_path}: {e}")
+            return False
+
+    # -------------------------------------------------------------------------
+    # LRU eviction
+    # -------------------------------------------------------------------------
+
+    def _entries(self) -> Dict[str, os.stat_result]:
+        entries = {}
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp.jpg"):
+                entries[entry.path] = entry.stat()
+        return entries
+
+    def _account(self, added_bytes: int) -> None:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(st.st_size for st in self._entries().values())
+            else:
+                self._total_bytes += added_bytes
+
+            if self._total_bytes <= self.max_bytes:
+                return
+
+            # Evict least recently used until we're back under 90% of the budget
+            entries = sorted(self._entries().items(), key=lambda item: item[1].st_mtime)
+            total = sum(st.st_size for _, st in entries)
+            for path, st in entries:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= st.st_size
+                except OSError:
+                    pass
+            self._total_bytes = total